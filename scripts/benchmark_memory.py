@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the agent MemorySystem
+
+Compares insert and lookup throughput of the current MemorySystem, with and
+without write-behind batching, against the legacy access pattern (new sqlite3
+connection per call, rollback journal).
+
+Usage: python scripts/benchmark_memory.py [--ops N]
+"""
+
+import argparse
+import json
+import logging
+import pathlib
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Add src directory to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from agent.memory import MemorySystem
+
+logging.disable(logging.INFO)
+
+
+def legacy_record_execution(db_path: pathlib.Path, i: int):
+    """Insert the way MemorySystem used to: connect, insert, commit, close"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        INSERT INTO executions
+        (timestamp, operation_type, intent, plan, success, execution_time_ms,
+         error_message, context, result_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (datetime.utcnow().isoformat(), "shell", f"intent {i % 50}", json.dumps({}),
+          i % 10 != 0, i % 1000, None, None, None))
+    conn.commit()
+    conn.close()
+
+
+def legacy_get_agent_state(db_path: pathlib.Path, key: str):
+    conn = sqlite3.connect(db_path)
+    row = conn.execute("SELECT value FROM agent_state WHERE key = ?", (key,)).fetchone()
+    conn.close()
+    return row
+
+
+def timed(label: str, ops: int, func) -> float:
+    start = time.perf_counter()
+    for i in range(ops):
+        func(i)
+    elapsed = time.perf_counter() - start
+    rate = ops / elapsed if elapsed else float("inf")
+    print(f"  {label:<28} {ops:>7} ops  {elapsed:8.3f}s  {rate:>12,.0f} ops/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ops", type=int, default=2000, help="operations per measurement")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = pathlib.Path(tmp) / "legacy.db"
+        current_path = pathlib.Path(tmp) / "current.db"
+
+        # Legacy schema in rollback-journal mode
+        MemorySystem(legacy_path).close()
+        conn = sqlite3.connect(legacy_path)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.close()
+
+        memory = MemorySystem(current_path)
+        memory.set_agent_state("bench_key", "value")
+        conn = sqlite3.connect(legacy_path)
+        conn.execute("INSERT OR REPLACE INTO agent_state VALUES ('bench_key', 'value', '')")
+        conn.commit()
+        conn.close()
+
+        print("Legacy (connection per call, rollback journal):")
+        legacy_insert = timed("record_execution", args.ops, lambda i: legacy_record_execution(legacy_path, i))
+        legacy_lookup = timed("get_agent_state", args.ops, lambda i: legacy_get_agent_state(legacy_path, "bench_key"))
+
+        print("Current MemorySystem:")
+        current_insert = timed("record_execution", args.ops, lambda i: memory.record_execution(
+            "shell", f"intent {i % 50}", {}, i % 10 != 0, i % 1000))
+        current_lookup = timed("get_agent_state", args.ops, lambda i: memory.get_agent_state("bench_key"))
+        memory.close()
+
+        print("Write-behind MemorySystem:")
+        buffered = MemorySystem(pathlib.Path(tmp) / "buffered.db", write_behind=True)
+        start = time.perf_counter()
+        buffered_insert = timed("record_execution (enqueue)", args.ops, lambda i: buffered.record_execution(
+            "shell", f"intent {i % 50}", {}, i % 10 != 0, i % 1000))
+        buffered.flush()
+        elapsed = time.perf_counter() - start
+        print(f"  {'record_execution (durable)':<28} {args.ops:>7} ops  {elapsed:8.3f}s  {args.ops / elapsed:>12,.0f} ops/s")
+        buffered_durable = args.ops / elapsed
+        buffered.close()
+
+        print("Speedup:")
+        print(f"  record_execution  x{current_insert / legacy_insert:.1f}")
+        print(f"  get_agent_state   x{current_lookup / legacy_lookup:.1f}")
+        print(f"  record_execution (write-behind enqueue)       x{buffered_insert / legacy_insert:.1f}")
+        print(f"  record_execution (write-behind, incl. flush)  x{buffered_durable / legacy_insert:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Admission Control
+
+Event-loop lag monitoring and priority-based load shedding. Under overload,
+low-priority endpoints are rejected early with 503 instead of letting latency
+grow until clients time out; health, metrics and kill-switch endpoints are
+always served, so the shedding itself stays observable.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("apex_orchestrator.admission")
+
+# Endpoint priorities
+PRIORITY_CRITICAL = "critical"  # never shed
+PRIORITY_NORMAL = "normal"      # shed under hard overload
+PRIORITY_LOW = "low"            # shed as soon as any threshold is exceeded
+
+DEFAULT_CRITICAL_PATHS = (
+    "/health",
+    "/metrics",
+    "/agent/kill-switch/",
+    "/agent/disable",
+    "/agent/stop-loop",
+    "/agent/modifications/disable",
+)
+
+DEFAULT_LOW_PRIORITY_PATHS = (
+    "/agi/",
+    "/agent/learning-report",
+    "/agent/analytics",
+    "/agent/memory/history/export",
+    "/agent/opportunities",
+    "/agent/suggestions",
+    "/docs",
+    "/redoc",
+    "/openapi.json",
+    "/static/",
+)
+
+
+class LoopLagMonitor:
+    """Continuously measures how late the event loop wakes up a sleeping task"""
+
+    def __init__(self, interval_seconds: float = 0.1, alpha: float = 0.3):
+        self.interval_seconds = interval_seconds
+        self.alpha = alpha
+        self.lag_ms = 0.0
+        self.lag_ewma_ms = 0.0
+        self.lag_max_ms = 0.0
+        self.samples = 0
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[float], None]] = []
+
+    def add_listener(self, callback: Callable[[float], None]):
+        """Register a callback invoked with every lag sample (ms)"""
+        self._listeners.append(callback)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"Event-loop lag monitor started (interval: {self.interval_seconds}s)")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval_seconds)
+            self.record((loop.time() - start - self.interval_seconds) * 1000)
+
+    def record(self, lag_ms: float):
+        """Record a lag sample"""
+        lag_ms = max(0.0, lag_ms)
+        self.lag_ms = lag_ms
+        self.lag_ewma_ms = lag_ms if self.samples == 0 else (
+            self.alpha * lag_ms + (1 - self.alpha) * self.lag_ewma_ms
+        )
+        self.lag_max_ms = max(self.lag_max_ms, lag_ms)
+        self.samples += 1
+        for listener in self._listeners:
+            try:
+                listener(lag_ms)
+            except Exception as e:
+                logger.error(f"Lag listener failed: {e}")
+
+    @property
+    def current_lag_ms(self) -> float:
+        """Smoothed lag that still reacts immediately to a fresh spike"""
+        return max(self.lag_ms, self.lag_ewma_ms)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "lag_ms": round(self.lag_ms, 3),
+            "lag_ewma_ms": round(self.lag_ewma_ms, 3),
+            "lag_max_ms": round(self.lag_max_ms, 3),
+            "samples": self.samples
+        }
+
+
+class AdmissionController:
+    """Decides whether to admit a request based on current load signals.
+
+    A signal past its threshold is "soft" overload and sheds low-priority
+    endpoints; past twice its threshold is "hard" overload and also sheds
+    normal-priority endpoints. Critical endpoints are always admitted.
+    """
+
+    def __init__(self, lag_monitor: LoopLagMonitor,
+                 queue_depth_fn: Optional[Callable[[], int]] = None,
+                 max_loop_lag_ms: float = 200.0,
+                 max_in_flight: int = 200,
+                 max_queue_depth: int = 64,
+                 enabled: bool = True,
+                 critical_paths: Tuple[str, ...] = DEFAULT_CRITICAL_PATHS,
+                 low_priority_paths: Tuple[str, ...] = DEFAULT_LOW_PRIORITY_PATHS,
+                 rate_window_seconds: int = 60):
+        self.lag_monitor = lag_monitor
+        self.queue_depth_fn = queue_depth_fn or (lambda: 0)
+        self.max_loop_lag_ms = max_loop_lag_ms
+        self.max_in_flight = max_in_flight
+        self.max_queue_depth = max_queue_depth
+        self.enabled = enabled
+        self.critical_paths = critical_paths
+        self.low_priority_paths = low_priority_paths
+
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed: Dict[str, int] = {PRIORITY_NORMAL: 0, PRIORITY_LOW: 0}
+        self.shed_tools: Dict[str, int] = {}
+        self.rate_window_seconds = rate_window_seconds
+        # (second, admitted, shed) buckets for the shed-rate window
+        self._buckets: deque = deque()
+
+    def classify(self, path: str) -> str:
+        """Map a request path to its priority"""
+        for prefix in self.critical_paths:
+            if path == prefix or (prefix.endswith("/") and path.startswith(prefix)):
+                return PRIORITY_CRITICAL
+        for prefix in self.low_priority_paths:
+            if path == prefix or (prefix.endswith("/") and path.startswith(prefix)):
+                return PRIORITY_LOW
+        return PRIORITY_NORMAL
+
+    def overload_level(self) -> float:
+        """Highest ratio of a load signal to its threshold (>= 1.0 means overloaded)"""
+        ratios = []
+        if self.max_loop_lag_ms > 0:
+            ratios.append(self.lag_monitor.current_lag_ms / self.max_loop_lag_ms)
+        if self.max_in_flight > 0:
+            ratios.append(self.in_flight / self.max_in_flight)
+        if self.max_queue_depth > 0:
+            ratios.append(self.queue_depth_fn() / self.max_queue_depth)
+        return max(ratios) if ratios else 0.0
+
+    def _record(self, shed: bool):
+        second = int(time.monotonic())
+        if self._buckets and self._buckets[-1][0] == second:
+            _, admitted, rejected = self._buckets[-1]
+            self._buckets[-1] = (second, admitted + (0 if shed else 1), rejected + (1 if shed else 0))
+        else:
+            self._buckets.append((second, 0 if shed else 1, 1 if shed else 0))
+        cutoff = second - self.rate_window_seconds
+        while self._buckets and self._buckets[0][0] <= cutoff:
+            self._buckets.popleft()
+
+    def admit(self, path: str) -> Tuple[bool, float]:
+        """Return (admitted, retry_after_seconds) for a request path"""
+        priority = self.classify(path)
+        if not self.enabled or priority == PRIORITY_CRITICAL:
+            return True, 0.0
+
+        level = self.overload_level()
+        shed = (priority == PRIORITY_LOW and level >= 1.0) or level >= 2.0
+        self._record(shed)
+        if shed:
+            self.shed[priority] += 1
+            logger.warning(f"Shedding {priority}-priority request {path} (overload level {level:.2f})")
+            return False, float(min(30, max(1, round(level * 2))))
+
+        self.admitted += 1
+        return True, 0.0
+
+    def admit_tool(self, name: str, priority: int) -> bool:
+        """Decide whether a tool of the given priority (1 = most important) may start.
+
+        Soft overload sheds priority 4+ tools, hard overload also sheds priority 3.
+        """
+        if not self.enabled:
+            return True
+        level = self.overload_level()
+        shed = (priority >= 4 and level >= 1.0) or (priority >= 3 and level >= 2.0)
+        if shed:
+            self.shed_tools[name] = self.shed_tools.get(name, 0) + 1
+            logger.warning(f"Shedding tool '{name}' (priority {priority}, overload level {level:.2f})")
+        return not shed
+
+    def get_stats(self) -> Dict[str, Any]:
+        window_admitted = sum(b[1] for b in self._buckets)
+        window_shed = sum(b[2] for b in self._buckets)
+        window_total = window_admitted + window_shed
+        return {
+            "enabled": self.enabled,
+            "overload_level": round(self.overload_level(), 3),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth_fn(),
+            "thresholds": {
+                "max_loop_lag_ms": self.max_loop_lag_ms,
+                "max_in_flight": self.max_in_flight,
+                "max_queue_depth": self.max_queue_depth
+            },
+            "loop_lag": self.lag_monitor.get_stats(),
+            "admitted_total": self.admitted,
+            "shed_total": dict(self.shed),
+            "shed_tools": dict(self.shed_tools),
+            "shed_rate_per_second": round(window_shed / self.rate_window_seconds, 3),
+            "shed_ratio": round(window_shed / window_total, 3) if window_total else 0.0
+        }
@@ -4,17 +4,24 @@ Autonomous Agent Loop
 Main orchestration loop for autonomous learning, optimization, and self-improvement.
 """
 
-import asyncio
 import logging
+import os
+import time
 from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
 import traceback
 
 from .memory import MemorySystem
+from .async_memory import AsyncMemorySystem
 from .learner import PatternLearner
 from .code_generator import CodeGenerator
 from .self_modifier import SelfModifier
 from .safety import SafetyController
+from .anomaly import AnomalyDetector
+from .cycle_trigger import CycleTrigger
+from .cycle_worker import CycleWorker
+from .profiler import CycleProfiler
+from .circuit_breaker import AGENT_CYCLE_BREAKER
 
 logger = logging.getLogger("apex_orchestrator.agent.loop")
 
@@ -22,25 +29,68 @@ logger = logging.getLogger("apex_orchestrator.agent.loop")
 class AutonomousAgent:
     """Autonomous agent that learns, optimizes, and self-improves"""
     
-    def __init__(self, memory_db_path: str = "logs/agent_memory.db"):
+    def __init__(self, memory_db_path: str = "logs/agent_memory.db",
+                 learning_report_max_age_seconds: float = 3600,
+                 cycle_mode: Optional[str] = None):
+        # "thread": cycle work runs on the memory DB thread of this process;
+        # "process": learning and reporting run in a worker process
+        cycle_mode = cycle_mode or os.getenv("AGENT_CYCLE_MODE", "thread")
+        if cycle_mode not in ("thread", "process"):
+            raise ValueError(f"Invalid AGENT_CYCLE_MODE: {cycle_mode} (use 'thread' or 'process')")
+        self.cycle_mode = cycle_mode
+        
         # Initialize components
         self.memory = MemorySystem(memory_db_path)
+        self.memory_async = AsyncMemorySystem(self.memory)
         self.safety = SafetyController(self.memory)
         self.learner = PatternLearner(self.memory)
         self.code_generator = CodeGenerator(self.memory, llm_client=None)
         self.self_modifier = SelfModifier(self.memory, self.code_generator, self.safety)
+        self.cycle_worker = CycleWorker(memory_db_path) if cycle_mode == "process" else None
+        self.profiler = CycleProfiler(self.memory.db)
+        
+        # Flag latency and error-rate regressions as executions are recorded
+        self.anomaly_detector = AnomalyDetector(self.memory)
+        self.anomaly_detector.add_listener(self._on_anomaly)
+        self.memory.add_execution_listener(self.anomaly_detector.observe)
+        
+        # Cycles run when executions pile up, on anomalies, or at the interval
+        self.cycle_trigger = CycleTrigger(
+            execution_threshold=int(os.getenv("AGENT_CYCLE_TRIGGER_EXECUTIONS", "100")),
+            min_spacing_seconds=float(os.getenv("AGENT_CYCLE_MIN_SPACING_SECONDS", "60")),
+            debounce_seconds=float(os.getenv("AGENT_CYCLE_DEBOUNCE_SECONDS", "5"))
+        )
+        self.memory.add_execution_listener(self.cycle_trigger.notify_execution)
+        self.anomaly_detector.add_listener(self.cycle_trigger.notify_anomaly)
+        self.safety.add_kill_switch_listener(self._on_kill_switch)
         
         # Agent state
         self.running = False
         self.loop_count = 0
         self.last_learning_time = None
         self.last_optimization_time = None
+        self.idle_cycles_skipped = 0
+        
+        # Learning report snapshot, valid until a new execution is recorded
+        # (or it ages out, as the report covers a sliding 24h window)
+        self.learning_report_max_age_seconds = learning_report_max_age_seconds
+        self._learning_report: Optional[Dict[str, Any]] = None
+        self._learning_report_key: Optional[int] = None
+        self._learning_report_built_at = 0.0
+        self.learning_report_hits = 0
+        self.learning_report_builds = 0
         
         logger.info("🤖 Autonomous Agent initialized")
         logger.info(f"Safety status: {self.safety.get_safety_status()}")
     
     async def start(self, interval_seconds: int = 3600):
-        """Start the autonomous agent loop"""
+        """Start the autonomous agent loop.
+
+        After the first cycle, the next one starts when enough new executions
+        have been recorded, when an anomaly is detected, or at the latest
+        after `interval_seconds`. Interval wake-ups with nothing new to learn
+        are skipped.
+        """
         if not self.safety.is_enabled():
             logger.warning("Cannot start: Agent is disabled")
             return {
@@ -49,14 +99,24 @@ class AutonomousAgent:
             }
         
         self.running = True
-        logger.info(f"🚀 Starting autonomous agent loop (interval: {interval_seconds}s)")
+        logger.info(f"🚀 Starting autonomous agent loop (max interval: {interval_seconds}s)")
         
+        self.cycle_trigger.max_interval_seconds = interval_seconds
+        self.cycle_trigger.reset()
+        reason = "start"
         try:
             while self.running:
-                await self._run_cycle()
+                if reason == "max_interval" and not await self.memory_async.run(
+                        self.learner.has_unlearned_executions):
+                    self.idle_cycles_skipped += 1
+                    logger.debug("No new executions since the last cycle, skipping")
+                else:
+                    await self._run_cycle(reason)
                 
-                # Wait for next cycle
-                await asyncio.sleep(interval_seconds)
+                # Wait for the next trigger
+                reason = await self.cycle_trigger.wait()
+                if reason is None:
+                    break
                 
         except Exception as e:
             logger.error(f"Agent loop crashed: {e}")
@@ -67,14 +127,34 @@ class AutonomousAgent:
     def stop(self):
         """Stop the autonomous agent loop"""
         self.running = False
+        self.cycle_trigger.stop()
         logger.info("Stopping autonomous agent loop...")
     
-    async def _run_cycle(self):
+    def close(self):
+        """Persist detector state and release the memory system"""
+        self.anomaly_detector.save_state()
+        self.safety.close()
+        if self.cycle_worker is not None:
+            self.cycle_worker.close()
+        self.memory_async.close()
+        self.memory.close()
+    
+    def _on_kill_switch(self, active: bool):
+        """Halt the loop as soon as the kill switch trips"""
+        if active and self.running:
+            logger.critical("Kill switch tripped - stopping agent loop")
+            self.stop()
+    
+    def _on_anomaly(self, anomaly: Dict[str, Any]):
+        """Record detected anomalies as safety incidents"""
+        self.safety.record_safety_incident(f"{anomaly['kind']}_anomaly", anomaly["message"], "medium")
+    
+    async def _run_cycle(self, reason: str = "manual"):
         """Run one cycle of the autonomous agent"""
         self.loop_count += 1
         cycle_start = datetime.utcnow()
         
-        logger.info(f"=== Agent Cycle {self.loop_count} ===")
+        logger.info(f"=== Agent Cycle {self.loop_count} ({reason}) ===")
         
         try:
             # Safety check
@@ -88,54 +168,78 @@ class AutonomousAgent:
                 logger.warning("Safety checks failed, skipping cycle")
                 return
             
+            cycle_breaker = self.safety.breakers.get(AGENT_CYCLE_BREAKER)
+            if not cycle_breaker.allow():
+                logger.warning(f"Agent cycle circuit open, skipping cycle "
+                               f"(retry in {cycle_breaker.retry_after():.0f}s)")
+                return
+            if not safety_checks["breakers_ok"]:
+                # Don't change code while operations are failing
+                logger.warning(f"Open circuits {safety_checks['open_breakers']}, skipping improvement phases")
+            
+            stats = await self.memory_async.get_statistics()
+            self.profiler.begin_cycle(self.loop_count, reason, stats['total_executions'])
+            
             # 1. Learn from recent executions
-            await self._learning_phase()
+            with self.profiler.phase("learning"):
+                await self._learning_phase()
             
             # 2. Analyze patterns and identify opportunities
-            await self._analysis_phase()
+            with self.profiler.phase("analysis"):
+                await self._analysis_phase()
             
             # 3. Generate improvements (if enabled)
-            if self.safety.modifications_enabled_check():
-                await self._improvement_phase()
+            if safety_checks["breakers_ok"] and self.safety.modifications_enabled_check():
+                with self.profiler.phase("improvement"):
+                    await self._improvement_phase()
             
             # 4. Self-optimization (if enabled)
-            if self.safety.modifications_enabled_check() and self._should_self_optimize():
-                await self._self_optimization_phase()
+            if (safety_checks["breakers_ok"] and self.safety.modifications_enabled_check() and
+                    await self.memory_async.run(self._should_self_optimize)):
+                with self.profiler.phase("self_optimization"):
+                    await self._self_optimization_phase()
             
             # 5. Record metrics
+            profile = self.profiler.end_cycle()
             cycle_duration = (datetime.utcnow() - cycle_start).total_seconds()
-            self.memory.record_metric("agent_cycle_duration_seconds", cycle_duration)
+            await self.memory_async.record_metric("agent_cycle_duration_seconds", cycle_duration)
+            for phase, phase_stats in profile['phases'].items():
+                await self.memory_async.record_metric(f"agent_phase_{phase}_seconds", phase_stats['wall_ms'] / 1000)
+            await self.memory_async.compact_metrics()
             
             logger.info(f"Cycle {self.loop_count} completed in {cycle_duration:.2f}s")
+            cycle_breaker.record(True)
             
         except Exception as e:
             logger.error(f"Error in agent cycle: {e}")
             logger.error(traceback.format_exc())
             self.safety.record_safety_incident("cycle_error", str(e), "medium")
+            self.safety.breakers.get(AGENT_CYCLE_BREAKER).record(False)
+        finally:
+            # Keep a failed cycle's partial timings too
+            self.profiler.end_cycle()
     
     async def _learning_phase(self):
         """Learn from recent execution history"""
         logger.info("📚 Learning Phase")
         
-        # Get recent executions
-        recent_history = self.memory.get_execution_history(limit=100)
-        
-        # Learn from successes and failures
-        for execution in recent_history:
-            if execution['success']:
-                self.learner.learn_from_success(execution)
-            else:
-                self.learner.learn_from_failure(execution)
+        # Learn from executions recorded since the last cycle
+        if self.cycle_worker is not None:
+            # The worker learns and rebuilds the report in one job
+            await self.get_learning_report_async(learn=True)
+        else:
+            await self.memory_async.run(self.learner.learn_new_executions)
         
         # Update last learning time
         self.last_learning_time = datetime.utcnow()
         
         # Get success rate
-        success_rate = self.memory.get_success_rate(hours=24)
+        success_rate = await self.memory_async.get_success_rate(hours=24)
         logger.info(f"Current 24h success rate: {success_rate*100:.1f}%")
         
         # Safety check: if success rate too low, alert
-        if success_rate < 0.5 and len(recent_history) > 10:
+        stats = await self.memory_async.get_statistics()
+        if success_rate < 0.5 and stats['total_executions'] > 10:
             logger.warning(f"⚠️  Low success rate detected: {success_rate*100:.1f}%")
             self.safety.record_safety_incident(
                 "low_success_rate",
@@ -147,8 +251,9 @@ class AutonomousAgent:
         """Analyze patterns and identify opportunities"""
         logger.info("🔍 Analysis Phase")
         
-        # Analyze execution patterns
-        analysis = self.learner.analyze_execution_patterns(hours=24)
+        # Analyze execution patterns; the report is cached for the dashboard
+        report = await self.get_learning_report_async()
+        analysis = report['execution_analysis']
         logger.info(f"Analyzed {analysis.get('total_executions', 0)} executions")
         
         # Log recommendations
@@ -156,11 +261,11 @@ class AutonomousAgent:
             logger.info(f"💡 Recommendation: {recommendation}")
         
         # Identify optimization opportunities
-        opportunities = self.learner.identify_optimization_opportunities()
+        opportunities = report['optimization_opportunities']
         logger.info(f"Found {len(opportunities)} optimization opportunities")
         
         # Store top opportunities for improvement phase
-        self.memory.set_agent_state(
+        await self.memory_async.set_agent_state(
             "current_opportunities",
             str(len(opportunities))
         )
@@ -171,8 +276,9 @@ class AutonomousAgent:
         """Generate and propose improvements"""
         logger.info("🔧 Improvement Phase")
         
-        # Get improvement suggestions
-        suggestions = self.learner.suggest_improvements()
+        # Get improvement suggestions (from the report built in the analysis phase)
+        report = await self.get_learning_report_async()
+        suggestions = report['improvement_suggestions']
         
         if not suggestions:
             logger.info("No high-priority improvements identified")
@@ -240,7 +346,7 @@ class AutonomousAgent:
             return
         
         # Analyze own performance
-        stats = self.memory.get_statistics()
+        stats = await self.memory_async.get_statistics()
         logger.info(f"Agent stats: {stats}")
         
         # Check if improvements are needed
@@ -271,10 +377,7 @@ class AutonomousAgent:
         """Manually trigger learning from an execution"""
         logger.info("Manual learning triggered")
         
-        if execution['success']:
-            self.learner.learn_from_success(execution)
-        else:
-            self.learner.learn_from_failure(execution)
+        await self.memory_async.run(self.learner.learn_batch, [execution])
         
         return {"status": "learned", "success": execution['success']}
     
@@ -302,21 +405,82 @@ class AutonomousAgent:
             "last_optimization_time": self.last_optimization_time.isoformat() if self.last_optimization_time else None,
             "safety": self.safety.get_safety_status(),
             "memory_stats": self.memory.get_statistics(),
-            "modification_stats": self.self_modifier.get_modification_stats()
+            "modification_stats": self.self_modifier.get_modification_stats(),
+            "anomaly_detection": self.anomaly_detector.get_stats(),
+            "cycle_mode": self.cycle_mode,
+            "cycle_worker": self.cycle_worker.get_stats() if self.cycle_worker else None,
+            "profiler": {
+                "cycles_recorded": len(self.profiler.history),
+                "capture_pending": self.profiler.capture_pending
+            },
+            "cycle_trigger": {**self.cycle_trigger.get_stats(), "idle_cycles_skipped": self.idle_cycles_skipped},
+            "learning_report_cache": {
+                "latest_execution_id": self._learning_report_key,
+                "hits": self.learning_report_hits,
+                "builds": self.learning_report_builds
+            }
         }
     
     def get_learning_report(self) -> Dict[str, Any]:
         """Get learning and analysis report"""
-        analysis = self.learner.analyze_execution_patterns(hours=24)
-        opportunities = self.learner.identify_optimization_opportunities()
-        suggestions = self.learner.suggest_improvements()
-        
+        return self.refresh_learning_report()
+    
+    def refresh_learning_report(self, force: bool = False) -> Dict[str, Any]:
+        """Return the cached learning report, rebuilding it only if stale.
+
+        The report is keyed on the latest execution id, so repeated calls
+        cost one indexed lookup until new executions arrive or the snapshot
+        is older than `learning_report_max_age_seconds`.
+        """
+        latest_id = self.memory.get_latest_execution_id()
+        if not force and self._learning_report_is_fresh(latest_id):
+            self.learning_report_hits += 1
+            return self._serve_learning_report(cached=True)
+        
+        self._store_learning_report(self.learner.build_learning_report(latest_id))
+        return self._serve_learning_report(cached=False)
+    
+    async def get_learning_report_async(self, force: bool = False, learn: bool = False) -> Dict[str, Any]:
+        """Cached learning report, rebuilt off the event loop when stale.
+
+        In process mode a stale report (and, with `learn`, learning from new
+        executions) is computed by the worker process; otherwise on the
+        memory DB thread.
+        """
+        if self.cycle_worker is None:
+            if learn:
+                await self.memory_async.run(self.learner.learn_new_executions)
+            return await self.memory_async.run(self.refresh_learning_report, force)
+        
+        if not force and not learn:
+            latest_id = await self.memory_async.get_latest_execution_id()
+            if self._learning_report_is_fresh(latest_id):
+                self.learning_report_hits += 1
+                return await self.memory_async.run(self._serve_learning_report, True)
+        
+        result = await self.cycle_worker.build_learning_report(learn=learn)
+        if result["learned"]:
+            logger.info(f"Worker learned from {result['learned']} new executions in {result['elapsed_ms']:.0f}ms")
+        self._store_learning_report(result["report"])
+        return await self.memory_async.run(self._serve_learning_report, False)
+    
+    def _learning_report_is_fresh(self, latest_id: int) -> bool:
+        age = time.monotonic() - self._learning_report_built_at
+        return (self._learning_report is not None and self._learning_report_key == latest_id
+                and age <= self.learning_report_max_age_seconds)
+    
+    def _store_learning_report(self, report: Dict[str, Any]):
+        self._learning_report = report
+        self._learning_report_key = report["latest_execution_id"]
+        self._learning_report_built_at = time.monotonic()
+        self.learning_report_builds += 1
+    
+    def _serve_learning_report(self, cached: bool) -> Dict[str, Any]:
+        # Pattern count comes from an O(1) counter and can change without new executions
         return {
-            "timestamp": datetime.utcnow().isoformat(),
-            "execution_analysis": analysis,
-            "optimization_opportunities": opportunities,
-            "improvement_suggestions": suggestions,
-            "patterns_learned": self.memory.get_statistics()['learned_patterns']
+            **self._learning_report,
+            "patterns_learned": self.memory.get_statistics()['learned_patterns'],
+            "cached": cached
         }
 
 
@@ -0,0 +1,185 @@
+"""
+Latency Analytics for the Autonomous Agent
+
+Loads execution latencies for a window into NumPy arrays with one query and
+computes tail percentiles per operation type, an EWMA level, a least-squares
+trend with a confidence interval and hour-of-day seasonality.
+"""
+
+import time
+from typing import Any, Dict, List, Optional
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("apex_orchestrator.agent.analytics")
+
+HOUR_MS = 3600 * 1000
+PERCENTILES = (50, 90, 95, 99)
+
+# A trend is reported when the 95% interval of the slope excludes zero and the
+# fitted change over the window exceeds this share of the mean latency
+TREND_MIN_CHANGE_PERCENT = 5.0
+Z_95 = 1.96
+MIN_TREND_SAMPLES = 10
+
+
+def ewma(values: np.ndarray, alpha: float = 0.1) -> float:
+    """Final value of s_i = alpha * x_i + (1 - alpha) * s_(i-1), with s_0 = x_0"""
+    n = len(values)
+    if n == 0:
+        return 0.0
+    # Older samples weigh less than 1e-12; only the tail that matters is used
+    horizon = int(np.ceil(np.log(1e-12) / np.log(1 - alpha))) if 0 < alpha < 1 else n
+    if n > horizon:
+        values, n = values[-horizon:], horizon
+        first_weight = 0.0
+    else:
+        first_weight = (1 - alpha) ** (n - 1)
+    weights = alpha * (1 - alpha) ** np.arange(n - 1, -1, -1, dtype=float)
+    if first_weight:
+        weights[0] = first_weight
+    return float(weights @ values)
+
+
+def linear_trend(ts_ms: np.ndarray, values: np.ndarray) -> Dict[str, Any]:
+    """Least-squares slope (ms per hour) with a 95% confidence interval"""
+    n = len(values)
+    if n < MIN_TREND_SAMPLES:
+        return {"trend": "insufficient_data", "samples": int(n)}
+
+    x = (ts_ms - ts_ms[0]) / HOUR_MS
+    x_mean, y_mean = x.mean(), values.mean()
+    sxx = float(((x - x_mean) ** 2).sum())
+    if sxx == 0:
+        return {"trend": "insufficient_data", "samples": int(n)}
+
+    slope = float(((x - x_mean) * (values - y_mean)).sum() / sxx)
+    intercept = y_mean - slope * x_mean
+    residuals = values - (intercept + slope * x)
+    ss_res = float((residuals ** 2).sum())
+    ss_tot = float(((values - y_mean) ** 2).sum())
+    stderr = (ss_res / (n - 2) / sxx) ** 0.5
+    low, high = slope - Z_95 * stderr, slope + Z_95 * stderr
+
+    span_hours = float(x[-1])
+    change_percent = slope * span_hours / y_mean * 100 if y_mean else 0.0
+    if low > 0 and change_percent > TREND_MIN_CHANGE_PERCENT:
+        trend = "degrading"
+    elif high < 0 and change_percent < -TREND_MIN_CHANGE_PERCENT:
+        trend = "improving"
+    else:
+        trend = "stable"
+
+    return {
+        "trend": trend,
+        "slope_ms_per_hour": round(slope, 3),
+        "slope_ci95_ms_per_hour": [round(low, 3), round(high, 3)],
+        "r_squared": round(1 - ss_res / ss_tot, 4) if ss_tot else 0.0,
+        "change_over_window_percent": round(change_percent, 2),
+        "samples": int(n)
+    }
+
+
+def hourly_seasonality(ts_ms: np.ndarray, values: np.ndarray) -> Dict[str, Any]:
+    """Mean latency and volume per UTC hour of day"""
+    hours = (ts_ms // HOUR_MS) % 24
+    counts = np.bincount(hours, minlength=24)
+    sums = np.bincount(hours, weights=values, minlength=24)
+    active = counts > 0
+    means = np.zeros(24)
+    means[active] = sums[active] / counts[active]
+
+    overall = values.mean() if len(values) else 0.0
+    result: Dict[str, Any] = {
+        "mean_ms_by_hour": [round(float(m), 2) if c else None for m, c in zip(means, counts)],
+        "count_by_hour": counts.tolist(),
+    }
+    if active.any() and overall:
+        peak = int(np.argmax(np.where(active, means, -np.inf)))
+        trough = int(np.argmin(np.where(active, means, np.inf)))
+        result.update({
+            "peak_hour": peak,
+            "trough_hour": trough,
+            # Spread between slowest and fastest hour relative to the mean
+            "amplitude_percent": round(float((means[peak] - means[trough]) / overall * 100), 2)
+        })
+    return result
+
+
+class LatencyAnalyzer:
+    """Vectorized latency statistics over the executions table"""
+
+    def __init__(self, memory_system, ewma_alpha: float = 0.1):
+        self.memory = memory_system
+        self.ewma_alpha = ewma_alpha
+
+    def analyze(self, hours: float = 24, until_ts: Optional[int] = None) -> Dict[str, Any]:
+        """Latency report for the last `hours` (up to `until_ts`)"""
+        started = time.perf_counter()
+        until_ts = until_ts if until_ts is not None else int(time.time() * 1000)
+        since_ts = until_ts - int(hours * HOUR_MS)
+
+        rows = self.memory.get_latency_samples(since_ts, until_ts)
+        if not rows:
+            return {"samples": 0, "by_operation": {}}
+
+        n = len(rows)
+        ts_ms = np.fromiter((row[0] for row in rows), dtype=np.int64, count=n)
+        latency = np.fromiter((row[2] for row in rows), dtype=float, count=n)
+        codes: Dict[str, int] = {}
+        op_codes = np.fromiter((codes.setdefault(row[1], len(codes)) for row in rows), dtype=np.int64, count=n)
+        op_names = list(codes)
+
+        half = n // 2
+        report = {
+            "window_hours": hours,
+            "samples": n,
+            "overall": self._summarize(ts_ms, latency),
+            # Mean of the earlier and later half of the samples
+            "halves_mean_ms": [
+                round(float(latency[:half].mean()), 2) if half else None,
+                round(float(latency[half:].mean()), 2)
+            ],
+            "by_operation": {},
+            "seasonality": hourly_seasonality(ts_ms, latency)
+        }
+
+        # Stable sort by operation keeps each group in time order
+        order = np.argsort(op_codes, kind="stable")
+        bounds = np.cumsum(np.bincount(op_codes, minlength=len(op_names)))[:-1]
+        for name, idx in zip(op_names, np.split(order, bounds)):
+            report["by_operation"][str(name)] = self._summarize(ts_ms[idx], latency[idx])
+
+        report["by_operation"] = dict(sorted(report["by_operation"].items()))
+        report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return report
+
+    def _summarize(self, ts_ms: np.ndarray, latency: np.ndarray) -> Dict[str, Any]:
+        summary = {
+            "count": int(len(latency)),
+            "mean_ms": round(float(latency.mean()), 2),
+            "ewma_ms": round(ewma(latency, self.ewma_alpha), 2),
+            "max_ms": float(latency.max())
+        }
+        for p, value in zip(PERCENTILES, np.percentile(latency, PERCENTILES)):
+            summary[f"p{p}_ms"] = round(float(value), 2)
+        summary["trend"] = linear_trend(ts_ms, latency)
+        return summary
+
+    def slow_operations(self, report: Dict[str, Any], p95_threshold_ms: float = 10000) -> List[Dict[str, Any]]:
+        """Operation types whose p95 latency exceeds the threshold, slowest first"""
+        slow = [
+            {"operation": name, **stats}
+            for name, stats in report.get("by_operation", {}).items()
+            if stats["p95_ms"] > p95_threshold_ms
+        ]
+        return sorted(slow, key=lambda s: s["p95_ms"], reverse=True)
+
+    def degrading_operations(self, report: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Operation types with a statistically significant upward latency trend"""
+        return [
+            {"operation": name, **stats}
+            for name, stats in report.get("by_operation", {}).items()
+            if stats["trend"].get("trend") == "degrading"
+        ]
@@ -0,0 +1,278 @@
+"""
+Streaming Anomaly Detection for the Autonomous Agent
+
+Watches executions as they are recorded and flags latency or error-rate
+regressions per operation type. Each operation keeps constant-size state: a
+slow and a fast EWMA of latency and failures, an EWM variance and a bounded
+log-bucketed latency sketch. State is persisted in agent_state so baselines
+survive restarts.
+"""
+
+import json
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, List
+import logging
+
+from .rollups import LogHistogram
+
+logger = logging.getLogger("apex_orchestrator.agent.anomaly")
+
+STATE_KEY = "anomaly_detector_state"
+
+# Share of baseline executions slower than the baseline p90
+TAIL_QUANTILE_RATE = 0.1
+
+AnomalyListener = Callable[[Dict[str, Any]], None]
+
+
+class _OperationBaseline:
+    """Running latency and error-rate baseline of one operation type"""
+
+    __slots__ = ("count", "mean", "var", "fast_mean", "fast_tail_rate", "error_rate",
+                 "fast_error_rate", "sketch")
+
+    def __init__(self, max_bins: int):
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.fast_mean = 0.0
+        self.fast_tail_rate = TAIL_QUANTILE_RATE
+        self.error_rate = 0.0
+        self.fast_error_rate = 0.0
+        self.sketch = LogHistogram(max_bins=max_bins)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "var": self.var,
+            "fast_mean": self.fast_mean,
+            "fast_tail_rate": self.fast_tail_rate,
+            "error_rate": self.error_rate,
+            "fast_error_rate": self.fast_error_rate,
+            "sketch": self.sketch.counts
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], max_bins: int) -> "_OperationBaseline":
+        baseline = cls(max_bins)
+        for field in ("count", "mean", "var", "fast_mean", "fast_tail_rate", "error_rate", "fast_error_rate"):
+            setattr(baseline, field, data.get(field, getattr(baseline, field)))
+        baseline.sketch = LogHistogram(counts=data.get("sketch"), max_bins=max_bins)
+        return baseline
+
+
+class AnomalyDetector:
+    """Per-operation latency and error-rate anomaly detection.
+
+    A slow EWMA (``slow_alpha``) tracks the baseline and a fast EWMA
+    (``fast_alpha``) tracks the last few executions. An anomaly is reported
+    when the fast average rises more than ``z_threshold`` standard errors above
+    the baseline. For latency, the recent share of executions slower than the
+    baseline p90 (from the sketch) must also be significantly above 10%, so a
+    single outlier in a heavy-tailed distribution is not enough.
+    """
+
+    def __init__(self, memory_system,
+                 slow_alpha: float = 0.01,
+                 fast_alpha: float = 0.2,
+                 z_threshold: float = 4.0,
+                 min_samples: int = 50,
+                 min_error_rate: float = 0.2,
+                 cooldown_seconds: float = 300,
+                 max_operations: int = 200,
+                 max_bins: int = 256,
+                 max_sketch_count: int = 100000,
+                 persist_every: int = 100):
+        self.memory = memory_system
+        self.slow_alpha = slow_alpha
+        self.fast_alpha = fast_alpha
+        self.z_threshold = z_threshold
+        self.min_samples = min_samples
+        self.min_error_rate = min_error_rate
+        self.cooldown_seconds = cooldown_seconds
+        self.max_operations = max_operations
+        self.max_bins = max_bins
+        self.max_sketch_count = max_sketch_count
+        self.persist_every = persist_every
+
+        # Standard deviation of a fast EWMA relative to that of single samples
+        self._fast_spread = math.sqrt(fast_alpha / (2 - fast_alpha))
+        p = TAIL_QUANTILE_RATE
+        self._tail_rate_threshold = p + z_threshold * math.sqrt(p * (1 - p)) * self._fast_spread
+
+        self._lock = threading.Lock()
+        self._listeners: List[AnomalyListener] = []
+        self._baselines: Dict[str, _OperationBaseline] = {}
+        self._last_alert: Dict[tuple, float] = {}
+        self._since_persist = 0
+
+        # Stats
+        self.observed = 0
+        self.anomalies = 0
+        self.suppressed = 0
+        self.dropped_operations = 0
+        self.recent: List[Dict[str, Any]] = []
+
+        self._load_state()
+
+    def add_listener(self, listener: AnomalyListener):
+        """Call `listener(anomaly)` for every anomaly reported"""
+        self._listeners.append(listener)
+
+    def observe(self, operation_type: str, success: bool, execution_time_ms: float, *_args, **_kwargs):
+        """Fold one execution into the baseline of its operation type"""
+        anomalies = []
+        with self._lock:
+            baseline = self._baselines.get(operation_type)
+            if baseline is None:
+                if len(self._baselines) >= self.max_operations:
+                    self.dropped_operations += 1
+                    return
+                baseline = self._baselines[operation_type] = _OperationBaseline(self.max_bins)
+
+            self.observed += 1
+            self._observe_latency(operation_type, baseline, float(execution_time_ms or 0), anomalies)
+            self._observe_error(operation_type, baseline, 0.0 if success else 1.0, anomalies)
+            baseline.count += 1
+
+            self._since_persist += 1
+            persist = self.persist_every and self._since_persist >= self.persist_every
+            anomalies = [a for a in anomalies if self._admit(a)]
+
+        for anomaly in anomalies:
+            self._notify(anomaly)
+        if persist:
+            self.save_state()
+
+    def _observe_latency(self, operation_type: str, b: _OperationBaseline, value: float, anomalies: List):
+        if b.count == 0:
+            b.mean = b.fast_mean = value
+        else:
+            b.fast_mean += self.fast_alpha * (value - b.fast_mean)
+
+        if b.count >= self.min_samples:
+            p90 = b.sketch.quantile(0.9)
+            b.fast_tail_rate += self.fast_alpha * ((value > p90) - b.fast_tail_rate)
+            threshold = b.mean + self.z_threshold * math.sqrt(b.var) * self._fast_spread
+            if b.fast_mean > threshold and b.fast_tail_rate > self._tail_rate_threshold:
+                anomalies.append({
+                    "operation_type": operation_type,
+                    "kind": "latency",
+                    "observed": round(b.fast_mean, 2),
+                    "baseline": round(b.mean, 2),
+                    "threshold": round(threshold, 2),
+                    "recent_above_p90": round(b.fast_tail_rate, 4),
+                    "baseline_p90": round(p90, 2),
+                    "message": (f"{operation_type} latency {b.fast_mean:.0f}ms is above its baseline "
+                                f"{b.mean:.0f}ms (p90 {p90:.0f}ms)")
+                })
+
+        # Exponentially weighted mean and variance of the baseline
+        delta = value - b.mean
+        b.mean += self.slow_alpha * delta
+        b.var = (1 - self.slow_alpha) * (b.var + self.slow_alpha * delta * delta)
+
+        b.sketch.add(value)
+        if b.sketch.total > self.max_sketch_count:
+            # Halve old counts so the sketch follows the recent distribution
+            b.sketch.counts = {k: c // 2 for k, c in b.sketch.counts.items() if c > 1}
+
+    def _observe_error(self, operation_type: str, b: _OperationBaseline, failed: float, anomalies: List):
+        if b.count == 0:
+            b.error_rate = b.fast_error_rate = failed
+            return
+        b.fast_error_rate += self.fast_alpha * (failed - b.fast_error_rate)
+
+        if b.count >= self.min_samples:
+            p = b.error_rate
+            # Binomial spread, floored so a spotless baseline still needs a real jump
+            spread = math.sqrt(max(p * (1 - p), 0.01)) * self._fast_spread
+            threshold = max(p + self.z_threshold * spread, self.min_error_rate)
+            if b.fast_error_rate > threshold:
+                anomalies.append({
+                    "operation_type": operation_type,
+                    "kind": "error_rate",
+                    "observed": round(b.fast_error_rate, 4),
+                    "baseline": round(p, 4),
+                    "threshold": round(threshold, 4),
+                    "message": (f"{operation_type} error rate {b.fast_error_rate:.0%} is above its "
+                                f"baseline {p:.0%}")
+                })
+
+        b.error_rate += self.slow_alpha * (failed - b.error_rate)
+
+    def _admit(self, anomaly: Dict[str, Any]) -> bool:
+        """Apply the per (operation, kind) cooldown"""
+        key = (anomaly["operation_type"], anomaly["kind"])
+        now = time.monotonic()
+        last = self._last_alert.get(key)
+        if last is not None and now - last < self.cooldown_seconds:
+            self.suppressed += 1
+            return False
+        self._last_alert[key] = now
+        self.anomalies += 1
+        anomaly["detected_at"] = time.time()
+        self.recent = (self.recent + [anomaly])[-20:]
+        return True
+
+    def _notify(self, anomaly: Dict[str, Any]):
+        logger.warning(f"Anomaly detected: {anomaly['message']}")
+        for listener in self._listeners:
+            try:
+                listener(anomaly)
+            except Exception as e:
+                logger.error(f"Anomaly listener failed: {e}")
+
+    def get_baselines(self) -> Dict[str, Dict[str, Any]]:
+        """Current baseline per operation type"""
+        with self._lock:
+            return {
+                name: {
+                    "samples": b.count,
+                    "mean_ms": round(b.mean, 2),
+                    "stddev_ms": round(math.sqrt(b.var), 2),
+                    "recent_mean_ms": round(b.fast_mean, 2),
+                    "p50_ms": b.sketch.quantile(0.5),
+                    "p90_ms": b.sketch.quantile(0.9),
+                    "p99_ms": b.sketch.quantile(0.99),
+                    "error_rate": round(b.error_rate, 4),
+                    "recent_error_rate": round(b.fast_error_rate, 4)
+                }
+                for name, b in sorted(self._baselines.items())
+            }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "operations_tracked": len(self._baselines),
+            "observed": self.observed,
+            "anomalies": self.anomalies,
+            "suppressed": self.suppressed,
+            "dropped_operations": self.dropped_operations,
+            "recent": list(self.recent)
+        }
+
+    def save_state(self):
+        """Persist all baselines to agent_state"""
+        with self._lock:
+            state = json.dumps({name: b.to_dict() for name, b in self._baselines.items()},
+                               separators=(",", ":"))
+            self._since_persist = 0
+        try:
+            self.memory.set_agent_state(STATE_KEY, state)
+        except Exception as e:
+            logger.error(f"Failed to persist anomaly detector state: {e}")
+
+    def _load_state(self):
+        raw = self.memory.get_agent_state(STATE_KEY)
+        if not raw:
+            return
+        try:
+            for name, data in json.loads(raw).items():
+                self._baselines[name] = _OperationBaseline.from_dict(data, self.max_bins)
+            logger.info(f"Restored anomaly baselines for {len(self._baselines)} operation types")
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"Ignoring unreadable anomaly detector state: {e}")
+            self._baselines = {}
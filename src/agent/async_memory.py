@@ -0,0 +1,114 @@
+"""
+Async Facade for the Agent Memory
+
+Runs MemorySystem calls (and other database-bound agent work) on one
+dedicated executor thread so coroutines can await them without blocking the
+event loop. The synchronous MemorySystem API remains available for scripts.
+"""
+
+import asyncio
+import contextvars
+import functools
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+import logging
+
+from .memory import MemorySystem
+
+logger = logging.getLogger("apex_orchestrator.agent.async_memory")
+
+T = TypeVar("T")
+
+
+class MemoryOverloaded(RuntimeError):
+    """The memory request queue is full; callers should retry after `retry_after` seconds"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AsyncMemorySystem:
+    """Awaitable wrapper around a MemorySystem.
+
+    Every public MemorySystem method is available as a coroutine of the same
+    name, e.g. ``await memory_async.get_statistics()``. Calls are queued to a
+    single DB thread and run in submission order.
+    """
+
+    def __init__(self, memory: MemorySystem, max_queue: int = 1000):
+        self.memory = memory
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-db")
+        self._closed = False
+
+        # Stats
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Run any database-bound callable on the DB thread"""
+        if self._closed:
+            raise RuntimeError("Async memory executor is closed")
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise MemoryOverloaded(f"Memory request queue is full ({self.max_queue} pending)",
+                                   retry_after=self._retry_after())
+
+        submitted = time.perf_counter()
+
+        def call():
+            wait_ms = (time.perf_counter() - submitted) * 1000
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            return func(*args, **kwargs)
+
+        self.queued += 1
+        try:
+            loop = asyncio.get_running_loop()
+            # Run in the caller's context so per-task state (e.g. profiling counters) carries over
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self._executor, context.run, call)
+        finally:
+            self.queued -= 1
+            self.completed += 1
+
+    def _retry_after(self) -> int:
+        """Seconds until the queue has likely drained, from the average wait so far"""
+        avg_wait_ms = self.total_wait_ms / self.completed if self.completed else 0.0
+        return max(1, math.ceil(avg_wait_ms / 1000))
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attr = getattr(self.memory, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        return method
+
+    def close(self):
+        """Finish queued calls and stop the DB thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._executor.shutdown(wait=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_ms / self.completed, 3) if self.completed else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3)
+        }
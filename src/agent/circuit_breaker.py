@@ -0,0 +1,311 @@
+"""
+Circuit Breakers for Autonomous Operations
+
+Per-operation breakers that stop calling a tool (or running agent cycles)
+once its recent failure ratio crosses a threshold. Outcomes are counted in a
+sliding window of fixed time buckets, so recording and checking are O(1).
+An open breaker rejects calls until its cooldown has passed, then lets a
+probe call through (half-open): success closes it, failure opens it again.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger("apex_orchestrator.agent.circuit_breaker")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Breaker gating the agent loop itself; tripped by failed cycles and critical incidents
+AGENT_CYCLE_BREAKER = "agent_cycle"
+
+
+class SlidingWindowCounter:
+    """Success and failure counts over the last `window_seconds`.
+
+    The window is split into `bucket_count` time buckets kept in a ring;
+    running totals are adjusted as buckets expire, so updates and reads cost
+    at most one pass over the (fixed) buckets.
+    """
+
+    def __init__(self, window_seconds: float, bucket_count: int = 10):
+        if window_seconds <= 0 or bucket_count < 1:
+            raise ValueError("window_seconds and bucket_count must be positive")
+        self.window_seconds = window_seconds
+        self.bucket_count = bucket_count
+        self.bucket_seconds = window_seconds / bucket_count
+        self.reset()
+
+    def reset(self):
+        self._successes = [0] * self.bucket_count
+        self._failures = [0] * self.bucket_count
+        self._epoch: Optional[int] = None
+        self.successes = 0
+        self.failures = 0
+
+    def _advance(self, now: float) -> int:
+        """Expire buckets that fell out of the window; returns the current slot"""
+        epoch = int(now // self.bucket_seconds)
+        if self._epoch is None:
+            self._epoch = epoch
+        elif epoch > self._epoch:
+            for e in range(self._epoch + 1, min(epoch, self._epoch + self.bucket_count) + 1):
+                slot = e % self.bucket_count
+                self.successes -= self._successes[slot]
+                self.failures -= self._failures[slot]
+                self._successes[slot] = 0
+                self._failures[slot] = 0
+            self._epoch = epoch
+        return self._epoch % self.bucket_count
+
+    def add(self, success: bool, now: float):
+        slot = self._advance(now)
+        if success:
+            self._successes[slot] += 1
+            self.successes += 1
+        else:
+            self._failures[slot] += 1
+            self.failures += 1
+
+    def totals(self, now: float) -> Tuple[int, int]:
+        """(successes, failures) within the window ending at `now`"""
+        self._advance(now)
+        return self.successes, self.failures
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one operation type"""
+
+    def __init__(self, name: str, window_seconds: float = 60, failure_threshold: float = 0.5,
+                 min_calls: int = 10, cooldown_seconds: float = 30, half_open_max_calls: int = 1,
+                 bucket_count: int = 10, clock: Callable[[], float] = time.monotonic,
+                 on_state_change: Optional[Callable[[str, str, str], None]] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.cooldown_seconds = cooldown_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.window = SlidingWindowCounter(window_seconds, bucket_count)
+        self._clock = clock
+        self._on_state_change = on_state_change
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self.last_reason: Optional[str] = None
+
+        # Stats
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(self._clock())
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being rejected (open and still cooling down)"""
+        return self.state == OPEN
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.cooldown_seconds:
+            self._set_state(HALF_OPEN, "cooldown elapsed")
+        return self._state
+
+    def _set_state(self, state: str, reason: str):
+        """Change state; caller holds the lock"""
+        previous, self._state = self._state, state
+        self.last_reason = reason
+        self._probes = 0
+        if state == OPEN:
+            self._opened_at = self._clock()
+            self.trips += 1
+            logger.warning(f"Circuit '{self.name}' opened: {reason}")
+        elif state == CLOSED:
+            self.window.reset()
+            logger.info(f"Circuit '{self.name}' closed: {reason}")
+        if self._on_state_change is not None:
+            try:
+                self._on_state_change(self.name, previous, state)
+            except Exception as e:
+                logger.error(f"Circuit breaker listener failed: {e}")
+
+    def allow(self) -> bool:
+        """Whether a call may proceed; half-open admits a limited number of probes"""
+        with self._lock:
+            state = self._current_state(self._clock())
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success: bool):
+        """Record the outcome of a call"""
+        with self._lock:
+            now = self._clock()
+            state = self._current_state(now)
+            if state == HALF_OPEN:
+                if success:
+                    self._set_state(CLOSED, "probe succeeded")
+                else:
+                    self._set_state(OPEN, "probe failed")
+                return
+            if state == OPEN:
+                # Outcome of a call admitted before the breaker opened
+                return
+
+            self.window.add(success, now)
+            successes, failures = self.window.totals(now)
+            calls = successes + failures
+            if calls >= self.min_calls and failures / calls >= self.failure_threshold:
+                self._set_state(OPEN, f"{failures}/{calls} calls failed in the last "
+                                      f"{self.window.window_seconds:.0f}s")
+
+    def release(self):
+        """Give back a half-open probe slot for a call that was neither success nor failure"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def trip(self, reason: str):
+        """Open the breaker now"""
+        with self._lock:
+            self._set_state(OPEN, reason)
+
+    def reset(self):
+        """Close the breaker and forget recorded outcomes"""
+        with self._lock:
+            self._set_state(CLOSED, "manual reset")
+
+    def retry_after(self) -> float:
+        """Seconds until an open breaker lets a probe through"""
+        with self._lock:
+            if self._current_state(self._clock()) != OPEN:
+                return 0.0
+            return max(0.0, self.cooldown_seconds - (self._clock() - self._opened_at))
+
+    def configure(self, **params):
+        """Update thresholds in place, keeping the current state"""
+        with self._lock:
+            for key in ("failure_threshold", "min_calls", "cooldown_seconds", "half_open_max_calls"):
+                if key in params:
+                    setattr(self, key, params.pop(key))
+            if "window_seconds" in params or "bucket_count" in params:
+                self.window = SlidingWindowCounter(
+                    params.pop("window_seconds", self.window.window_seconds),
+                    params.pop("bucket_count", self.window.bucket_count)
+                )
+        if params:
+            raise ValueError(f"Unknown circuit breaker settings: {sorted(params)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self._clock()
+            state = self._current_state(now)
+            successes, failures = self.window.totals(now)
+            calls = successes + failures
+            return {
+                "state": state,
+                "calls": calls,
+                "failures": failures,
+                "failure_rate": round(failures / calls, 3) if calls else 0.0,
+                "window_seconds": self.window.window_seconds,
+                "failure_threshold": self.failure_threshold,
+                "min_calls": self.min_calls,
+                "cooldown_seconds": self.cooldown_seconds,
+                "retry_after_seconds": round(max(0.0, self.cooldown_seconds - (now - self._opened_at)), 1)
+                if state == OPEN else 0.0,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "last_reason": self.last_reason
+            }
+
+
+class CircuitBreakerRegistry:
+    """Breakers by operation type, created on first use with shared defaults"""
+
+    def __init__(self, window_seconds: float = 60, failure_threshold: float = 0.5,
+                 min_calls: int = 10, cooldown_seconds: float = 30, half_open_max_calls: int = 1,
+                 clock: Callable[[], float] = time.monotonic):
+        self.defaults = {
+            "window_seconds": window_seconds,
+            "failure_threshold": failure_threshold,
+            "min_calls": min_calls,
+            "cooldown_seconds": cooldown_seconds,
+            "half_open_max_calls": half_open_max_calls
+        }
+        self._clock = clock
+        self._overrides: Dict[str, Dict[str, Any]] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._listeners: List[Callable[[str, str, str], None]] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreakerRegistry":
+        return cls(
+            window_seconds=float(os.getenv("AGENT_BREAKER_WINDOW_SECONDS", "60")),
+            failure_threshold=float(os.getenv("AGENT_BREAKER_FAILURE_THRESHOLD", "0.5")),
+            min_calls=int(os.getenv("AGENT_BREAKER_MIN_CALLS", "10")),
+            cooldown_seconds=float(os.getenv("AGENT_BREAKER_COOLDOWN_SECONDS", "30"))
+        )
+
+    def add_listener(self, listener: Callable[[str, str, str], None]):
+        """Call `listener(name, old_state, new_state)` on every state change"""
+        self._listeners.append(listener)
+
+    def _notify(self, name: str, previous: str, state: str):
+        for listener in self._listeners:
+            listener(name, previous, state)
+
+    def configure(self, name: str, **params):
+        """Override settings for one breaker (applied now if it already exists)"""
+        with self._lock:
+            self._overrides.setdefault(name, {}).update(params)
+            breaker = self._breakers.get(name)
+        if breaker is not None:
+            breaker.configure(**params)
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(name)
+                if breaker is None:
+                    params = {**self.defaults, **self._overrides.get(name, {})}
+                    breaker = CircuitBreaker(name, clock=self._clock, on_state_change=self._notify, **params)
+                    self._breakers[name] = breaker
+        return breaker
+
+    def open_breakers(self) -> List[str]:
+        """Names of breakers currently rejecting calls"""
+        return [name for name, breaker in list(self._breakers.items()) if breaker.is_open]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {name: breaker.get_stats() for name, breaker in list(self._breakers.items())}
+
+
+# Global registry shared by the agent's safety controller and tool execution
+_breakers: Optional[CircuitBreakerRegistry] = None
+
+
+def get_breakers() -> CircuitBreakerRegistry:
+    """Get or create the global circuit breaker registry"""
+    global _breakers
+    if _breakers is None:
+        _breakers = CircuitBreakerRegistry.from_env()
+        _breakers.configure(
+            AGENT_CYCLE_BREAKER,
+            window_seconds=float(os.getenv("AGENT_CYCLE_BREAKER_WINDOW_SECONDS", "21600")),
+            min_calls=3,
+            cooldown_seconds=float(os.getenv("AGENT_CYCLE_BREAKER_COOLDOWN_SECONDS", "3600"))
+        )
+    return _breakers
@@ -0,0 +1,164 @@
+"""
+Event-Driven Cycle Triggering for the Autonomous Agent
+
+Decides when the agent loop should run its next cycle: once enough new
+executions have been recorded, as soon as an anomaly is detected, or when
+the maximum interval has passed. Cycle starts are kept at least a minimum
+spacing apart and event-triggered cycles wait a short debounce so a burst of
+activity is handled by one cycle.
+"""
+
+import asyncio
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+import logging
+
+logger = logging.getLogger("apex_orchestrator.agent.cycle_trigger")
+
+
+class CycleTrigger:
+    """Wakes the agent loop on executions, anomalies or a timeout.
+
+    `notify_execution` and `notify_anomaly` may be called from any thread
+    (executions are recorded on the memory DB thread); `wait` is awaited by
+    the agent loop.
+    """
+
+    def __init__(self, execution_threshold: int = 100,
+                 max_interval_seconds: float = 3600,
+                 min_spacing_seconds: float = 60,
+                 debounce_seconds: float = 5):
+        self.execution_threshold = execution_threshold
+        self.max_interval_seconds = max_interval_seconds
+        self.min_spacing_seconds = min_spacing_seconds
+        self.debounce_seconds = debounce_seconds
+
+        self._lock = threading.Lock()
+        self._pending_executions = 0
+        self._pending_reason: Optional[str] = None
+        self._stopped = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event: Optional[asyncio.Event] = None
+        self._last_cycle_at: Optional[float] = None
+
+        # Stats
+        self.executions_seen = 0
+        self.triggers: Counter = Counter()
+
+    def notify_execution(self, *_args, **_kwargs):
+        """Count a recorded execution; wakes the loop once the threshold is reached"""
+        with self._lock:
+            self._pending_executions += 1
+            self.executions_seen += 1
+            fire = (self._pending_reason is None and
+                    self._pending_executions >= self.execution_threshold)
+            if fire:
+                self._pending_reason = "executions"
+        if fire:
+            self._wake()
+
+    def notify_anomaly(self, *_args, **_kwargs):
+        """Request a cycle because an anomaly was detected"""
+        self.request_cycle("anomaly")
+
+    def request_cycle(self, reason: str = "manual"):
+        """Start the next cycle as soon as spacing and debounce allow"""
+        with self._lock:
+            if self._pending_reason in (None, "executions"):
+                self._pending_reason = reason
+        self._wake()
+
+    def _wake(self):
+        loop, event = self._loop, self._event
+        if loop is None or event is None:
+            return
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            # Loop already closed
+            pass
+
+    def reset(self):
+        """Start a new run: forget pending triggers and count from now"""
+        with self._lock:
+            self._pending_executions = 0
+            self._pending_reason = None
+            self._stopped = False
+        self._last_cycle_at = time.monotonic()
+
+    def stop(self):
+        """Make a pending `wait` return None"""
+        with self._lock:
+            self._stopped = True
+        self._wake()
+
+    async def wait(self) -> Optional[str]:
+        """Wait until the next cycle is due and return why.
+
+        Returns "executions", "max_interval" or the reason passed to
+        `request_cycle` ("anomaly" for anomalies), or None if the trigger was
+        stopped.
+        """
+        self._loop = asyncio.get_running_loop()
+        if self._event is None:
+            self._event = asyncio.Event()
+        last = self._last_cycle_at if self._last_cycle_at is not None else time.monotonic()
+        deadline = last + self.max_interval_seconds
+
+        while True:
+            with self._lock:
+                reason = self._pending_reason
+                stopped = self._stopped
+            if stopped:
+                return None
+            if reason:
+                break
+            if time.monotonic() >= deadline:
+                reason = "max_interval"
+                break
+            await self._sleep_until(deadline)
+
+        if reason != "max_interval":
+            # Keep cycles apart and let a burst settle before starting
+            start_at = max(last + self.min_spacing_seconds, time.monotonic() + self.debounce_seconds)
+            await self._sleep_until(start_at, interruptible=False)
+            if self._stopped:
+                return None
+
+        with self._lock:
+            self._pending_executions = 0
+            self._pending_reason = None
+        self._last_cycle_at = time.monotonic()
+        self.triggers[reason] += 1
+        logger.debug(f"Agent cycle triggered by {reason}")
+        return reason
+
+    async def _sleep_until(self, deadline: float, interruptible: bool = True):
+        """Sleep until `deadline`; wake-ups end it early only if interruptible (or stopped)"""
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopped:
+                return
+            self._event.clear()
+            with self._lock:
+                if self._stopped or (interruptible and self._pending_reason):
+                    return
+            try:
+                await asyncio.wait_for(self._event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return
+            if interruptible:
+                return
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "execution_threshold": self.execution_threshold,
+            "max_interval_seconds": self.max_interval_seconds,
+            "min_spacing_seconds": self.min_spacing_seconds,
+            "debounce_seconds": self.debounce_seconds,
+            "pending_executions": self._pending_executions,
+            "executions_seen": self.executions_seen,
+            "triggers": dict(self.triggers)
+        }
@@ -0,0 +1,117 @@
+"""
+Worker Process for Agent Cycle Analysis
+
+In process mode (AGENT_CYCLE_MODE=process) the CPU-heavy part of an agent
+cycle - learning from new executions and building the learning report - runs
+in a separate process that opens its own connections to the same SQLite
+database. Only the report (a plain dict) travels back to the API server.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+import logging
+
+logger = logging.getLogger("apex_orchestrator.agent.cycle_worker")
+
+# Per-process state of the worker, created by _init_worker
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(db_path: str):
+    from .memory import MemorySystem
+    from .learner import PatternLearner
+
+    # Writes go straight to the database; nothing may be left buffered in the worker
+    memory = MemorySystem(db_path, write_behind=False)
+    _worker["memory"] = memory
+    _worker["learner"] = PatternLearner(memory)
+
+
+def build_learning_report(learn: bool = False) -> Dict[str, Any]:
+    """Optionally learn from new executions, then build the learning report"""
+    started = time.perf_counter()
+    memory, learner = _worker["memory"], _worker["learner"]
+
+    learned = learner.learn_new_executions() if learn else 0
+    report = learner.build_learning_report(memory.get_latest_execution_id())
+
+    return {
+        "learned": learned,
+        "pid": os.getpid(),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        "report": report
+    }
+
+
+class CycleWorker:
+    """Single worker process running cycle analysis off the event loop.
+
+    The process is started on first use with the "spawn" start method, so it
+    inherits no threads or open SQLite handles from the server.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = str(db_path)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+        # Stats
+        self.runs = 0
+        self.failures = 0
+        self.restarts = 0
+        self.last_elapsed_ms: Optional[float] = None
+        self.last_pid: Optional[int] = None
+        self.last_error: Optional[str] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.db_path,)
+            )
+        return self._executor
+
+    async def build_learning_report(self, learn: bool = False) -> Dict[str, Any]:
+        """Run build_learning_report in the worker process"""
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._get_executor(), build_learning_report, learn)
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            # A crashed worker breaks the pool; start a fresh one next time
+            self._shutdown()
+            self.restarts += 1
+            raise
+
+        self.runs += 1
+        self.last_elapsed_ms = result["elapsed_ms"]
+        self.last_pid = result["pid"]
+        return result
+
+    def _shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def close(self):
+        """Stop the worker process"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "alive": self._executor is not None,
+            "pid": self.last_pid,
+            "runs": self.runs,
+            "failures": self.failures,
+            "restarts": self.restarts,
+            "last_elapsed_ms": self.last_elapsed_ms,
+            "last_error": self.last_error
+        }
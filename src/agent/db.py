@@ -0,0 +1,211 @@
+"""
+SQLite Connection Management for the Agent Memory
+
+One long-lived writer connection guarded by a lock plus one reader connection
+per thread, all in WAL mode so readers never block the writer (or each other).
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+import logging
+
+logger = logging.getLogger("apex_orchestrator.agent.db")
+
+# Applied to every connection. WAL + synchronous=NORMAL keeps durability across
+# application crashes and only risks the last commits on power loss.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -20000",       # ~20 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",     # 256 MB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+# Statements are compiled once per connection and reused from this cache
+STATEMENT_CACHE_SIZE = 256
+
+# The progress handler fires every this many SQLite VM instructions, so
+# vm_steps_approx is a multiple of it: work is rounded down per connection and
+# short statements may not register at all. It is not a row count.
+VM_STEP_GRANULARITY = 100000
+
+
+class WorkCounters:
+    """Database work done by one counted block (see ConnectionManager.counting)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.statements = 0
+        self.vm_steps_approx = 0
+        self.rows_written = 0
+
+    def add(self, statements: int = 0, vm_steps_approx: int = 0, rows_written: int = 0):
+        # Statements of one block may run on the event loop and the memory DB thread
+        with self._lock:
+            self.statements += statements
+            self.vm_steps_approx += vm_steps_approx
+            self.rows_written += rows_written
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "statements": self.statements,
+                "vm_steps_approx": self.vm_steps_approx,
+                "rows_written": self.rows_written
+            }
+
+
+# Counters of the block running in the current context. AsyncMemorySystem runs
+# calls in a copy of the caller's context, so a task's executor work counts too.
+_active_counters: ContextVar[Optional[WorkCounters]] = ContextVar("db_work_counters", default=None)
+
+
+def _count_statement(_sql: str):
+    counters = _active_counters.get()
+    if counters is not None:
+        counters.add(statements=1)
+
+
+def _count_vm_steps() -> int:
+    counters = _active_counters.get()
+    if counters is not None:
+        counters.add(vm_steps_approx=VM_STEP_GRANULARITY)
+    return 0  # never interrupt
+
+
+class ConnectionManager:
+    """Owns the SQLite connections of a MemorySystem"""
+
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = Path(db_path)
+        self._write_lock = threading.RLock()
+        self._write_depth = 0
+        self._write_owner: Optional[int] = None
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._closed = False
+        # Number of open counting() blocks; hooks are installed only while > 0
+        self._counting = 0
+
+        self._writer = self._connect()
+        mode = self._writer.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        if mode.lower() != "wal":
+            logger.warning(f"WAL journaling unavailable for {self.db_path}, using {mode}")
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: transactions are explicit (see write())
+        conn = sqlite3.connect(
+            self.db_path,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @staticmethod
+    def _set_hooks(conn: sqlite3.Connection, enabled: bool):
+        if enabled:
+            conn.set_trace_callback(_count_statement)
+            conn.set_progress_handler(_count_vm_steps, VM_STEP_GRANULARITY)
+        else:
+            conn.set_trace_callback(None)
+            conn.set_progress_handler(None, 0)
+
+    def _toggle_counting(self, delta: int):
+        with self._readers_lock:
+            before = self._counting
+            self._counting += delta
+            if self._closed or (before > 0) == (self._counting > 0):
+                return
+            for conn in [self._writer, *self._readers]:
+                self._set_hooks(conn, self._counting > 0)
+
+    @contextmanager
+    def counting(self) -> Iterator[WorkCounters]:
+        """Count the statements, SQLite VM instructions (approximate, in
+        VM_STEP_GRANULARITY steps) and rows written by the current task or thread while the block runs.
+
+        The counting hooks cost every connection some throughput, so they are
+        installed only while at least one block is open.
+        """
+        counters = WorkCounters()
+        token = _active_counters.set(counters)
+        self._toggle_counting(1)
+        try:
+            yield counters
+        finally:
+            self._toggle_counting(-1)
+            _active_counters.reset(token)
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in one transaction on the shared writer connection.
+
+        Nested write() blocks in the same thread join the outer transaction.
+        """
+        with self._write_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Memory database is closed")
+            outermost = self._write_depth == 0
+            if outermost:
+                self._writer.execute("BEGIN IMMEDIATE")
+                self._write_owner = threading.get_ident()
+                counters = _active_counters.get()
+                changes_before = self._writer.total_changes
+            self._write_depth += 1
+            try:
+                yield self._writer
+            except BaseException:
+                self._write_depth -= 1
+                if outermost:
+                    self._write_owner = None
+                    self._writer.execute("ROLLBACK")
+                raise
+            self._write_depth -= 1
+            if outermost:
+                self._write_owner = None
+                self._writer.execute("COMMIT")
+                if counters is not None:
+                    counters.add(rows_written=self._writer.total_changes - changes_before)
+
+    def read(self) -> sqlite3.Connection:
+        """Get this thread's reader connection.
+
+        Inside a write() block the writer is returned so the transaction's own
+        uncommitted rows are visible.
+        """
+        if self._write_owner == threading.get_ident():
+            return self._writer
+
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Memory database is closed")
+            conn = self._connect()
+            conn.execute("PRAGMA query_only = ON")
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+                if self._counting:
+                    self._set_hooks(conn, True)
+        return conn
+
+    def close(self):
+        """Close the writer and all reader connections"""
+        with self._write_lock:
+            if self._closed:
+                return
+            self._closed = True
+            with self._readers_lock:
+                for conn in self._readers:
+                    conn.close()
+                self._readers.clear()
+            self._writer.close()
+        logger.info(f"Closed memory database connections for {self.db_path}")
@@ -0,0 +1,199 @@
+"""
+Error Message Clustering for the Agent Memory
+
+Normalizes error messages into templates (paths, URLs, numbers, ids and
+quoted values become placeholders) and groups them online with a Drain-style
+prefix tree: messages are routed by token count and first token to a small
+leaf of candidate clusters, so each message is compared against a bounded
+number of templates rather than every earlier error.
+"""
+
+import re
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger("apex_orchestrator.agent.error_clusters")
+
+WILDCARD = "<*>"
+
+ERROR_CLUSTER_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS error_clusters (
+        id INTEGER PRIMARY KEY,
+        template TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        exemplar TEXT,
+        first_seen_ts INTEGER,
+        last_seen_ts INTEGER
+    )
+"""
+
+# New clusters take their id from SQLite (the rowid), so writers in other
+# processes never hand out the same id; the template may change later
+INSERT_ERROR_CLUSTER_SQL = """
+    INSERT INTO error_clusters (template, count, exemplar, first_seen_ts, last_seen_ts)
+    VALUES (?, 0, ?, ?, ?)
+"""
+
+# Counts are added, so the upsert is correct when rows are batched. Multi-argument
+# MAX() is NULL if any argument is, so missing timestamps are coalesced first.
+UPSERT_ERROR_CLUSTER_SQL = """
+    INSERT INTO error_clusters (id, template, count, exemplar, first_seen_ts, last_seen_ts)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        template = excluded.template,
+        count = count + excluded.count,
+        first_seen_ts = COALESCE(first_seen_ts, excluded.first_seen_ts),
+        last_seen_ts = MAX(COALESCE(last_seen_ts, excluded.last_seen_ts),
+                           COALESCE(excluded.last_seen_ts, last_seen_ts))
+"""
+
+# Substitutions in order; earlier patterns win over the generic number rule
+_MASKS: Tuple[Tuple[re.Pattern, str], ...] = tuple((re.compile(p, re.IGNORECASE), r) for p, r in (
+    (r"\b[a-z][a-z0-9+.\-]*://\S+", "<URL>"),
+    (r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", "<ID>"),
+    (r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b", "<IP>"),
+    (r"(?<![\w.])(?:[a-z]:\\|~?/|\.{1,2}/)[^\s'\",;()\[\]]*", "<PATH>"),
+    (r"'[^'\n]*'|\"[^\"\n]*\"", "<STR>"),
+    (r"\b(?:0x)?[\w\-]*\d[\w\-]*(?:\.\d[\w\-]*)*", "<NUM>"),
+))
+
+MAX_MESSAGE_CHARS = 1000
+MAX_TOKENS = 40
+
+
+def normalize_error(message: str) -> List[str]:
+    """Template tokens of an error message with variable parts masked"""
+    text = (message or "").strip()[:MAX_MESSAGE_CHARS]
+    for pattern, replacement in _MASKS:
+        text = pattern.sub(replacement, text)
+    return text.split()[:MAX_TOKENS]
+
+
+class ErrorCluster:
+    """One group of error messages sharing a template"""
+
+    __slots__ = ("id", "tokens", "count", "exemplar", "first_seen_ts", "last_seen_ts")
+
+    def __init__(self, cluster_id: Optional[int], tokens: List[str], exemplar: str,
+                 count: int = 0, first_seen_ts: Optional[int] = None,
+                 last_seen_ts: Optional[int] = None):
+        self.id = cluster_id
+        self.tokens = tokens
+        self.count = count
+        self.exemplar = exemplar
+        self.first_seen_ts = first_seen_ts
+        self.last_seen_ts = last_seen_ts
+
+    @property
+    def template(self) -> str:
+        return " ".join(self.tokens)
+
+    def similarity(self, tokens: List[str]) -> float:
+        """Share of positions where the template has the same literal token"""
+        same = sum(1 for a, b in zip(self.tokens, tokens) if a == b and a != WILDCARD)
+        return same / len(tokens) if tokens else 1.0
+
+    def absorb(self, tokens: List[str]):
+        """Generalize the template to cover `tokens`"""
+        self.tokens = [a if a == b else WILDCARD for a, b in zip(self.tokens, tokens)]
+
+
+class ErrorClusterer:
+    """Incremental Drain-style clustering of error messages.
+
+    A message joins the most similar cluster in its leaf when at least
+    `similarity_threshold` of its tokens match the template literally; the
+    template's differing positions become wildcards. Leaves hold at most
+    `max_leaf_clusters` clusters, so assignment cost does not grow with the
+    number of errors seen. Once `max_clusters` is reached, messages that have
+    no cluster of their shape go to a catch-all cluster (template ``<*>``),
+    which takes the last slot.
+
+    Ids of new clusters come from the `assign_id` callback passed to add(),
+    normally the rowid of the cluster's row; without one they are numbered
+    in memory, which only suits a clusterer that is not persisted.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.5, max_leaf_clusters: int = 100,
+                 max_clusters: int = 10000):
+        self.similarity_threshold = similarity_threshold
+        self.max_leaf_clusters = max_leaf_clusters
+        self.max_clusters = max_clusters
+
+        self._lock = threading.Lock()
+        self._leaves: Dict[Tuple[int, str], List[ErrorCluster]] = {}
+        self.clusters: Dict[int, ErrorCluster] = {}
+
+    @staticmethod
+    def _leaf_key(tokens: List[str]) -> Tuple[int, str]:
+        return len(tokens), tokens[0] if tokens else ""
+
+    def _best_match(self, tokens: List[str], threshold: float) -> Optional[ErrorCluster]:
+        best, best_score = None, -1.0
+        for cluster in self._leaves.get(self._leaf_key(tokens), ()):
+            score = cluster.similarity(tokens)
+            if score > best_score:
+                best, best_score = cluster, score
+        return best if best is not None and best_score >= threshold else None
+
+    def add(self, message: str, ts: Optional[int] = None,
+            assign_id: Optional[Callable[[ErrorCluster], int]] = None,
+            create: bool = True) -> Optional[ErrorCluster]:
+        """Assign a message to a cluster (creating one if needed) and count it.
+
+        `assign_id` is called with the lock held to store a new cluster and
+        return its id. With `create=False` nothing is counted and None is
+        returned when the message would need a new cluster.
+        """
+        tokens = normalize_error(message)
+        with self._lock:
+            cluster = self._best_match(tokens, self.similarity_threshold)
+            leaf = self._leaves.setdefault(self._leaf_key(tokens), [])
+            if cluster is None and (len(leaf) >= self.max_leaf_clusters or
+                                    len(self.clusters) >= self.max_clusters - 1):
+                # Full: fold into the closest existing cluster instead of growing
+                cluster = self._best_match(tokens, 0.0) or self._catch_all()
+                if cluster is None:
+                    tokens = [WILDCARD]
+                    leaf = self._leaves.setdefault(self._leaf_key(tokens), [])
+            if cluster is None:
+                if not create:
+                    return None
+                cluster = ErrorCluster(None, tokens, (message or "")[:500], first_seen_ts=ts)
+                cluster.id = assign_id(cluster) if assign_id else len(self.clusters) + 1
+                self.clusters[cluster.id] = cluster
+                leaf.append(cluster)
+            else:
+                cluster.absorb(tokens)
+            cluster.count += 1
+            if ts is not None:
+                cluster.last_seen_ts = max(cluster.last_seen_ts or ts, ts)
+            return cluster
+
+    def _catch_all(self) -> Optional[ErrorCluster]:
+        """The cluster for messages arriving once max_clusters is reached, if
+        it exists yet; caller holds the lock"""
+        for cluster in self._leaves.get(self._leaf_key([WILDCARD]), ()):
+            if cluster.tokens == [WILDCARD]:
+                return cluster
+        return None
+
+    def match(self, message: str) -> Optional[ErrorCluster]:
+        """Existing cluster a message would join, without counting it"""
+        with self._lock:
+            return self._best_match(normalize_error(message), self.similarity_threshold)
+
+    def load(self, rows: Iterable[Tuple[int, str, int, Optional[str], Optional[int], Optional[int]]]):
+        """Restore clusters from (id, template, count, exemplar, first_seen_ts, last_seen_ts) rows"""
+        with self._lock:
+            for cluster_id, template, count, exemplar, first_seen, last_seen in rows:
+                cluster = ErrorCluster(cluster_id, template.split(), exemplar or "", count,
+                                       first_seen, last_seen)
+                self.clusters[cluster_id] = cluster
+                self._leaves.setdefault(self._leaf_key(cluster.tokens), []).append(cluster)
+
+    @staticmethod
+    def upsert_params(cluster: ErrorCluster, ts: Optional[int], count: int = 1) -> tuple:
+        """Parameters for UPSERT_ERROR_CLUSTER_SQL recording `count` new errors"""
+        return (cluster.id, cluster.template, count, cluster.exemplar, ts, ts)
@@ -0,0 +1,80 @@
+"""
+Safety Incident Store Schema
+
+Safety incidents live in the agent memory database, indexed by time, type
+and severity. A trigger keeps per-minute counts by type and severity in the
+same transaction as each insert, so incident rates over any window are read
+from a small table regardless of how many incidents have been stored.
+"""
+
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Tuple
+
+# Width of the rate counter buckets (epoch ms)
+INCIDENT_BUCKET_MS = 60 * 1000
+
+INCIDENT_SCHEMA: Tuple[str, ...] = (
+    """
+    CREATE TABLE IF NOT EXISTS safety_incidents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts INTEGER NOT NULL,
+        incident_type TEXT NOT NULL,
+        severity TEXT NOT NULL,
+        description TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_incidents_ts ON safety_incidents (ts)",
+    "CREATE INDEX IF NOT EXISTS idx_incidents_type_ts ON safety_incidents (incident_type, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_incidents_severity_ts ON safety_incidents (severity, ts)",
+    """
+    CREATE TABLE IF NOT EXISTS incident_counts (
+        incident_type TEXT NOT NULL,
+        severity TEXT NOT NULL,
+        bucket_ts INTEGER NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (incident_type, severity, bucket_ts)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_incident_counts_bucket ON incident_counts (bucket_ts)",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_safety_incidents_counts
+    AFTER INSERT ON safety_incidents
+    BEGIN
+        INSERT INTO incident_counts (incident_type, severity, bucket_ts, count)
+        VALUES (NEW.incident_type, NEW.severity, NEW.ts - NEW.ts % {INCIDENT_BUCKET_MS}, 1)
+        ON CONFLICT(incident_type, severity, bucket_ts) DO UPDATE SET count = count + 1;
+    END
+    """,
+)
+
+INSERT_INCIDENT_SQL = """
+    INSERT INTO safety_incidents (ts, incident_type, severity, description)
+    VALUES (?, ?, ?, ?)
+"""
+
+# Lines written by the text incident log: "<iso time> [SEVERITY] type: description"
+_LOG_LINE = re.compile(r"^(\S+) \[([A-Z]+)\] ([^:\s]+): (.*)$")
+
+
+def format_log_line(iso_timestamp: str, incident_type: str, description: str, severity: str) -> str:
+    """One line of the optional text incident log"""
+    return f"{iso_timestamp} [{severity.upper()}] {incident_type}: {description}\n"
+
+
+def parse_incident_log(path: Path) -> Iterator[Tuple[int, str, str, str]]:
+    """(ts, incident_type, severity, description) for each parseable log line"""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            match = _LOG_LINE.match(line.rstrip("\n"))
+            if not match:
+                continue
+            timestamp, severity, incident_type, description = match.groups()
+            try:
+                parsed = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+            except ValueError:
+                continue
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            yield int(parsed.timestamp() * 1000), incident_type, severity.lower(), description
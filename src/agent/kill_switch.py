@@ -0,0 +1,99 @@
+"""
+Kill Switch Watcher
+
+Tracks whether the emergency kill switch file exists so safety checks can
+read a flag instead of hitting the filesystem. A background thread polls the
+file's mtime at a fixed interval and pushes state changes to subscribers;
+changes made by this process (activating or clearing the switch) are applied
+immediately with `refresh`.
+"""
+
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger("apex_orchestrator.agent.kill_switch")
+
+
+class KillSwitchWatcher:
+    """Polls the kill switch file and notifies listeners when it appears or goes away"""
+
+    def __init__(self, path, poll_interval_seconds: float = 1.0):
+        self.path = Path(path)
+        self.poll_interval_seconds = poll_interval_seconds
+
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[bool], None]] = []
+        self._mtime = self._stat()
+        self.active = self._mtime is not None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Stats
+        self.polls = 0
+        self.changes = 0
+
+    def _stat(self) -> Optional[float]:
+        """mtime of the kill switch file, or None if it does not exist"""
+        try:
+            return os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def add_listener(self, listener: Callable[[bool], None]):
+        """Call `listener(active)` whenever the kill switch trips or is cleared"""
+        self._listeners.append(listener)
+
+    def start(self):
+        """Start polling in a background thread (no-op if the interval is 0)"""
+        if self._thread is not None or self.poll_interval_seconds <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="kill-switch-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Kill switch check failed: {e}")
+
+    def refresh(self) -> bool:
+        """Check the file now; returns whether the kill switch is active"""
+        mtime = self._stat()
+        with self._lock:
+            self.polls += 1
+            self._mtime = mtime
+            active = mtime is not None
+            if active == self.active:
+                return active
+            self.active = active
+            self.changes += 1
+
+        for listener in self._listeners:
+            try:
+                listener(active)
+            except Exception as e:
+                logger.error(f"Kill switch listener failed: {e}")
+        return active
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "active": self.active,
+            "modified_at": datetime.utcfromtimestamp(self._mtime).isoformat() if self._mtime else None,
+            "poll_interval_seconds": self.poll_interval_seconds,
+            "watching": self._thread is not None,
+            "polls": self.polls,
+            "changes": self.changes
+        }
@@ -6,121 +6,119 @@ Analyzes execution history, identifies patterns, and suggests optimizations.
 
 import json
 import logging
+import time
 from typing import Dict, List, Any, Optional, Tuple
-from datetime import datetime, timedelta
 from collections import Counter
-import re
+from datetime import datetime
+
+from .memory import ERROR_CLASSES
+from .analytics import LatencyAnalyzer
 
 logger = logging.getLogger("apex_orchestrator.agent.learner")
 
+# agent_state key holding the id of the last execution learned from
+LEARNING_WATERMARK_KEY = "learning_watermark_execution_id"
+
 
 class PatternLearner:
     """Learn patterns from execution history and suggest improvements"""
     
     def __init__(self, memory_system):
         self.memory = memory_system
+        self.latency = LatencyAnalyzer(memory_system)
         logger.info("Pattern learner initialized")
     
     def analyze_execution_patterns(self, hours: int = 24) -> Dict[str, Any]:
         """Analyze recent execution patterns"""
-        history = self.memory.get_execution_history(limit=1000)
-        
-        # Filter by time
-        cutoff = datetime.utcnow() - timedelta(hours=hours)
-        recent = [
-            ex for ex in history 
-            if datetime.fromisoformat(ex['timestamp']) > cutoff
-        ]
+        since_ts = int((time.time() - hours * 3600) * 1000)
+        # Percentiles and trends come from the NumPy analyzer below
+        analytics = self.memory.get_execution_analytics(since_ts, detailed=False)
         
-        if not recent:
+        if not analytics['total_executions']:
             return {"message": "No recent executions to analyze"}
         
+        latency = self.latency.analyze(hours=hours)
+        
         analysis = {
-            "total_executions": len(recent),
-            "success_rate": sum(1 for ex in recent if ex['success']) / len(recent),
-            "avg_execution_time_ms": sum(ex['execution_time_ms'] for ex in recent) / len(recent),
-            "operation_types": self._analyze_operation_types(recent),
-            "common_failures": self._analyze_failures(recent),
-            "performance_trends": self._analyze_performance(recent),
+            "total_executions": analytics['total_executions'],
+            "success_rate": analytics['success_rate'],
+            "avg_execution_time_ms": analytics['avg_execution_time_ms'],
+            "operation_types": self._analyze_operation_types(analytics),
+            "common_failures": self._analyze_failures(analytics),
+            "performance_trends": self._analyze_performance(analytics, latency),
+            "latency": latency,
             "recommendations": []
         }
         
         # Generate recommendations
         analysis["recommendations"] = self._generate_recommendations(analysis)
         
-        logger.info(f"Analyzed {len(recent)} executions")
+        logger.info(f"Analyzed {analytics['total_executions']} executions")
         return analysis
     
-    def _analyze_operation_types(self, executions: List[Dict]) -> Dict:
+    def _analyze_operation_types(self, analytics: Dict) -> Dict:
         """Analyze distribution of operation types"""
-        types = [ex['operation_type'] for ex in executions]
-        counter = Counter(types)
+        by_operation = analytics['by_operation']  # sorted by count, descending
         
         return {
-            "distribution": dict(counter),
-            "most_common": counter.most_common(5)
+            "distribution": {op['operation_type']: op['count'] for op in by_operation},
+            "most_common": [(op['operation_type'], op['count']) for op in by_operation[:5]]
         }
     
-    def _analyze_failures(self, executions: List[Dict]) -> List[Dict]:
+    def _analyze_failures(self, analytics: Dict) -> List[Dict]:
         """Analyze common failure patterns"""
-        failures = [ex for ex in executions if not ex['success']]
-        
+        failures = analytics['failures']
         if not failures:
             return []
         
-        error_patterns = Counter()
-        for failure in failures:
-            if failure['error_message']:
-                # Extract error type
-                error_type = self._extract_error_type(failure['error_message'])
-                error_patterns[error_type] += 1
+        # Clustered error templates; the keyword classes only cover unclustered rows
+        clusters = analytics.get('failures_by_cluster')
+        if clusters:
+            return [
+                {"error_type": self._extract_error_type(entry['exemplar']),
+                 "cluster_id": entry['cluster_id'], "template": entry['template'],
+                 "exemplar": entry['exemplar'], "count": entry['count'],
+                 "percentage": entry['count'] / failures * 100}
+                for entry in clusters[:5]
+            ]
         
         return [
-            {"error_type": error, "count": count, "percentage": count / len(failures) * 100}
-            for error, count in error_patterns.most_common(5)
+            {"error_type": entry['error_type'], "count": entry['count'],
+             "percentage": entry['count'] / failures * 100}
+            for entry in analytics['failures_by_error_type'][:5]
         ]
     
     def _extract_error_type(self, error_message: str) -> str:
-        """Extract error type from message"""
-        # Common error patterns
-        patterns = [
-            (r'timeout', 'Timeout'),
-            (r'permission denied', 'Permission Denied'),
-            (r'not found', 'Not Found'),
-            (r'connection', 'Connection Error'),
-            (r'rate limit', 'Rate Limit'),
-        ]
-        
-        error_lower = error_message.lower()
-        for pattern, error_type in patterns:
-            if re.search(pattern, error_lower):
+        """Extract error type from message (same classes as the SQL aggregation)"""
+        error_lower = (error_message or '').lower()
+        for needle, error_type in ERROR_CLASSES:
+            if needle in error_lower:
                 return error_type
         
         return "Unknown Error"
     
-    def _analyze_performance(self, executions: List[Dict]) -> Dict:
+    def _analyze_performance(self, analytics: Dict, latency: Dict) -> Dict:
         """Analyze performance trends"""
-        if len(executions) < 10:
+        if analytics['total_executions'] < 10 or 'overall' not in latency:
             return {"message": "Insufficient data for trend analysis"}
         
-        # Sort by timestamp
-        sorted_execs = sorted(executions, key=lambda x: x['timestamp'])
-        
-        # Split into first half and second half
-        mid = len(sorted_execs) // 2
-        first_half = sorted_execs[:mid]
-        second_half = sorted_execs[mid:]
-        
-        first_avg = sum(ex['execution_time_ms'] for ex in first_half) / len(first_half)
-        second_avg = sum(ex['execution_time_ms'] for ex in second_half) / len(second_half)
-        
+        # Average latency of the earlier vs later half of the window's executions
+        first_avg, second_avg = (avg or 0 for avg in latency['halves_mean_ms'])
         improvement = ((first_avg - second_avg) / first_avg * 100) if first_avg > 0 else 0
         
+        # Trend verdict from the least-squares fit over all samples
+        overall = latency['overall']
+        regression = overall['trend']
         return {
             "early_period_avg_ms": round(first_avg, 2),
             "recent_period_avg_ms": round(second_avg, 2),
             "performance_change_percent": round(improvement, 2),
-            "trend": "improving" if improvement > 5 else "degrading" if improvement < -5 else "stable"
+            "trend": regression['trend'],
+            "slope_ms_per_hour": regression.get('slope_ms_per_hour'),
+            "slope_ci95_ms_per_hour": regression.get('slope_ci95_ms_per_hour'),
+            "ewma_ms": overall['ewma_ms'],
+            "p50_ms": overall['p50_ms'],
+            "p99_ms": overall['p99_ms']
         }
     
     def _generate_recommendations(self, analysis: Dict) -> List[str]:
@@ -141,11 +139,27 @@ class PatternLearner:
                 "Consider optimizing slow operations or implementing caching."
             )
         
+        # Tail latency and trend recommendations per operation type
+        for op_type, stats in analysis.get('latency', {}).get('by_operation', {}).items():
+            if stats['p99_ms'] > 5000 and stats['p99_ms'] > 5 * max(stats['p50_ms'], 1):
+                recommendations.append(
+                    f"{op_type} has a heavy latency tail (p50 {stats['p50_ms']:.0f}ms, "
+                    f"p99 {stats['p99_ms']:.0f}ms). Add timeouts or investigate outliers."
+                )
+            if stats['trend'].get('trend') == 'degrading':
+                recommendations.append(
+                    f"{op_type} latency is rising by {stats['trend']['slope_ms_per_hour']:.0f}ms/hour "
+                    f"({stats['trend']['change_over_window_percent']:.0f}% over the window)."
+                )
+        
         # Failure pattern recommendations
         if analysis['common_failures']:
             top_failure = analysis['common_failures'][0]
+            description = top_failure['error_type']
+            if 'template' in top_failure:
+                description += f" '{top_failure['template'][:120]}'"
             recommendations.append(
-                f"Most common failure: {top_failure['error_type']} "
+                f"Most common failure: {description} "
                 f"({top_failure['percentage']:.1f}% of failures). "
                 "Implement specific handling for this error type."
             )
@@ -156,33 +170,34 @@ class PatternLearner:
         """Identify specific code optimization opportunities"""
         opportunities = []
         
-        # Check for slow operations
-        history = self.memory.get_execution_history(limit=500)
-        slow_ops = [ex for ex in history if ex['execution_time_ms'] > 10000]
-        
-        if slow_ops:
-            # Group by operation type
-            slow_by_type = {}
-            for op in slow_ops:
-                op_type = op['operation_type']
-                if op_type not in slow_by_type:
-                    slow_by_type[op_type] = []
-                slow_by_type[op_type].append(op)
-            
-            for op_type, ops in slow_by_type.items():
-                avg_time = sum(op['execution_time_ms'] for op in ops) / len(ops)
-                opportunities.append({
-                    "type": "performance",
-                    "operation": op_type,
-                    "issue": f"Slow execution (avg {avg_time:.0f}ms)",
-                    "suggestion": "Consider adding caching, parallel execution, or optimization",
-                    "priority": "high" if avg_time > 30000 else "medium",
-                    "occurrences": len(ops)
-                })
+        # Check for slow operations (by tail latency over the last 24h)
+        latency = self.latency.analyze(hours=24)
+        for slow in self.latency.slow_operations(latency, p95_threshold_ms=10000):
+            opportunities.append({
+                "type": "performance",
+                "operation": slow['operation'],
+                "issue": f"Slow execution (p95 {slow['p95_ms']:.0f}ms, p99 {slow['p99_ms']:.0f}ms)",
+                "suggestion": "Consider adding caching, parallel execution, or optimization",
+                "priority": "high" if slow['p95_ms'] > 30000 else "medium",
+                "occurrences": slow['count']
+            })
+        
+        for degrading in self.latency.degrading_operations(latency):
+            trend = degrading['trend']
+            opportunities.append({
+                "type": "performance",
+                "operation": degrading['operation'],
+                "issue": f"Latency rising {trend['slope_ms_per_hour']:.0f}ms/hour "
+                         f"(95% CI {trend['slope_ci95_ms_per_hour'][0]:.0f}..{trend['slope_ci95_ms_per_hour'][1]:.0f})",
+                "suggestion": "Check for growing inputs, resource leaks or a recent regression",
+                "priority": "medium",
+                "occurrences": degrading['count']
+            })
         
         # Check for frequent failures
+        history = self.memory.get_execution_history(limit=500)
         failures = [ex for ex in history if not ex['success']]
-        if len(failures) / len(history) > 0.2:  # More than 20% failure rate
+        if history and len(failures) / len(history) > 0.2:  # More than 20% failure rate
             opportunities.append({
                 "type": "reliability",
                 "issue": f"High failure rate: {len(failures)/len(history)*100:.1f}%",
@@ -212,20 +227,7 @@ class PatternLearner:
         if not execution.get('success'):
             return
         
-        # Extract pattern from successful execution
-        pattern_data = {
-            "operation_type": execution['operation_type'],
-            "intent": execution['intent'],
-            "plan_summary": self._summarize_plan(execution.get('plan', {}))
-        }
-        
-        self.memory.save_pattern(
-            pattern_type="successful_execution",
-            pattern_data=pattern_data,
-            success=True,
-            execution_time_ms=execution['execution_time_ms']
-        )
-        
+        self.memory.save_patterns([self._pattern_observation(execution)])
         logger.debug(f"Learned from successful {execution['operation_type']}")
     
     def learn_from_failure(self, execution: Dict):
@@ -233,22 +235,78 @@ class PatternLearner:
         if execution.get('success'):
             return
         
-        # Extract pattern from failed execution
-        pattern_data = {
-            "operation_type": execution['operation_type'],
-            "intent": execution['intent'],
-            "error_type": self._extract_error_type(execution.get('error_message', '')),
-            "error_message": execution.get('error_message', '')[:200]  # Limit length
-        }
+        self.memory.save_patterns([self._pattern_observation(execution)])
+        logger.debug(f"Learned from failed {execution['operation_type']}")
+    
+    def _pattern_observation(self, execution: Dict) -> Dict[str, Any]:
+        """Extract the pattern observation for one execution"""
+        if execution.get('success'):
+            pattern_type = "successful_execution"
+            pattern_data = {
+                "operation_type": execution['operation_type'],
+                "intent": execution['intent'],
+                "plan_summary": self._summarize_plan(execution.get('plan', {}))
+            }
+        else:
+            error_message = execution.get('error_message') or ''
+            pattern_type = "failed_execution"
+            # Failures with the same error template share one pattern
+            cluster_id = execution.get('error_cluster_id')
+            if cluster_id is None and error_message:
+                cluster = self.memory.error_clusters.match(error_message)
+                cluster_id = cluster.id if cluster else None
+            pattern_data = {
+                "operation_type": execution['operation_type'],
+                "intent": execution['intent'],
+                "error_type": self._extract_error_type(error_message),
+                "error_cluster_id": cluster_id
+            }
+            if cluster_id is None:
+                pattern_data["error_message"] = error_message[:200]  # Limit length
         
-        self.memory.save_pattern(
-            pattern_type="failed_execution",
-            pattern_data=pattern_data,
-            success=False,
-            execution_time_ms=execution['execution_time_ms']
-        )
+        return {
+            "pattern_type": pattern_type,
+            "pattern_data": pattern_data,
+            "success": bool(execution.get('success')),
+            "execution_time_ms": execution.get('execution_time_ms') or 0
+        }
+    
+    def learn_batch(self, executions: List[Dict]) -> int:
+        """Learn from many executions with one bulk pattern upsert"""
+        return self.memory.save_patterns(self._pattern_observation(ex) for ex in executions)
+    
+    def has_unlearned_executions(self) -> bool:
+        """Whether executions were recorded since the last learning run"""
+        last_id = int(self.memory.get_agent_state(LEARNING_WATERMARK_KEY) or 0)
+        return self.memory.get_latest_execution_id() > last_id
+    
+    def learn_new_executions(self, batch_size: int = 500, max_batches: int = 20) -> int:
+        """Learn from executions recorded since the last run.
+
+        The id of the last learned execution is kept in agent_state and moved
+        forward in the same transaction as each batch's pattern upsert, so
+        every execution is learned exactly once. At most max_batches batches
+        are processed per call; a backlog is worked off over several calls.
+        Returns the number of executions learned.
+        """
+        learned = 0
+        for _ in range(max_batches):
+            last_id = int(self.memory.get_agent_state(LEARNING_WATERMARK_KEY) or 0)
+            batch = self.memory.get_executions_after(last_id, limit=batch_size)
+            if not batch:
+                break
+            
+            with self.memory.transaction():
+                self.learn_batch(batch)
+                self.memory.set_agent_state(LEARNING_WATERMARK_KEY, str(batch[-1]['id']))
+            learned += len(batch)
+            
+            if len(batch) < batch_size:
+                break
         
-        logger.debug(f"Learned from failed {execution['operation_type']}")
+        if learned:
+            logger.info(f"Learned from {learned} new executions")
+        return learned
     
     def _summarize_plan(self, plan: Any) -> str:
         """Create a summary of an execution plan"""
@@ -267,12 +325,13 @@ class PatternLearner:
         
         return str(plan)[:100]
     
-    def suggest_improvements(self) -> List[Dict]:
-        """Suggest specific code improvements"""
+    def suggest_improvements(self, opportunities: Optional[List[Dict]] = None) -> List[Dict]:
+        """Suggest specific code improvements (from `opportunities` if already computed)"""
         suggestions = []
         
         # Analyze patterns
-        opportunities = self.identify_optimization_opportunities()
+        if opportunities is None:
+            opportunities = self.identify_optimization_opportunities()
         
         for opp in opportunities:
             if opp.get('priority') == 'high':
@@ -298,6 +357,20 @@ class PatternLearner:
         logger.info(f"Generated {len(suggestions)} improvement suggestions")
         return suggestions
     
+    def build_learning_report(self, latest_execution_id: int) -> Dict[str, Any]:
+        """Analysis, opportunities and suggestions as of `latest_execution_id`"""
+        analysis = self.analyze_execution_patterns(hours=24)
+        opportunities = self.identify_optimization_opportunities()
+        suggestions = self.suggest_improvements(opportunities)
+        
+        return {
+            "timestamp": datetime.utcnow().isoformat(),
+            "latest_execution_id": latest_execution_id,
+            "execution_analysis": analysis,
+            "optimization_opportunities": opportunities,
+            "improvement_suggestions": suggestions
+        }
+    
     def _estimate_effort(self, opportunity: Dict) -> str:
         """Estimate implementation effort"""
         if opportunity['type'] == 'code_reuse':
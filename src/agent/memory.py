@@ -4,31 +4,409 @@ Memory System for Autonomous Agent
 Provides persistent memory, context management, and execution history tracking.
 """
 
+import os
+import base64
 import sqlite3
 import json
 import hashlib
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Any, Optional, Tuple
 import logging
 
+from .db import ConnectionManager
+from .write_behind import WriteBehindBuffer
+from .rollups import MetricRollups, ROLLUP_SCHEMA
+from .error_clusters import (
+    ErrorClusterer, ERROR_CLUSTER_SCHEMA, INSERT_ERROR_CLUSTER_SQL, UPSERT_ERROR_CLUSTER_SQL
+)
+from .incidents import INCIDENT_BUCKET_MS, INCIDENT_SCHEMA, INSERT_INCIDENT_SQL, parse_incident_log
+
 logger = logging.getLogger("apex_orchestrator.agent.memory")
 
+_INSERT_EXECUTION_SQL = """
+    INSERT INTO executions 
+    (timestamp, ts, operation_type, intent, plan, success, execution_time_ms, 
+     error_message, context, result_hash, error_cluster_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_INSERT_METRIC_SQL = """
+    INSERT INTO metrics (timestamp, ts, metric_name, metric_value, context)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+
+# Error classes in match order: (substring of the lowercased message, class)
+ERROR_CLASSES = (
+    ("timeout", "Timeout"),
+    ("permission denied", "Permission Denied"),
+    ("not found", "Not Found"),
+    ("connection", "Connection Error"),
+    ("rate limit", "Rate Limit"),
+)
+
+_ERROR_CLASS_SQL = "CASE {} ELSE 'Unknown Error' END".format(" ".join(
+    f"WHEN lower(error_message) LIKE '%{needle}%' THEN '{label}'"
+    for needle, label in ERROR_CLASSES
+))
+
+# Nearest-rank latency percentiles per operation type via window functions
+_LATENCY_PERCENTILES_SQL = """
+    WITH ranked AS (
+        SELECT operation_type, execution_time_ms AS t,
+               ROW_NUMBER() OVER (PARTITION BY operation_type ORDER BY execution_time_ms) AS rn,
+               COUNT(*) OVER (PARTITION BY operation_type) AS n
+        FROM executions
+        WHERE ts >= ? AND ts < ? AND execution_time_ms IS NOT NULL
+    )
+    SELECT operation_type,
+           MAX(CASE WHEN rn = CAST(0.50 * (n - 1) AS INTEGER) + 1 THEN t END) AS p50,
+           MAX(CASE WHEN rn = CAST(0.90 * (n - 1) AS INTEGER) + 1 THEN t END) AS p90,
+           MAX(CASE WHEN rn = CAST(0.99 * (n - 1) AS INTEGER) + 1 THEN t END) AS p99
+    FROM ranked
+    GROUP BY operation_type
+"""
+
+# Merges a batch of observations into a pattern; SET expressions see the old row
+_UPSERT_PATTERN_SQL = """
+    INSERT INTO patterns 
+    (pattern_type, pattern_hash, pattern_data, success_count, failure_count, 
+     avg_execution_time_ms, last_used, created_at, confidence_score)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(pattern_type, pattern_hash) DO UPDATE SET
+        avg_execution_time_ms = (
+            COALESCE(avg_execution_time_ms, 0) * (success_count + failure_count)
+            + excluded.avg_execution_time_ms * (excluded.success_count + excluded.failure_count)
+        ) / (success_count + failure_count + excluded.success_count + excluded.failure_count),
+        success_count = success_count + excluded.success_count,
+        failure_count = failure_count + excluded.failure_count,
+        last_used = excluded.last_used,
+        confidence_score = (success_count + excluded.success_count) * 1.0
+            / (success_count + failure_count + excluded.success_count + excluded.failure_count)
+"""
+
+
+def _pattern_hash(pattern_json: str) -> str:
+    return hashlib.sha256(pattern_json.encode()).hexdigest()[:16]
+
+
+def encode_cursor(ts: int, row_id: int) -> str:
+    """Opaque pagination cursor for a (ts, id) position"""
+    return base64.urlsafe_b64encode(f"{ts}:{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.split(":")
+        return int(ts), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def _utc_now() -> Tuple[str, int]:
+    """Current time as (ISO text, epoch milliseconds)"""
+    now = time.time()
+    return datetime.utcfromtimestamp(now).isoformat(), int(now * 1000)
+
+
+def _cutoff_ms(hours: float) -> int:
+    """Epoch milliseconds `hours` ago, for `ts > ?` range scans"""
+    return int((time.time() - hours * 3600) * 1000)
+
+
+def _migrate_epoch_timestamps(cursor: sqlite3.Cursor):
+    """v1: integer epoch-ms `ts` columns plus indexes for time-window queries"""
+    for table in ("executions", "metrics"):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN ts INTEGER")
+        # Existing rows: ISO text (UTC) -> epoch ms
+        cursor.execute(f"""
+            UPDATE {table}
+            SET ts = CAST((julianday(timestamp) - 2440587.5) * 86400000 AS INTEGER)
+        """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_executions_ts ON executions (ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_executions_type_ts ON executions (operation_type, ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_metrics_name_ts ON metrics (metric_name, ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_patterns_type_confidence "
+                   "ON patterns (pattern_type, confidence_score)")
+
+
+# Running totals behind get_statistics(), re-derivable from the base tables
+_COUNTER_QUERIES = {
+    "total_executions": "SELECT COUNT(*) FROM executions",
+    "successful_executions": "SELECT COUNT(*) FROM executions WHERE success = 1",
+    "learned_patterns": "SELECT COUNT(*) FROM patterns",
+    "code_templates": "SELECT COUNT(*) FROM code_templates",
+    "total_modifications": "SELECT COUNT(*) FROM modifications",
+    "applied_modifications": "SELECT COUNT(*) FROM modifications WHERE applied = 1",
+}
+
+# Triggers keep the counters current in the same transaction as each write
+_COUNTER_TRIGGERS = {
+    "executions": {
+        "INSERT": {"total_executions": "1", "successful_executions": "NEW.success = 1"},
+        "DELETE": {"total_executions": "-1", "successful_executions": "-(OLD.success = 1)"},
+    },
+    "patterns": {
+        "INSERT": {"learned_patterns": "1"},
+        "DELETE": {"learned_patterns": "-1"},
+    },
+    "code_templates": {
+        "INSERT": {"code_templates": "1"},
+        "DELETE": {"code_templates": "-1"},
+    },
+    "modifications": {
+        "INSERT": {"total_modifications": "1", "applied_modifications": "NEW.applied = 1"},
+        "DELETE": {"total_modifications": "-1", "applied_modifications": "-(OLD.applied = 1)"},
+        "UPDATE OF applied": {"applied_modifications": "(NEW.applied = 1) - (OLD.applied = 1)"},
+    },
+}
+
+
+def _reconcile_counters(cursor: sqlite3.Cursor) -> Dict[str, int]:
+    """Recompute every counter from its base table"""
+    values = {name: cursor.execute(query).fetchone()[0] for name, query in _COUNTER_QUERIES.items()}
+    cursor.executemany(
+        "INSERT OR REPLACE INTO memory_counters (name, value) VALUES (?, ?)",
+        list(values.items())
+    )
+    return values
+
+
+def _migrate_statistics_counters(cursor: sqlite3.Cursor):
+    """v2: trigger-maintained counters for O(1) statistics"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS memory_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    for table, events in _COUNTER_TRIGGERS.items():
+        for event, deltas in events.items():
+            updates = "\n".join(
+                f"UPDATE memory_counters SET value = value + ({delta}) WHERE name = '{name}';"
+                for name, delta in deltas.items()
+            )
+            suffix = event.split()[0].lower()
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_counters_{suffix}
+                AFTER {event} ON {table}
+                BEGIN
+                {updates}
+                END
+            """)
+    _reconcile_counters(cursor)
+
+
+def _migrate_metric_rollups(cursor: sqlite3.Cursor):
+    """v3: minute/hour rollup buckets for the metrics table"""
+    cursor.execute(ROLLUP_SCHEMA)
+
+
+def _migrate_pattern_hashes(cursor: sqlite3.Cursor):
+    """v4: unique (pattern_type, pattern_hash) key for pattern upserts"""
+    cursor.execute("ALTER TABLE patterns ADD COLUMN pattern_hash TEXT")
+    
+    # Backfill hashes; duplicates are removed and folded back in via upsert
+    seen = set()
+    duplicates = []
+    rows = cursor.execute("""
+        SELECT id, pattern_type, pattern_data, success_count, failure_count,
+               avg_execution_time_ms, last_used
+        FROM patterns ORDER BY id
+    """).fetchall()
+    for pid, ptype, data, succ, fail, avg_time, last_used in rows:
+        try:
+            data = json.dumps(json.loads(data), sort_keys=True)
+        except ValueError:
+            pass
+        phash = _pattern_hash(data)
+        if (ptype, phash) in seen:
+            cursor.execute("DELETE FROM patterns WHERE id = ?", (pid,))
+            duplicates.append((ptype, phash, data, succ, fail, avg_time or 0, last_used, last_used, 0.0))
+        else:
+            seen.add((ptype, phash))
+            cursor.execute("UPDATE patterns SET pattern_hash = ? WHERE id = ?", (phash, pid))
+    
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_patterns_type_hash "
+                   "ON patterns (pattern_type, pattern_hash)")
+    cursor.executemany(_UPSERT_PATTERN_SQL, duplicates)
+
+
+def _migrate_error_clusters(cursor: sqlite3.Cursor):
+    """v5: error message clusters, with existing failures assigned to them"""
+    cursor.execute(ERROR_CLUSTER_SCHEMA)
+    cursor.execute("ALTER TABLE executions ADD COLUMN error_cluster_id INTEGER")
+    
+    clusterer = ErrorClusterer()
+    last_id = 0
+    while True:
+        rows = cursor.execute("""
+            SELECT id, ts, error_message FROM executions
+            WHERE id > ? AND success = 0 AND error_message IS NOT NULL AND error_message != ''
+            ORDER BY id LIMIT 5000
+        """, (last_id,)).fetchall()
+        if not rows:
+            break
+        cursor.executemany(
+            "UPDATE executions SET error_cluster_id = ? WHERE id = ?",
+            [(clusterer.add(message, ts).id, eid) for eid, ts, message in rows]
+        )
+        last_id = rows[-1][0]
+    
+    cursor.executemany(
+        "INSERT INTO error_clusters (id, template, count, exemplar, first_seen_ts, last_seen_ts) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [(c.id, c.template, c.count, c.exemplar, c.first_seen_ts, c.last_seen_ts)
+         for c in clusterer.clusters.values()]
+    )
+
+
+def _migrate_safety_incidents(cursor: sqlite3.Cursor):
+    """v6: indexed safety incident store, seeded from the text incident log"""
+    for statement in INCIDENT_SCHEMA:
+        cursor.execute(statement)
+    
+    # The text log was written next to the default database (logs/)
+    db_file = cursor.execute("PRAGMA database_list").fetchone()[2]
+    log_path = Path(db_file).parent / "safety_incidents.log" if db_file else None
+    if log_path is not None and log_path.exists():
+        cursor.executemany(INSERT_INCIDENT_SQL, parse_incident_log(log_path))
+
+
+# Schema migrations in order; PRAGMA user_version records how many have run
+MIGRATIONS: Tuple[Callable[[sqlite3.Cursor], None], ...] = (
+    _migrate_epoch_timestamps,
+    _migrate_statistics_counters,
+    _migrate_metric_rollups,
+    _migrate_pattern_hashes,
+    _migrate_error_clusters,
+    _migrate_safety_incidents,
+)
+
 
 class MemorySystem:
     """Persistent memory system for the autonomous agent"""
     
-    def __init__(self, db_path: str = "logs/agent_memory.db"):
+    def __init__(self, db_path: str = "logs/agent_memory.db",
+                 write_behind: Optional[bool] = None,
+                 flush_batch_size: int = 500,
+                 flush_interval_seconds: float = 1.0,
+                 max_pending_writes: int = 10000,
+                 raw_metrics_retention_hours: Optional[float] = None,
+                 minute_rollup_retention_days: Optional[float] = None,
+                 hour_rollup_retention_days: Optional[float] = None):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = ConnectionManager(self.db_path)
         self._init_database()
-        logger.info(f"Memory system initialized at {self.db_path}")
+        
+        # Online clustering of error messages, restored from the database
+        self.error_clusters = ErrorClusterer()
+        self.error_clusters.load(self.db.read().execute(
+            "SELECT id, template, count, exemplar, first_seen_ts, last_seen_ts FROM error_clusters"
+        ))
+        
+        # Metric downsampling and retention
+        if raw_metrics_retention_hours is None:
+            raw_metrics_retention_hours = float(os.getenv("AGENT_METRICS_RAW_RETENTION_HOURS", "24"))
+        if minute_rollup_retention_days is None:
+            minute_rollup_retention_days = float(os.getenv("AGENT_METRICS_MINUTE_RETENTION_DAYS", "7"))
+        if hour_rollup_retention_days is None:
+            hour_rollup_retention_days = float(os.getenv("AGENT_METRICS_HOUR_RETENTION_DAYS", "365"))
+        self.rollups = MetricRollups(
+            self.db,
+            raw_retention_hours=raw_metrics_retention_hours,
+            minute_retention_days=minute_rollup_retention_days,
+            hour_retention_days=hour_rollup_retention_days
+        )
+        
+        # Optional write-behind batching for executions and metrics
+        if write_behind is None:
+            write_behind = os.getenv("AGENT_MEMORY_WRITE_BEHIND", "false").lower() == "true"
+        self.write_buffer: Optional[WriteBehindBuffer] = None
+        if write_behind:
+            self.write_buffer = WriteBehindBuffer(
+                self.db,
+                batch_size=flush_batch_size,
+                flush_interval_seconds=flush_interval_seconds,
+                max_pending=max_pending_writes
+            )
+        
+        self._execution_listeners: List[Callable[..., None]] = []
+        self._modification_listeners: List[Callable[..., None]] = []
+        
+        logger.info(f"Memory system initialized at {self.db_path} (write-behind: {bool(write_behind)})")
+    
+    def flush(self) -> int:
+        """Write any buffered executions and metrics now"""
+        if self.write_buffer is None:
+            return 0
+        return self.write_buffer.flush()
+    
+    def add_execution_listener(self, listener: Callable[..., None]):
+        """Call `listener(operation_type, success, execution_time_ms, error_message)`
+        after every recorded execution"""
+        self._execution_listeners.append(listener)
+    
+    def add_modification_listener(self, listener: Callable[..., None]):
+        """Call `listener(modification_type, applied)` after every recorded modification"""
+        self._modification_listeners.append(listener)
+    
+    def _flush_pending(self):
+        """Write buffered rows before work that must see all of them.
+
+        Ordinary reads do not flush, so hot paths keep the batching benefit and
+        see buffered rows after the next flush (within flush_interval_seconds).
+        """
+        if self.write_buffer is not None and self.write_buffer.pending:
+            self.write_buffer.flush()
+    
+    def _insert(self, sql: str, params: tuple, related: Tuple[Tuple[str, tuple], ...] = ()):
+        """Insert directly or through the write-behind buffer, together with
+        any `related` statements that must commit with the row"""
+        if self.write_buffer is not None:
+            self.write_buffer.add(sql, params, related)
+            return
+        with self.db.write() as conn:
+            conn.execute(sql, params)
+            for statement, values in related:
+                conn.execute(statement, values)
+    
+    def transaction(self):
+        """Group several memory writes into one atomic transaction.
+
+        Usage: ``with memory.transaction(): ...``; writes made inside join it.
+        """
+        return self.db.write()
+    
+    def close(self):
+        """Flush buffered writes and close all database connections"""
+        if self.write_buffer is not None:
+            self.write_buffer.close()
+        self.db.close()
     
     def _init_database(self):
         """Initialize the database schema"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        with self.db.write() as conn:
+            cursor = conn.cursor()
+            self._create_schema(cursor)
+            self._migrate(cursor)
+        logger.info("Database schema initialized")
+    
+    def _migrate(self, cursor: sqlite3.Cursor):
+        """Apply pending schema migrations inside the schema transaction"""
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {number}")
+            logger.info(f"Applied memory schema migration {number}: {migration.__doc__}")
+    
+    def _create_schema(self, cursor: sqlite3.Cursor):
+        """Create tables that do not exist yet"""
         # Execution history
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS executions (
@@ -112,10 +490,12 @@ class MemorySystem:
                 context TEXT
             )
         """)
-        
-        conn.commit()
-        conn.close()
-        logger.info("Database schema initialized")
+    
+    @staticmethod
+    def _rows_to_dicts(cursor: sqlite3.Cursor) -> List[Dict]:
+        """Convert the rows of an executed cursor into dicts"""
+        columns = [desc[0] for desc in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
     
     def record_execution(self, operation_type: str, intent: str, plan: Dict, 
                         success: bool, execution_time_ms: int, 
@@ -123,21 +503,31 @@ class MemorySystem:
                         context: Optional[Dict] = None,
                         result: Optional[Any] = None):
         """Record an execution in memory"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         result_hash = None
         if result:
             result_str = json.dumps(result, sort_keys=True)
             result_hash = hashlib.sha256(result_str.encode()).hexdigest()[:16]
         
-        cursor.execute("""
-            INSERT INTO executions 
-            (timestamp, operation_type, intent, plan, success, execution_time_ms, 
-             error_message, context, result_hash)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            datetime.utcnow().isoformat(),
+        timestamp, ts = _utc_now()
+        cluster = None
+        related = ()
+        if not success and error_message:
+            cluster = self.error_clusters.add(error_message, ts, create=False)
+            if cluster is None:
+                # A new cluster's row is committed first so SQLite assigns its
+                # id; the count is added below, with the execution
+                with self.db.write() as conn:
+                    cluster = self.error_clusters.add(
+                        error_message, ts,
+                        assign_id=lambda c: conn.execute(INSERT_ERROR_CLUSTER_SQL, (
+                            c.template, c.exemplar, c.first_seen_ts, c.first_seen_ts
+                        )).lastrowid
+                    )
+            related = ((UPSERT_ERROR_CLUSTER_SQL, ErrorClusterer.upsert_params(cluster, ts)),)
+        
+        self._insert(_INSERT_EXECUTION_SQL, (
+            timestamp,
+            ts,
             operation_type,
             intent,
             json.dumps(plan),
@@ -145,19 +535,21 @@ class MemorySystem:
             execution_time_ms,
             error_message,
             json.dumps(context) if context else None,
-            result_hash
-        ))
+            result_hash,
+            cluster.id if cluster else None
+        ), related)
+        
+        for listener in self._execution_listeners:
+            try:
+                listener(operation_type, success, execution_time_ms, error_message)
+            except Exception as e:
+                logger.error(f"Execution listener failed: {e}")
         
-        conn.commit()
-        conn.close()
         logger.info(f"Recorded execution: {operation_type} - Success: {success}")
     
     def get_execution_history(self, limit: int = 100, 
                              operation_type: Optional[str] = None) -> List[Dict]:
         """Retrieve execution history"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         query = "SELECT * FROM executions"
         params = []
         
@@ -165,38 +557,321 @@ class MemorySystem:
             query += " WHERE operation_type = ?"
             params.append(operation_type)
         
-        query += " ORDER BY timestamp DESC LIMIT ?"
+        query += " ORDER BY ts DESC, id DESC LIMIT ?"
         params.append(limit)
         
-        cursor.execute(query, params)
-        columns = [desc[0] for desc in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return self._rows_to_dicts(self.db.read().execute(query, params))
+    
+    def query_executions(self, limit: int = 100, cursor: Optional[str] = None,
+                         operation_type: Optional[str] = None,
+                         success: Optional[bool] = None,
+                         since_ts: Optional[int] = None,
+                         until_ts: Optional[int] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Page through executions, newest first, with keyset pagination.
+
+        Pages are addressed by the (ts, id) of the last row seen, so every page
+        is an index range scan no matter how deep. `since_ts`/`until_ts` are
+        epoch milliseconds (inclusive/exclusive). Returns (rows, next_cursor);
+        next_cursor is None on the last page.
+        """
+        conditions, params = [], []
+        
+        if operation_type:
+            conditions.append("operation_type = ?")
+            params.append(operation_type)
+        if success is not None:
+            conditions.append("success = ?")
+            params.append(1 if success else 0)
+        if since_ts is not None:
+            conditions.append("ts >= ?")
+            params.append(since_ts)
+        if until_ts is not None:
+            conditions.append("ts < ?")
+            params.append(until_ts)
+        if cursor:
+            conditions.append("(ts, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
         
-        conn.close()
-        return results
+        query = "SELECT * FROM executions"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY ts DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+        
+        rows = self._rows_to_dicts(self.db.read().execute(query, params))
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1]['ts'], rows[-1]['id'])
+    
+    def get_latest_execution_id(self) -> int:
+        """Id of the most recent execution (0 when there are none)"""
+        return self.db.read().execute("SELECT MAX(id) FROM executions").fetchone()[0] or 0
+    
+    def get_executions_after(self, last_id: int, limit: int = 500) -> List[Dict]:
+        """Executions with id > last_id in id order (primary-key range scan)"""
+        return self._rows_to_dicts(self.db.read().execute(
+            "SELECT * FROM executions WHERE id > ? ORDER BY id LIMIT ?", (last_id, limit)
+        ))
+    
+    def iter_executions(self, batch_size: int = 1000, **filters) -> Iterator[Dict]:
+        """Yield matching executions page by page in constant memory.
+
+        Accepts the filters of query_executions. Each page is a separate query,
+        so the generator may be resumed from any thread.
+        """
+        cursor = None
+        while True:
+            rows, cursor = self.query_executions(limit=batch_size, cursor=cursor, **filters)
+            yield from rows
+            if cursor is None:
+                return
+    
+    def get_execution_analytics(self, since_ts: int, until_ts: Optional[int] = None,
+                                bucket_ms: int = 3600 * 1000,
+                                detailed: bool = True) -> Dict[str, Any]:
+        """Aggregate executions in [since_ts, until_ts) entirely in SQL.
+
+        Returns the window summary, per-operation counts/latency percentiles,
+        a time series in `bucket_ms` buckets, failures by error class and the
+        average latency of the earlier vs later half of the window's rows.
+        detailed=False skips the percentiles and halves, which need a sort of
+        the whole window.
+        """
+        until_ts = until_ts if until_ts is not None else int(time.time() * 1000)
+        window = (since_ts, until_ts)
+        conn = self.db.read()
+        
+        total, successes, failures, avg_ms = conn.execute("""
+            SELECT COUNT(*), SUM(success = 1), SUM(success = 0), AVG(execution_time_ms)
+            FROM executions WHERE ts >= ? AND ts < ?
+        """, window).fetchone()
+        
+        percentiles = {
+            row[0]: {"p50_ms": row[1], "p90_ms": row[2], "p99_ms": row[3]}
+            for row in conn.execute(_LATENCY_PERCENTILES_SQL, window)
+        } if detailed else {}
+        by_operation = []
+        for op_type, count, op_successes, op_avg, op_max in conn.execute("""
+            SELECT operation_type, COUNT(*), SUM(success = 1), AVG(execution_time_ms),
+                   MAX(execution_time_ms)
+            FROM executions WHERE ts >= ? AND ts < ?
+            GROUP BY operation_type
+            ORDER BY COUNT(*) DESC
+        """, window):
+            entry = {
+                "operation_type": op_type,
+                "count": count,
+                "success_rate": op_successes / count,
+                "avg_ms": op_avg,
+                "max_ms": op_max
+            }
+            entry.update(percentiles.get(op_type, {}))
+            by_operation.append(entry)
+        
+        timeseries = [
+            {"bucket_ts": bucket * bucket_ms, "count": count,
+             "success_rate": bucket_successes / count, "avg_ms": bucket_avg}
+            for bucket, count, bucket_successes, bucket_avg in conn.execute("""
+                SELECT ts / ? AS bucket, COUNT(*), SUM(success = 1), AVG(execution_time_ms)
+                FROM executions WHERE ts >= ? AND ts < ?
+                GROUP BY bucket
+                ORDER BY bucket
+            """, (bucket_ms,) + window)
+        ]
+        
+        failures_by_class = [
+            {"error_type": error_type, "count": count}
+            for error_type, count in conn.execute(f"""
+                SELECT {_ERROR_CLASS_SQL} AS error_type, COUNT(*) AS n
+                FROM executions
+                WHERE ts >= ? AND ts < ? AND success = 0 AND error_message IS NOT NULL
+                    AND error_message != ''
+                GROUP BY error_type
+                ORDER BY n DESC
+            """, window)
+        ]
+        
+        failures_by_cluster = self._failures_by_cluster(conn, "e.ts >= ? AND e.ts < ?", window, limit=20)
+        
+        # Halves by row order, as NTILE splits the window's rows evenly
+        halves = dict(conn.execute("""
+            SELECT half, AVG(execution_time_ms) FROM (
+                SELECT execution_time_ms, NTILE(2) OVER (ORDER BY ts, id) AS half
+                FROM executions WHERE ts >= ? AND ts < ?
+            )
+            GROUP BY half
+        """, window).fetchall()) if detailed else {}
+        
+        return {
+            "since_ts": since_ts,
+            "until_ts": until_ts,
+            "bucket_ms": bucket_ms,
+            "total_executions": total,
+            "successes": successes or 0,
+            "failures": failures or 0,
+            "success_rate": (successes or 0) / total if total else 0.0,
+            "avg_execution_time_ms": avg_ms or 0.0,
+            "by_operation": by_operation,
+            "timeseries": timeseries,
+            "failures_by_error_type": failures_by_class,
+            "failures_by_cluster": failures_by_cluster,
+            "halves_avg_ms": [halves.get(1), halves.get(2)]
+        }
+    
+    def _failures_by_cluster(self, conn, where: str, params: tuple, limit: int) -> List[Dict[str, Any]]:
+        rows = conn.execute(f"""
+            SELECT e.error_cluster_id, COUNT(*) AS n, MAX(e.ts), c.template, c.exemplar, c.count
+            FROM executions e JOIN error_clusters c ON c.id = e.error_cluster_id
+            WHERE {where} AND e.success = 0
+            GROUP BY e.error_cluster_id
+            ORDER BY n DESC
+            LIMIT ?
+        """, params + (limit,))
+        return [
+            {"cluster_id": cluster_id, "count": count, "last_seen_ts": last_ts,
+             "template": template, "exemplar": exemplar, "total_count": total}
+            for cluster_id, count, last_ts, template, exemplar, total in rows
+        ]
+    
+    def get_error_clusters(self, limit: int = 20, since_ts: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Most frequent error clusters, overall or among failures since `since_ts`"""
+        conn = self.db.read()
+        if since_ts is not None:
+            return self._failures_by_cluster(conn, "e.ts >= ?", (since_ts,), limit)
+        return [
+            {"cluster_id": cluster_id, "count": count, "last_seen_ts": last_ts,
+             "template": template, "exemplar": exemplar, "total_count": count}
+            for cluster_id, template, count, exemplar, last_ts in conn.execute("""
+                SELECT id, template, count, exemplar, last_seen_ts FROM error_clusters
+                ORDER BY count DESC LIMIT ?
+            """, (limit,))
+        ]
+    
+    def record_incident(self, incident_type: str, description: str, severity: str,
+                        ts: Optional[int] = None) -> int:
+        """Store a safety incident; returns its id"""
+        if ts is None:
+            ts = _utc_now()[1]
+        with self.db.write() as conn:
+            cursor = conn.execute(INSERT_INCIDENT_SQL, (ts, incident_type, severity.lower(), description))
+            return cursor.lastrowid
+    
+    def query_incidents(self, limit: int = 100, cursor: Optional[str] = None,
+                        incident_type: Optional[str] = None,
+                        severity: Optional[str] = None,
+                        since_ts: Optional[int] = None,
+                        until_ts: Optional[int] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Page through safety incidents, newest first (keyset pagination as in
+        query_executions). Returns (rows, next_cursor)."""
+        conditions, params = [], []
+        
+        if incident_type:
+            conditions.append("incident_type = ?")
+            params.append(incident_type)
+        if severity:
+            conditions.append("severity = ?")
+            params.append(severity.lower())
+        if since_ts is not None:
+            conditions.append("ts >= ?")
+            params.append(since_ts)
+        if until_ts is not None:
+            conditions.append("ts < ?")
+            params.append(until_ts)
+        if cursor:
+            conditions.append("(ts, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        
+        query = "SELECT id, ts, incident_type, severity, description FROM safety_incidents"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY ts DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+        
+        rows = self._rows_to_dicts(self.db.read().execute(query, params))
+        for row in rows:
+            row['timestamp'] = datetime.utcfromtimestamp(row['ts'] / 1000).isoformat()
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1]['ts'], rows[-1]['id'])
+    
+    def get_incident_rates(self, since_ts: int, until_ts: Optional[int] = None,
+                           bucket_ms: int = 3600 * 1000,
+                           incident_type: Optional[str] = None) -> Dict[str, Any]:
+        """Incident counts per type over time, read from the per-minute counters
+        (so `since_ts` is effectively rounded down to the minute).
+
+        `bucket_ms` should be a multiple of a minute. Returns per-type series
+        of {ts, count} (empty buckets omitted) and totals by type and severity.
+        """
+        if until_ts is None:
+            until_ts = _utc_now()[1]
+        conditions = ["bucket_ts >= ?", "bucket_ts < ?"]
+        params: List[Any] = [since_ts - since_ts % INCIDENT_BUCKET_MS, until_ts]
+        if incident_type:
+            conditions.append("incident_type = ?")
+            params.append(incident_type)
+        where = " AND ".join(conditions)
+        conn = self.db.read()
+        
+        series: Dict[str, List[Dict[str, int]]] = {}
+        for itype, bucket, count in conn.execute(f"""
+            SELECT incident_type, bucket_ts - bucket_ts % ? AS bucket, SUM(count)
+            FROM incident_counts WHERE {where}
+            GROUP BY incident_type, bucket ORDER BY incident_type, bucket
+        """, [bucket_ms] + params):
+            series.setdefault(itype, []).append({"ts": bucket, "count": count})
+        
+        totals: Dict[str, Dict[str, int]] = {}
+        for itype, severity, count in conn.execute(f"""
+            SELECT incident_type, severity, SUM(count) FROM incident_counts
+            WHERE {where} GROUP BY incident_type, severity
+        """, params):
+            totals.setdefault(itype, {})[severity] = count
+        
+        return {
+            "since_ts": since_ts,
+            "until_ts": until_ts,
+            "bucket_ms": bucket_ms,
+            "series": series,
+            "totals": totals,
+            "total": sum(sum(by_severity.values()) for by_severity in totals.values())
+        }
+    
+    def get_incident_counts(self, since_ts: int) -> List[Tuple[int, str, str, int]]:
+        """(bucket_ts, incident_type, severity, count) per-minute counters since
+        `since_ts`, oldest first"""
+        return self.db.read().execute("""
+            SELECT bucket_ts, incident_type, severity, count FROM incident_counts
+            WHERE bucket_ts >= ? ORDER BY bucket_ts
+        """, (since_ts - since_ts % INCIDENT_BUCKET_MS,)).fetchall()
+    
+    def get_latency_samples(self, since_ts: int, until_ts: int) -> List[Tuple[int, str, float]]:
+        """(ts, operation_type, execution_time_ms) rows in the window, in time order"""
+        return self.db.read().execute("""
+            SELECT ts, operation_type, execution_time_ms FROM executions
+            WHERE ts >= ? AND ts < ? AND execution_time_ms IS NOT NULL
+            ORDER BY ts, id
+        """, (since_ts, until_ts)).fetchall()
     
     def get_success_rate(self, operation_type: Optional[str] = None, 
                         hours: int = 24) -> float:
         """Calculate success rate for operations"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         query = """
             SELECT 
                 SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) as successes,
                 COUNT(*) as total
             FROM executions
-            WHERE datetime(timestamp) > datetime('now', '-' || ? || ' hours')
+            WHERE ts > ?
         """
-        params = [hours]
+        params = [_cutoff_ms(hours)]
         
         if operation_type:
             query += " AND operation_type = ?"
             params.append(operation_type)
         
-        cursor.execute(query, params)
-        result = cursor.fetchone()
-        conn.close()
+        result = self.db.read().execute(query, params).fetchone()
         
         if result and result[1] > 0:
             return result[0] / result[1]
@@ -205,239 +880,206 @@ class MemorySystem:
     def save_pattern(self, pattern_type: str, pattern_data: Dict, 
                     success: bool, execution_time_ms: int):
         """Save a learned pattern"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        self.save_patterns([{
+            "pattern_type": pattern_type,
+            "pattern_data": pattern_data,
+            "success": success,
+            "execution_time_ms": execution_time_ms
+        }])
+        logger.info(f"Saved pattern: {pattern_type}")
+    
+    def save_patterns(self, observations: Iterable[Dict[str, Any]]) -> int:
+        """Upsert many pattern observations in one transaction.
+
+        Each observation has pattern_type, pattern_data, success and
+        execution_time_ms. Repeats of the same pattern are pre-aggregated, so
+        each distinct pattern is written once. Returns the number of distinct
+        patterns written.
+        """
+        batch: Dict[Tuple[str, str], List] = {}
+        for obs in observations:
+            pattern_json = json.dumps(obs["pattern_data"], sort_keys=True)
+            key = (obs["pattern_type"], _pattern_hash(pattern_json))
+            entry = batch.get(key)
+            if entry is None:
+                entry = batch[key] = [pattern_json, 0, 0, 0]
+            if obs["success"]:
+                entry[1] += 1
+            else:
+                entry[2] += 1
+            entry[3] += obs["execution_time_ms"] or 0
         
-        pattern_json = json.dumps(pattern_data, sort_keys=True)
-        pattern_hash = hashlib.sha256(pattern_json.encode()).hexdigest()[:16]
+        if not batch:
+            return 0
         
-        # Check if pattern exists
-        cursor.execute("""
-            SELECT id, success_count, failure_count, avg_execution_time_ms 
-            FROM patterns 
-            WHERE pattern_type = ? AND result_hash = ?
-        """, (pattern_type, pattern_hash))
-        
-        existing = cursor.fetchone()
-        
-        if existing:
-            # Update existing pattern
-            pid, succ, fail, avg_time = existing
-            new_succ = succ + (1 if success else 0)
-            new_fail = fail + (0 if success else 1)
-            new_avg = ((avg_time or 0) * (succ + fail) + execution_time_ms) / (new_succ + new_fail)
-            confidence = new_succ / (new_succ + new_fail) if (new_succ + new_fail) > 0 else 0.5
-            
-            cursor.execute("""
-                UPDATE patterns 
-                SET success_count = ?, failure_count = ?, 
-                    avg_execution_time_ms = ?, last_used = ?,
-                    confidence_score = ?
-                WHERE id = ?
-            """, (new_succ, new_fail, new_avg, datetime.utcnow().isoformat(), confidence, pid))
-        else:
-            # Insert new pattern
-            cursor.execute("""
-                INSERT INTO patterns 
-                (pattern_type, pattern_data, success_count, failure_count, 
-                 avg_execution_time_ms, last_used, created_at, confidence_score)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                pattern_type,
-                pattern_json,
-                1 if success else 0,
-                0 if success else 1,
-                execution_time_ms,
-                datetime.utcnow().isoformat(),
-                datetime.utcnow().isoformat(),
-                1.0 if success else 0.0
-            ))
+        now = datetime.utcnow().isoformat()
+        rows = [
+            (ptype, phash, pattern_json, succ, fail, total_time / (succ + fail),
+             now, now, succ / (succ + fail))
+            for (ptype, phash), (pattern_json, succ, fail, total_time) in batch.items()
+        ]
+        with self.db.write() as conn:
+            conn.executemany(_UPSERT_PATTERN_SQL, rows)
         
-        conn.commit()
-        conn.close()
-        logger.info(f"Saved pattern: {pattern_type}")
+        logger.debug(f"Upserted {len(rows)} patterns")
+        return len(rows)
     
     def get_best_patterns(self, pattern_type: str, limit: int = 10) -> List[Dict]:
         """Get best performing patterns"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
+        return self._rows_to_dicts(self.db.read().execute("""
             SELECT * FROM patterns
             WHERE pattern_type = ?
             ORDER BY confidence_score DESC, success_count DESC
             LIMIT ?
-        """, (pattern_type, limit))
-        
-        columns = [desc[0] for desc in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        conn.close()
-        return results
+        """, (pattern_type, limit)))
     
     def save_code_template(self, name: str, code: str, description: str = "",
                           language: str = "python", tags: List[str] = None):
         """Save a reusable code template"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         now = datetime.utcnow().isoformat()
         tags_str = json.dumps(tags) if tags else "[]"
         
-        cursor.execute("""
-            INSERT OR REPLACE INTO code_templates 
-            (name, description, code, language, created_at, updated_at, tags)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (name, description, code, language, now, now, tags_str))
+        # Upsert rather than REPLACE: keeps id, created_at and use_count, and
+        # does not bypass the delete trigger on the counters
+        with self.db.write() as conn:
+            conn.execute("""
+                INSERT INTO code_templates 
+                (name, description, code, language, created_at, updated_at, tags)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    description = excluded.description,
+                    code = excluded.code,
+                    language = excluded.language,
+                    updated_at = excluded.updated_at,
+                    tags = excluded.tags
+            """, (name, description, code, language, now, now, tags_str))
         
-        conn.commit()
-        conn.close()
         logger.info(f"Saved code template: {name}")
     
     def get_code_template(self, name: str) -> Optional[Dict]:
         """Retrieve a code template"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM code_templates WHERE name = ?", (name,))
-        result = cursor.fetchone()
-        
-        if result:
-            columns = [desc[0] for desc in cursor.description]
-            template = dict(zip(columns, result))
-            conn.close()
-            return template
-        
-        conn.close()
-        return None
+        results = self._rows_to_dicts(
+            self.db.read().execute("SELECT * FROM code_templates WHERE name = ?", (name,))
+        )
+        return results[0] if results else None
     
     def record_modification(self, modification_type: str, target_file: str,
                           description: str, code_before: str, code_after: str,
                           test_results: Dict, applied: bool, reason: str = ""):
         """Record a self-modification attempt"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.db.write() as conn:
+            conn.execute("""
+                INSERT INTO modifications
+                (timestamp, modification_type, target_file, description,
+                 code_before, code_after, test_results, applied, reason)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                datetime.utcnow().isoformat(),
+                modification_type,
+                target_file,
+                description,
+                code_before,
+                code_after,
+                json.dumps(test_results),
+                applied,
+                reason
+            ))
         
-        cursor.execute("""
-            INSERT INTO modifications
-            (timestamp, modification_type, target_file, description,
-             code_before, code_after, test_results, applied, reason)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            datetime.utcnow().isoformat(),
-            modification_type,
-            target_file,
-            description,
-            code_before,
-            code_after,
-            json.dumps(test_results),
-            applied,
-            reason
-        ))
+        for listener in self._modification_listeners:
+            try:
+                listener(modification_type, applied)
+            except Exception as e:
+                logger.error(f"Modification listener failed: {e}")
         
-        conn.commit()
-        conn.close()
         logger.info(f"Recorded modification: {modification_type} - Applied: {applied}")
     
     def get_agent_state(self, key: str) -> Optional[str]:
         """Get agent state value"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT value FROM agent_state WHERE key = ?", (key,))
-        result = cursor.fetchone()
-        conn.close()
-        
+        result = self.db.read().execute(
+            "SELECT value FROM agent_state WHERE key = ?", (key,)
+        ).fetchone()
         return result[0] if result else None
     
     def set_agent_state(self, key: str, value: str):
         """Set agent state value"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT OR REPLACE INTO agent_state (key, value, updated_at)
-            VALUES (?, ?, ?)
-        """, (key, value, datetime.utcnow().isoformat()))
-        
-        conn.commit()
-        conn.close()
+        with self.db.write() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO agent_state (key, value, updated_at)
+                VALUES (?, ?, ?)
+            """, (key, value, datetime.utcnow().isoformat()))
     
     def record_metric(self, metric_name: str, metric_value: float, 
                      context: Optional[Dict] = None):
         """Record a performance metric"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO metrics (timestamp, metric_name, metric_value, context)
-            VALUES (?, ?, ?, ?)
-        """, (
-            datetime.utcnow().isoformat(),
+        timestamp, ts = _utc_now()
+        self._insert(_INSERT_METRIC_SQL, (
+            timestamp,
+            ts,
             metric_name,
             metric_value,
             json.dumps(context) if context else None
         ))
-        
-        conn.commit()
-        conn.close()
     
     def get_metrics(self, metric_name: str, hours: int = 24) -> List[Dict]:
         """Get metrics for analysis"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
+        return self._rows_to_dicts(self.db.read().execute("""
             SELECT * FROM metrics
-            WHERE metric_name = ?
-            AND datetime(timestamp) > datetime('now', '-' || ? || ' hours')
-            ORDER BY timestamp DESC
-        """, (metric_name, hours))
-        
-        columns = [desc[0] for desc in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        conn.close()
-        return results
+            WHERE metric_name = ? AND ts > ?
+            ORDER BY ts DESC
+        """, (metric_name, _cutoff_ms(hours))))
+    
+    def compact_metrics(self) -> Dict[str, int]:
+        """Roll new raw metrics up into minute/hour buckets and apply retention"""
+        self._flush_pending()
+        compacted = self.rollups.compact()
+        pruned = self.rollups.prune()
+        return {"compacted": compacted, "pruned": pruned}
+    
+    def get_metric_series(self, metric_name: str, hours: float = 24,
+                          min_points: int = 24,
+                          resolution: Optional[str] = None) -> Dict[str, Any]:
+        """Get a metric as a time series at the coarsest resolution that fits.
+
+        Windows inside the raw retention with too few minute buckets are served
+        from raw rows; longer windows from minute or hour rollups, which are as
+        fresh as the last compact_metrics() run (once per agent cycle).
+        """
+        return self.rollups.get_series(metric_name, hours=hours, min_points=min_points,
+                                       resolution=resolution)
     
     def get_statistics(self) -> Dict[str, Any]:
-        """Get overall memory statistics"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        stats = {}
-        
-        # Total executions
-        cursor.execute("SELECT COUNT(*) FROM executions")
-        stats['total_executions'] = cursor.fetchone()[0]
-        
-        # Success rate
-        cursor.execute("""
-            SELECT 
-                SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) * 100.0 / COUNT(*) 
-            FROM executions
-        """)
-        stats['overall_success_rate'] = cursor.fetchone()[0] or 0.0
+        """Get overall memory statistics from the maintained counters"""
+        counters = dict(self.db.read().execute(
+            "SELECT name, value FROM memory_counters"
+        ).fetchall())
         
-        # Learned patterns
-        cursor.execute("SELECT COUNT(*) FROM patterns")
-        stats['learned_patterns'] = cursor.fetchone()[0]
-        
-        # Code templates
-        cursor.execute("SELECT COUNT(*) FROM code_templates")
-        stats['code_templates'] = cursor.fetchone()[0]
-        
-        # Modifications
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN applied = 1 THEN 1 ELSE 0 END) as applied
-            FROM modifications
-        """)
-        mod_result = cursor.fetchone()
-        stats['total_modifications'] = mod_result[0]
-        stats['applied_modifications'] = mod_result[1] or 0
-        
-        conn.close()
-        return stats
+        total = counters.get('total_executions', 0)
+        return {
+            'total_executions': total,
+            'overall_success_rate': (
+                counters.get('successful_executions', 0) * 100.0 / total if total else 0.0
+            ),
+            'learned_patterns': counters.get('learned_patterns', 0),
+            'code_templates': counters.get('code_templates', 0),
+            'total_modifications': counters.get('total_modifications', 0),
+            'applied_modifications': counters.get('applied_modifications', 0)
+        }
+    
+    def reconcile_statistics(self) -> Dict[str, Any]:
+        """Re-derive the statistics counters from the base tables.
 
+        Returns the counters that had drifted, as {name: (stored, actual)}.
+        """
+        self._flush_pending()
+        with self.db.write() as conn:
+            cursor = conn.cursor()
+            stored = dict(cursor.execute("SELECT name, value FROM memory_counters").fetchall())
+            actual = _reconcile_counters(cursor)
+        
+        drift = {
+            name: (stored.get(name), value)
+            for name, value in actual.items() if stored.get(name) != value
+        }
+        if drift:
+            logger.warning(f"Reconciled drifted memory counters: {drift}")
+        return drift
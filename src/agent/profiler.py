@@ -0,0 +1,216 @@
+"""
+Agent Cycle Profiler
+
+Records wall time, process CPU time and database work (statements,
+approximate VM instructions, rows written) for each phase of every agent
+cycle, keeps a bounded history, and on request samples the stacks of the
+event-loop and memory DB threads during one cycle to show where its time goes.
+
+Database work is counted for the cycle's own task, including the memory calls
+it awaits, so concurrent API requests are not attributed to a phase. Work
+done in the cycle worker process (process mode) and rows buffered for a
+background write-behind flush are not included.
+"""
+
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("apex_orchestrator.agent.profiler")
+
+# Threads whose stacks are sampled besides the one running the cycle
+SAMPLED_THREAD_PREFIXES = ("memory-db",)
+
+# Scope of the per-phase database counters, reported with the profile
+DB_COUNTER_SCOPE = "cycle task in this process (excludes the cycle worker process and background flushes)"
+
+
+class StackSampler:
+    """Samples thread stacks at a fixed interval and aggregates them by function"""
+
+    def __init__(self, thread_ids: List[int], interval_seconds: float = 0.005, max_depth: int = 40):
+        self.thread_ids = set(thread_ids)
+        self.interval_seconds = interval_seconds
+        self.max_depth = max_depth
+        self.samples = 0
+        self.self_counts: Counter = Counter()
+        self.total_counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="cycle-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            frames = sys._current_frames()
+            for thread_id in self.thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                self._record(frame)
+            del frames
+
+    def _record(self, frame):
+        seen = set()
+        leaf = True
+        depth = 0
+        while frame is not None and depth < self.max_depth:
+            code = frame.f_code
+            key = f"{code.co_filename}:{code.co_firstlineno}({code.co_name})"
+            if leaf:
+                self.self_counts[key] += 1
+                leaf = False
+            if key not in seen:
+                self.total_counts[key] += 1
+                seen.add(key)
+            frame = frame.f_back
+            depth += 1
+        self.samples += 1
+
+    def report(self, limit: int = 25) -> Dict[str, Any]:
+        samples = max(self.samples, 1)
+
+        def top(counts: Counter) -> List[Dict[str, Any]]:
+            return [
+                {"function": key, "samples": count, "percent": round(count / samples * 100, 1)}
+                for key, count in counts.most_common(limit)
+            ]
+
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval_seconds * 1000,
+            "top_cumulative": top(self.total_counts),
+            "top_self": top(self.self_counts)
+        }
+
+
+class CycleProfiler:
+    """Per-phase timing of agent cycles with an on-demand stack profile"""
+
+    def __init__(self, db, history_size: int = 200, sample_interval_seconds: float = 0.005):
+        self.db = db
+        self.history: deque = deque(maxlen=history_size)
+        self.sample_interval_seconds = sample_interval_seconds
+        self.latest_profile: Optional[Dict[str, Any]] = None
+        self._capture_requested = False
+        self._current: Optional[Dict[str, Any]] = None
+        self._sampler: Optional[StackSampler] = None
+
+    def request_capture(self):
+        """Sample stacks during the next cycle"""
+        self._capture_requested = True
+
+    @property
+    def capture_pending(self) -> bool:
+        return self._capture_requested
+
+    def begin_cycle(self, cycle: int, reason: str, total_executions: Optional[int] = None):
+        self._current = {
+            "cycle": cycle,
+            "reason": reason,
+            "started_at": time.time(),
+            "total_executions": total_executions,
+            "phases": {},
+            "_wall": time.perf_counter(),
+            "_cpu": time.process_time()
+        }
+        if self._capture_requested:
+            self._capture_requested = False
+            thread_ids = [threading.get_ident()] + [
+                t.ident for t in threading.enumerate()
+                if t.ident is not None and t.name.startswith(SAMPLED_THREAD_PREFIXES)
+            ]
+            self._sampler = StackSampler(thread_ids, self.sample_interval_seconds)
+            self._sampler.start()
+            logger.info(f"Sampling stacks for agent cycle {cycle}")
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Measure one phase of the current cycle.
+
+        CPU time is process-wide; database counters cover only the task
+        running the phase (see DB_COUNTER_SCOPE).
+        """
+        with self.db.counting() as counters:
+            wall, cpu = time.perf_counter(), time.process_time()
+            try:
+                yield
+            finally:
+                if self._current is not None:
+                    self._current["phases"][name] = {
+                        "wall_ms": round((time.perf_counter() - wall) * 1000, 2),
+                        "cpu_ms": round((time.process_time() - cpu) * 1000, 2),
+                        **counters.snapshot()
+                    }
+
+    def end_cycle(self) -> Optional[Dict[str, Any]]:
+        """Close the current cycle and add it to the history"""
+        entry, self._current = self._current, None
+        if entry is None:
+            return None
+        entry["wall_ms"] = round((time.perf_counter() - entry.pop("_wall")) * 1000, 2)
+        entry["cpu_ms"] = round((time.process_time() - entry.pop("_cpu")) * 1000, 2)
+        self.history.append(entry)
+
+        if self._sampler is not None:
+            self._sampler.stop()
+            self.latest_profile = {
+                "cycle": entry["cycle"],
+                "captured_at": entry["started_at"],
+                "wall_ms": entry["wall_ms"],
+                **self._sampler.report()
+            }
+            self._sampler = None
+        return entry
+
+    def get_phase_summary(self) -> Dict[str, Dict[str, Any]]:
+        """Timing statistics per phase over the history.
+
+        `ms_per_1k_executions` is the least-squares slope of phase wall time
+        against the number of stored executions, i.e. how much slower the
+        phase gets as memory grows.
+        """
+        by_phase: Dict[str, List[tuple]] = {}
+        for entry in self.history:
+            for name, stats in entry["phases"].items():
+                by_phase.setdefault(name, []).append((entry["total_executions"], stats))
+
+        summary = {}
+        for name, rows in by_phase.items():
+            wall = np.array([stats["wall_ms"] for _, stats in rows])
+            phase = {
+                "cycles": len(rows),
+                "last_wall_ms": float(wall[-1]),
+                "mean_wall_ms": round(float(wall.mean()), 2),
+                "p95_wall_ms": round(float(np.percentile(wall, 95)), 2),
+                "mean_cpu_ms": round(float(np.mean([stats["cpu_ms"] for _, stats in rows])), 2),
+                "mean_statements": round(float(np.mean([stats["statements"] for _, stats in rows])), 1),
+                "ms_per_1k_executions": None
+            }
+            sizes = np.array([size for size, _ in rows if size is not None], dtype=float)
+            if len(sizes) == len(rows) and len(rows) >= 5 and np.ptp(sizes) > 0:
+                slope = np.polyfit(sizes / 1000, wall, 1)[0]
+                phase["ms_per_1k_executions"] = round(float(slope), 3)
+            summary[name] = phase
+        return summary
+
+    def get_report(self, history_limit: int = 20) -> Dict[str, Any]:
+        return {
+            "cycles_recorded": len(self.history),
+            "db_counter_scope": DB_COUNTER_SCOPE,
+            "phases": self.get_phase_summary(),
+            "history": list(self.history)[-history_limit:],
+            "capture_pending": self._capture_requested,
+            "latest_profile": self.latest_profile
+        }
@@ -0,0 +1,338 @@
+"""
+Metric Rollups for the Agent Memory
+
+Downsamples the raw `metrics` table into minute and hour buckets (count, sum,
+min, max and a log-bucketed histogram for approximate quantiles) and prunes
+raw rows and old buckets according to per-resolution retention.
+"""
+
+import json
+import math
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+from .db import ConnectionManager
+
+logger = logging.getLogger("apex_orchestrator.agent.rollups")
+
+MINUTE_MS = 60 * 1000
+HOUR_MS = 60 * MINUTE_MS
+
+# Resolution name -> bucket width in milliseconds, finest first
+RESOLUTIONS = {"minute": MINUTE_MS, "hour": HOUR_MS}
+
+# Compaction tracks the last folded row id, not a timestamp: write-behind
+# retries can commit rows long after their ts, and they still get new ids
+WATERMARK_KEY = "metric_rollup_watermark_id"
+# Earlier releases tracked a ts watermark; honoured once, then dropped
+LEGACY_WATERMARK_KEY = "metric_rollup_watermark_ts"
+
+ROLLUP_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS metric_rollups (
+        metric_name TEXT NOT NULL,
+        resolution TEXT NOT NULL,
+        bucket_ts INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        sum REAL NOT NULL,
+        min REAL NOT NULL,
+        max REAL NOT NULL,
+        histogram TEXT NOT NULL,
+        PRIMARY KEY (metric_name, resolution, bucket_ts)
+    ) WITHOUT ROWID
+"""
+
+
+class LogHistogram:
+    """Mergeable histogram with logarithmic buckets.
+
+    Values are mapped to bucket ceil(log_gamma(|v|)), so any quantile is
+    returned within `relative_accuracy` of a value actually observed. With
+    `max_bins` set, the lowest buckets are folded together once the limit is
+    reached, which keeps memory constant at the cost of the lowest quantiles.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, counts: Optional[Dict[str, int]] = None,
+                 max_bins: Optional[int] = None):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.counts: Dict[str, int] = dict(counts or {})
+        self.max_bins = max_bins
+
+    def _key(self, value: float) -> str:
+        if value == 0:
+            return "0"
+        index = math.ceil(math.log(abs(value)) / self._log_gamma)
+        return f"{'-' if value < 0 else '+'}{index}"
+
+    def _value(self, key: str) -> float:
+        if key == "0":
+            return 0.0
+        magnitude = 2 * self.gamma ** int(key[1:]) / (self.gamma + 1)
+        return -magnitude if key[0] == "-" else magnitude
+
+    def add(self, value: float, count: int = 1):
+        key = self._key(value)
+        self.counts[key] = self.counts.get(key, 0) + count
+        if self.max_bins and len(self.counts) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        """Fold the lowest buckets into one until within max_bins"""
+        ordered = sorted(self.counts, key=self._value)
+        excess = len(ordered) - self.max_bins
+        target = ordered[excess]
+        for key in ordered[:excess]:
+            self.counts[target] += self.counts.pop(key)
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def merge(self, other: "LogHistogram"):
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = sum(self.counts.values())
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for value, count in sorted((self._value(k), c) for k, c in self.counts.items()):
+            seen += count
+            if seen > rank:
+                return value
+        return value
+
+    def to_json(self) -> str:
+        return json.dumps(self.counts, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, data: str) -> "LogHistogram":
+        return cls(counts=json.loads(data))
+
+
+class _Bucket:
+    """Aggregate of one (metric, resolution, bucket) cell"""
+
+    __slots__ = ("count", "sum", "min", "max", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.histogram = LogHistogram()
+
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.histogram.add(value)
+
+    def merge_row(self, count: int, total: float, low: float, high: float, histogram: str):
+        self.count += count
+        self.sum += total
+        self.min = min(self.min, low)
+        self.max = max(self.max, high)
+        self.histogram.merge(LogHistogram.from_json(histogram))
+
+
+class MetricRollups:
+    """Incremental downsampling and retention for the metrics table"""
+
+    def __init__(self, db: ConnectionManager,
+                 raw_retention_hours: float = 24,
+                 minute_retention_days: float = 7,
+                 hour_retention_days: float = 365,
+                 prune_batch_size: int = 5000):
+        self.db = db
+        self.retention_ms = {
+            "raw": int(raw_retention_hours * HOUR_MS),
+            "minute": int(minute_retention_days * 24 * HOUR_MS),
+            "hour": int(hour_retention_days * 24 * HOUR_MS),
+        }
+        self.prune_batch_size = prune_batch_size
+
+        self.compacted_rows = 0
+        self.pruned_rows = 0
+
+    @staticmethod
+    def _state(conn, key: str) -> Optional[int]:
+        row = conn.execute("SELECT value FROM agent_state WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else None
+
+    def _watermark(self, conn) -> Optional[int]:
+        return self._state(conn, WATERMARK_KEY)
+
+    def compact(self) -> int:
+        """Fold raw metrics inserted since the last run into the rollup tables.
+
+        Rows are selected by id, so rows committed late (e.g. after write-behind
+        retries) are folded into their buckets whatever their ts. Returns the
+        number of raw rows folded in.
+        """
+        with self.db.write() as conn:
+            upto = conn.execute("SELECT MAX(id) FROM metrics").fetchone()[0]
+            start = self._watermark(conn)
+            if upto is None or (start is not None and start >= upto):
+                return 0
+
+            # First run after upgrading: rows before the old ts watermark are
+            # already in the rollups
+            since_ts = None
+            if start is None:
+                since_ts = self._state(conn, LEGACY_WATERMARK_KEY)
+                start = 0
+
+            buckets: Dict[Tuple[str, str, int], _Bucket] = {}
+            rows = conn.execute(
+                "SELECT metric_name, ts, metric_value FROM metrics "
+                "WHERE id > ? AND id <= ? AND ts >= ? AND metric_value IS NOT NULL",
+                (start, upto, since_ts if since_ts is not None else -1)
+            )
+            folded = 0
+            for name, ts, value in rows:
+                for resolution, width in RESOLUTIONS.items():
+                    key = (name, resolution, ts // width * width)
+                    bucket = buckets.get(key)
+                    if bucket is None:
+                        bucket = buckets[key] = _Bucket()
+                    bucket.add(value)
+                folded += 1
+
+        # Buckets may already hold rows folded by an earlier run
+            for (name, resolution, bucket_ts), bucket in buckets.items():
+                existing = conn.execute("""
+                    SELECT count, sum, min, max, histogram FROM metric_rollups
+                    WHERE metric_name = ? AND resolution = ? AND bucket_ts = ?
+                """, (name, resolution, bucket_ts)).fetchone()
+                if existing:
+                    bucket.merge_row(*existing)
+
+            conn.executemany("""
+                INSERT OR REPLACE INTO metric_rollups
+                (metric_name, resolution, bucket_ts, count, sum, min, max, histogram)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (name, resolution, bucket_ts, b.count, b.sum, b.min, b.max, b.histogram.to_json())
+                for (name, resolution, bucket_ts), b in buckets.items()
+            ])
+            conn.execute(
+                "INSERT OR REPLACE INTO agent_state (key, value, updated_at) VALUES (?, ?, ?)",
+                (WATERMARK_KEY, str(upto), datetime.utcnow().isoformat())
+            )
+            conn.execute("DELETE FROM agent_state WHERE key = ?", (LEGACY_WATERMARK_KEY,))
+
+        self.compacted_rows += folded
+        if folded:
+            logger.debug(f"Compacted {folded} metric rows into {len(buckets)} rollup buckets")
+        return folded
+
+    def prune(self, now_ms: Optional[int] = None) -> int:
+        """Delete raw rows and rollup buckets past retention, in small batches.
+
+        Raw rows are only deleted once they have been compacted. Each batch is
+        its own transaction so the writer is never held for long.
+        """
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        watermark = self._watermark(self.db.read()) or 0
+
+        deleted = self._delete_in_batches(
+            "DELETE FROM metrics WHERE id IN "
+            "(SELECT id FROM metrics WHERE ts < ? AND id <= ? ORDER BY ts LIMIT ?)",
+            (now_ms - self.retention_ms["raw"], watermark)
+        )
+        for resolution in RESOLUTIONS:
+            deleted += self._delete_in_batches(
+                "DELETE FROM metric_rollups WHERE (metric_name, resolution, bucket_ts) IN "
+                "(SELECT metric_name, resolution, bucket_ts FROM metric_rollups "
+                " WHERE resolution = ? AND bucket_ts < ? LIMIT ?)",
+                (resolution, now_ms - self.retention_ms[resolution])
+            )
+
+        self.pruned_rows += deleted
+        if deleted:
+            logger.info(f"Pruned {deleted} metric rows past retention")
+        return deleted
+
+    def _delete_in_batches(self, sql: str, params: tuple) -> int:
+        total = 0
+        while True:
+            with self.db.write() as conn:
+                deleted = conn.execute(sql, params + (self.prune_batch_size,)).rowcount
+            total += deleted
+            if deleted < self.prune_batch_size:
+                return total
+
+    def choose_resolution(self, hours: float, min_points: int) -> str:
+        """Pick the coarsest resolution that still yields `min_points` buckets.
+
+        Resolutions whose retention does not cover the window are skipped;
+        raw data is used when no rollup is fine enough.
+        """
+        window_ms = int(hours * HOUR_MS)
+        for resolution, width in reversed(list(RESOLUTIONS.items())):
+            if window_ms // width >= min_points and window_ms <= self.retention_ms[resolution]:
+                return resolution
+        if window_ms <= self.retention_ms["raw"]:
+            return "raw"
+        # Window longer than any finer retention: the hour rollups are all there is
+        return "hour"
+
+    def get_series(self, metric_name: str, hours: float = 24, min_points: int = 24,
+                   resolution: Optional[str] = None,
+                   quantiles: Iterable[float] = (0.5, 0.9, 0.99)) -> Dict[str, Any]:
+        """Time series for one metric at the chosen (or requested) resolution"""
+        now_ms = int(time.time() * 1000)
+        resolution = resolution or self.choose_resolution(hours, min_points)
+        if resolution != "raw" and resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        since = now_ms - int(hours * HOUR_MS)
+        quantiles = tuple(quantiles)
+        conn = self.db.read()
+
+        points: List[Dict[str, Any]] = []
+        if resolution == "raw":
+            for ts, value in conn.execute(
+                "SELECT ts, metric_value FROM metrics "
+                "WHERE metric_name = ? AND ts > ? ORDER BY ts",
+                (metric_name, since)
+            ):
+                point = {"ts": ts, "count": 1, "avg": value, "min": value, "max": value}
+                point.update({f"p{round(q * 100)}": value for q in quantiles})
+                points.append(point)
+        else:
+            width = RESOLUTIONS[resolution]
+            for bucket_ts, count, total, low, high, histogram in conn.execute("""
+                SELECT bucket_ts, count, sum, min, max, histogram FROM metric_rollups
+                WHERE metric_name = ? AND resolution = ? AND bucket_ts >= ?
+                ORDER BY bucket_ts
+            """, (metric_name, resolution, since // width * width)):
+                hist = LogHistogram.from_json(histogram)
+                point = {"ts": bucket_ts, "count": count, "avg": total / count, "min": low, "max": high}
+                point.update({f"p{round(q * 100)}": hist.quantile(q) for q in quantiles})
+                points.append(point)
+
+        return {
+            "metric_name": metric_name,
+            "resolution": resolution,
+            "hours": hours,
+            "points": points
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        conn = self.db.read()
+        return {
+            "raw_rows": conn.execute("SELECT COUNT(*) FROM metrics").fetchone()[0],
+            "rollup_buckets": dict(conn.execute(
+                "SELECT resolution, COUNT(*) FROM metric_rollups GROUP BY resolution"
+            ).fetchall()),
+            "watermark_id": self._watermark(conn),
+            "retention_ms": self.retention_ms,
+            "compacted_rows": self.compacted_rows,
+            "pruned_rows": self.pruned_rows
+        }
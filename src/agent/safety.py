@@ -6,17 +6,32 @@ Critical safety controls and kill switches for autonomous agent operations.
 
 import logging
 import os
-from typing import Dict, Any, List, Optional
-from datetime import datetime, timedelta
+import threading
+from collections import Counter, deque
+from typing import Dict, Any, Callable, List, Optional
+from datetime import datetime, timezone
 from pathlib import Path
 
+from .circuit_breaker import AGENT_CYCLE_BREAKER, CircuitBreakerRegistry, get_breakers
+from .incidents import INCIDENT_BUCKET_MS, format_log_line
+from .kill_switch import KillSwitchWatcher
+
 logger = logging.getLogger("apex_orchestrator.agent.safety")
 
+# Number of most recent executions the error rate is computed over
+ERROR_RATE_WINDOW = 100
+
+# Window of the incident counts in the safety status
+INCIDENT_WINDOW_MS = 24 * 3600 * 1000
+
 
 class SafetyController:
     """Safety controls and circuit breakers for autonomous operations"""
     
-    def __init__(self, memory_system):
+    def __init__(self, memory_system, kill_switch_file: Optional[str] = None,
+                 kill_switch_poll_seconds: Optional[float] = None,
+                 breakers: Optional[CircuitBreakerRegistry] = None,
+                 incident_log_file: Optional[str] = None):
         self.memory = memory_system
         self.enabled = self._load_safety_setting("agent_enabled", "false") == "true"
         self.modifications_enabled = self._load_safety_setting("modifications_enabled", "false") == "true"
@@ -25,9 +40,42 @@ class SafetyController:
         self.require_approval = self._load_safety_setting("require_approval", "true") == "true"
         self.sandbox_mode = self._load_safety_setting("sandbox_mode", "true") == "true"
         
-        # Emergency stop file
-        self.kill_switch_file = Path("AGENT_KILL_SWITCH")
+        # Emergency stop file, watched in the background so checks are memory reads
+        self.kill_switch_file = Path(kill_switch_file or os.getenv("AGENT_KILL_SWITCH_FILE", "AGENT_KILL_SWITCH"))
+        if kill_switch_poll_seconds is None:
+            kill_switch_poll_seconds = float(os.getenv("AGENT_KILL_SWITCH_POLL_SECONDS", "1"))
+        self.kill_switch = KillSwitchWatcher(self.kill_switch_file, kill_switch_poll_seconds)
+        self.kill_switch.add_listener(self._on_kill_switch)
+        self.kill_switch.start()
+        
+        # Safety snapshot, kept current by memory listeners instead of re-queried per check
+        self._snapshot_lock = threading.Lock()
+        self._recent_outcomes: deque = deque(
+            (ex['success'] for ex in reversed(self.memory.get_execution_history(limit=ERROR_RATE_WINDOW))),
+            maxlen=ERROR_RATE_WINDOW
+        )
+        self._recent_errors = sum(1 for success in self._recent_outcomes if not success)
+        stats = self.memory.get_statistics()
+        self._total_modifications = stats['total_modifications']
+        self._applied_modifications = stats['applied_modifications']
+        self.memory.add_execution_listener(self._on_execution)
+        self.memory.add_modification_listener(self._on_modification)
+        # Per-minute incident counts over the last 24h: (bucket_ts, Counter of (type, severity))
+        self._incident_buckets: deque = deque()
+        for bucket_ts, incident_type, severity, count in self.memory.get_incident_counts(
+                self._now_ms() - INCIDENT_WINDOW_MS):
+            self._count_incident(bucket_ts, incident_type, severity, count)
+        
+        # Per-operation circuit breakers (shared with tool execution by default)
+        self.breakers = breakers if breakers is not None else get_breakers()
+        
+        # Incidents are stored in the memory database; the text log is an optional extra sink
+        if incident_log_file is None:
+            incident_log_file = os.getenv("AGENT_INCIDENT_LOG_FILE", "logs/safety_incidents.log")
+        self.incident_log_file = Path(incident_log_file) if incident_log_file else None
         
+        if self.kill_switch.active:
+            logger.critical("KILL SWITCH ACTIVATED - Agent disabled")
         logger.info(f"Safety controller initialized - Agent enabled: {self.enabled}")
         logger.warning(f"Modifications enabled: {self.modifications_enabled}")
         logger.warning(f"Max modifications/day: {self.max_modifications_per_day}")
@@ -44,11 +92,69 @@ class SafetyController:
         mem_value = self.memory.get_agent_state(key)
         return mem_value if mem_value is not None else default
     
+    def close(self):
+        """Stop watching the kill switch file"""
+        self.kill_switch.stop()
+    
+    def add_kill_switch_listener(self, listener: Callable[[bool], None]):
+        """Call `listener(active)` when the kill switch trips or is cleared"""
+        self.kill_switch.add_listener(listener)
+    
+    def _on_kill_switch(self, active: bool):
+        if active:
+            logger.critical("KILL SWITCH ACTIVATED - Agent disabled")
+        else:
+            logger.warning("Kill switch cleared")
+    
+    def _on_execution(self, operation_type: str, success: bool, *_args):
+        """Update the error-rate window and the operation's breaker (called on the memory DB thread)"""
+        with self._snapshot_lock:
+            if len(self._recent_outcomes) == self._recent_outcomes.maxlen and not self._recent_outcomes[0]:
+                self._recent_errors -= 1
+            self._recent_outcomes.append(bool(success))
+            if not success:
+                self._recent_errors += 1
+        self.breakers.get(operation_type).record(bool(success))
+    
+    def _on_modification(self, modification_type: str, applied: bool):
+        with self._snapshot_lock:
+            self._total_modifications += 1
+            if applied:
+                self._applied_modifications += 1
+    
+    @staticmethod
+    def _now_ms() -> int:
+        return int(datetime.now(timezone.utc).timestamp() * 1000)
+    
+    def _count_incident(self, ts: int, incident_type: str, severity: str, count: int = 1):
+        """Add to the per-minute incident counts; caller holds the snapshot lock
+        (or is the constructor)"""
+        bucket_ts = ts - ts % INCIDENT_BUCKET_MS
+        if self._incident_buckets and bucket_ts <= self._incident_buckets[-1][0]:
+            # Same minute (or a clock step back): count it in the newest bucket
+            counts = self._incident_buckets[-1][1]
+        else:
+            counts = Counter()
+            self._incident_buckets.append((bucket_ts, counts))
+        counts[(incident_type, severity.lower())] += count
+    
+    def _recent_incidents(self) -> Dict[str, Dict[str, int]]:
+        """Incident totals by type and severity over the last 24h"""
+        since_ts = self._now_ms() - INCIDENT_WINDOW_MS
+        since_ts -= since_ts % INCIDENT_BUCKET_MS
+        totals: Dict[str, Dict[str, int]] = {}
+        with self._snapshot_lock:
+            while self._incident_buckets and self._incident_buckets[0][0] < since_ts:
+                self._incident_buckets.popleft()
+            for _, counts in self._incident_buckets:
+                for (incident_type, severity), count in counts.items():
+                    by_severity = totals.setdefault(incident_type, {})
+                    by_severity[severity] = by_severity.get(severity, 0) + count
+        return totals
+    
     def is_enabled(self) -> bool:
         """Check if agent is enabled"""
-        # Check kill switch
-        if self.kill_switch_file.exists():
-            logger.critical("KILL SWITCH ACTIVATED - Agent disabled")
+        if self.kill_switch.active:
             return False
         
         return self.enabled
@@ -58,9 +164,6 @@ class SafetyController:
         if not self.is_enabled():
             return False
         
-        if self.kill_switch_file.exists():
-            return False
-        
         return self.modifications_enabled
     
     def enable_agent(self, password: Optional[str] = None):
@@ -106,6 +209,8 @@ class SafetyController:
             f.write(f"Timestamp: {datetime.utcnow().isoformat()}\n")
             f.write(f"Reason: {reason}\n")
         
+        # Take effect now rather than at the next poll
+        self.kill_switch.refresh()
         self.enabled = False
         self.modifications_enabled = False
         
@@ -123,13 +228,14 @@ class SafetyController:
         if self.kill_switch_file.exists():
             self.kill_switch_file.unlink()
             logger.warning("Kill switch deactivated")
+        self.kill_switch.refresh()
     
     def check_safety_limits(self) -> Dict[str, Any]:
-        """Check all safety limits and constraints"""
+        """Check all safety limits and constraints (from the in-memory snapshot)"""
         checks = {
             "agent_enabled": self.is_enabled(),
             "modifications_enabled": self.modifications_enabled_check(),
-            "kill_switch_active": self.kill_switch_file.exists(),
+            "kill_switch_active": self.kill_switch.active,
             "sandbox_mode": self.sandbox_mode,
             "require_approval": self.require_approval
         }
@@ -139,23 +245,28 @@ class SafetyController:
         checks["error_rate_ok"] = error_rate < 0.3  # Less than 30% errors
         checks["error_rate"] = error_rate
         
+        # Check circuit breakers
+        open_breakers = self.breakers.open_breakers()
+        checks["open_breakers"] = open_breakers
+        checks["breakers_ok"] = not open_breakers
+        
         # Check modification rate
-        stats = self.memory.get_statistics()
-        if stats['total_modifications'] > 0:
-            mod_success_rate = stats['applied_modifications'] / stats['total_modifications']
+        with self._snapshot_lock:
+            total_modifications = self._total_modifications
+            applied_modifications = self._applied_modifications
+        if total_modifications > 0:
+            mod_success_rate = applied_modifications / total_modifications
             checks["modification_success_rate"] = mod_success_rate
             checks["modification_rate_ok"] = mod_success_rate > 0.7
         
         return checks
     
     def _check_error_rate(self) -> float:
-        """Check recent error rate"""
-        history = self.memory.get_execution_history(limit=100)
-        if not history:
-            return 0.0
-        
-        errors = sum(1 for ex in history if not ex['success'])
-        return errors / len(history)
+        """Error rate over the last ERROR_RATE_WINDOW executions"""
+        with self._snapshot_lock:
+            if not self._recent_outcomes:
+                return 0.0
+            return self._recent_errors / len(self._recent_outcomes)
     
     def validate_operation(self, operation_type: str, 
                           params: Dict[str, Any]) -> tuple[bool, str]:
@@ -164,6 +275,11 @@ class SafetyController:
         if not self.is_enabled():
             return False, "Agent is disabled"
         
+        # Shed operations whose recent calls keep failing
+        breaker = self.breakers.get(operation_type)
+        if breaker.is_open:
+            return False, f"Circuit open for {operation_type} (retry in {breaker.retry_after():.0f}s)"
+        
         # Check for dangerous operations
         dangerous_patterns = [
             'rm -rf',
@@ -229,36 +345,42 @@ class SafetyController:
     def record_safety_incident(self, incident_type: str, description: str, 
                               severity: str):
         """Record a safety incident"""
-        incident = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "type": incident_type,
-            "description": description,
-            "severity": severity
-        }
+        now = datetime.now(timezone.utc)
+        ts = int(now.timestamp() * 1000)
+        with self._snapshot_lock:
+            self._count_incident(ts, incident_type, severity)
         
-        # Log to file
-        incident_log = Path("logs/safety_incidents.log")
-        incident_log.parent.mkdir(exist_ok=True)
+        try:
+            self.memory.record_incident(incident_type, description, severity, ts=ts)
+        except Exception as e:
+            logger.error(f"Failed to store safety incident: {e}")
         
-        with open(incident_log, 'a', encoding='utf-8') as f:
-            f.write(f"{incident['timestamp']} [{severity.upper()}] {incident_type}: {description}\n")
+        # Optional text log
+        if self.incident_log_file is not None:
+            self.incident_log_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.incident_log_file, 'a', encoding='utf-8') as f:
+                f.write(format_log_line(now.replace(tzinfo=None).isoformat(), incident_type, description, severity))
         
         logger.error(f"Safety incident: {incident_type} - {description}")
         
-        # If critical, consider activating kill switch
+        # If critical, pause agent cycles until the cycle breaker cools down
         if severity == "critical":
-            logger.critical("Critical safety incident - consider activating kill switch")
+            self.breakers.get(AGENT_CYCLE_BREAKER).trip(f"critical incident: {incident_type}")
+            logger.critical("Critical safety incident - agent cycles paused (consider activating kill switch)")
     
     def get_safety_status(self) -> Dict[str, Any]:
         """Get comprehensive safety status"""
         return {
             "agent_enabled": self.enabled,
             "modifications_enabled": self.modifications_enabled,
-            "kill_switch_active": self.kill_switch_file.exists(),
+            "kill_switch_active": self.kill_switch.active,
             "sandbox_mode": self.sandbox_mode,
             "require_approval": self.require_approval,
             "max_modifications_per_day": self.max_modifications_per_day,
             "git_integration": self.git_integration,
+            "kill_switch": self.kill_switch.get_stats(),
+            "circuit_breakers": self.breakers.get_stats(),
+            "incidents_24h": self._recent_incidents(),
             "safety_checks": self.check_safety_limits()
         }
     
@@ -0,0 +1,259 @@
+"""
+Write-Behind Buffer for the Agent Memory
+
+Queues append-only inserts (executions, metrics) in memory and writes them in
+one multi-row transaction when the batch fills up or the flush interval passes.
+A flush that fails as a whole (busy or full database) is put back in the queue
+and retried with backoff; rows that fail on their own are logged and dropped.
+"""
+
+import atexit
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import logging
+
+from .db import ConnectionManager
+
+logger = logging.getLogger("apex_orchestrator.agent.write_behind")
+
+# Errors caused by one row's values rather than the state of the database
+ROW_ERRORS = (sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.ProgrammingError, sqlite3.DataError)
+
+# A queued row: its insert plus any statements that must commit with it
+Entry = Tuple[Tuple[str, tuple], ...]
+
+
+class WriteBehindBuffer:
+    """Bounded in-memory queue of pending inserts flushed by a background thread.
+
+    When the buffer is full the caller flushes synchronously, which bounds
+    memory and pushes back on producers faster than the disk. A batch that
+    cannot be written is retried up to `max_retries` times in a row, waiting
+    `retry_backoff_seconds` (doubling, at most `max_backoff_seconds`) between
+    background attempts, before it is dropped.
+    """
+
+    def __init__(self, db: ConnectionManager, batch_size: int = 500,
+                 flush_interval_seconds: float = 1.0, max_pending: int = 10000,
+                 max_retries: int = 5, retry_backoff_seconds: float = 0.5,
+                 max_backoff_seconds: float = 30.0):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_pending = max(max_pending, batch_size)
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+        self._pending: List[Entry] = []
+        self._oldest_at: Optional[float] = None
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._consecutive_failures = 0
+        self._retry_at = 0.0
+
+        # Counters
+        self.enqueued = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.backpressure_flushes = 0
+        self.direct_writes = 0
+        self.retries = 0
+        self.failed = 0
+
+        self._thread = threading.Thread(target=self._run, name="memory-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, sql: str, params: tuple, related: Sequence[Tuple[str, tuple]] = ()):
+        """Queue an insert; returns immediately unless the buffer is full.
+
+        `related` (sql, params) statements are written in the same
+        transaction as the insert and dropped with it if it is rejected.
+
+        Inside an open memory transaction the row is written into that
+        transaction instead, so it commits (or rolls back) with the caller's
+        other writes and never needs a flush that would take the locks in the
+        opposite order to the flusher.
+        """
+        entry: Entry = ((sql, params), *related)
+        if self._in_transaction():
+            with self.db.write() as conn:
+                for statement, values in entry:
+                    conn.execute(statement, values)
+            self.direct_writes += 1
+            return
+
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Write-behind buffer is closed")
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self.backpressure_flushes += 1
+            self.flush()
+
+        with self._cond:
+            if not self._pending:
+                self._oldest_at = time.monotonic()
+            self._pending.append(entry)
+            self.enqueued += 1
+            # Wake the flusher to start the interval timer or flush a full batch
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped and not self._due():
+                    self._cond.wait(self._wait_time())
+                if self._stopped:
+                    return
+            self.flush()
+
+    def _in_transaction(self) -> bool:
+        return self.db._write_owner == threading.get_ident()
+
+    def _due(self) -> bool:
+        if not self._pending:
+            return False
+        now = time.monotonic()
+        if now < self._retry_at:
+            return False
+        return (len(self._pending) >= self.batch_size or
+                now - self._oldest_at >= self.flush_interval_seconds)
+
+    def _wait_time(self) -> Optional[float]:
+        if not self._pending:
+            return None
+        now = time.monotonic()
+        if now < self._retry_at:
+            return self._retry_at - now
+        return max(0.0, self.flush_interval_seconds - (now - self._oldest_at))
+
+    def flush(self) -> int:
+        """Write all pending rows now; returns the number of rows written.
+
+        Called from inside an open memory transaction this does nothing: the
+        rows are written by the flusher once that transaction has committed.
+        """
+        if not self._pending or self._in_transaction():
+            return 0
+
+        batch: List[Entry] = []
+        try:
+            # The write lock serializes flushes; take it before the queue lock,
+            # the same order as every other writer
+            with self.db.write() as conn:
+                with self._cond:
+                    batch, self._pending = self._pending, []
+                    self._oldest_at = None
+                if not batch:
+                    return 0
+                written = self._write_batch(conn, batch)
+        except sqlite3.Error as e:
+            if batch:
+                self._requeue(batch, e)
+            else:
+                # Failed before taking the batch (e.g. at BEGIN): the rows are
+                # still queued and keep their retry count; just pause the flusher
+                self._retry_at = time.monotonic() + self.retry_backoff_seconds
+                logger.warning(f"Write-behind flush could not start: {e}")
+            return 0
+
+        self._consecutive_failures = 0
+        self._retry_at = 0.0
+        self.flushed += written
+        self.flushes += 1
+        logger.debug(f"Write-behind flushed {written} rows")
+        return written
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[Entry]) -> int:
+        """Insert a batch in the open transaction, falling back to row by row
+        when a row is rejected"""
+        # One executemany per statement
+        groups: Dict[str, List[tuple]] = {}
+        for entry in batch:
+            for sql, params in entry:
+                groups.setdefault(sql, []).append(params)
+
+        conn.execute("SAVEPOINT write_behind")
+        try:
+            for sql, rows in groups.items():
+                conn.executemany(sql, rows)
+            conn.execute("RELEASE write_behind")
+            return len(batch)
+        except ROW_ERRORS:
+            conn.execute("ROLLBACK TO write_behind")
+            conn.execute("RELEASE write_behind")
+
+        written = 0
+        for entry in batch:
+            conn.execute("SAVEPOINT write_behind_row")
+            try:
+                for sql, params in entry:
+                    conn.execute(sql, params)
+                written += 1
+            except ROW_ERRORS as e:
+                sql, params = entry[0]
+                self.failed += 1
+                logger.error(f"Dropping write-behind row ({sql.split('(')[0].strip()}): {e}; params={str(params)[:200]}")
+                conn.execute("ROLLBACK TO write_behind_row")
+            conn.execute("RELEASE write_behind_row")
+        return written
+
+    def _requeue(self, batch: List[Entry], error: Exception):
+        """Put a batch that could not be written back at the front of the queue"""
+        self._consecutive_failures += 1
+        if self._consecutive_failures > self.max_retries:
+            self.failed += len(batch)
+            self._consecutive_failures = 0
+            self._retry_at = 0.0
+            logger.error(f"Write-behind dropped {len(batch)} rows after {self.max_retries} retries: {error}")
+            return
+
+        delay = min(self.max_backoff_seconds,
+                    self.retry_backoff_seconds * 2 ** (self._consecutive_failures - 1))
+        with self._cond:
+            self._pending[:0] = batch
+            if self._pending and self._oldest_at is None:
+                self._oldest_at = time.monotonic()
+            self._retry_at = time.monotonic() + delay
+        self.retries += 1
+        logger.warning(f"Write-behind flush of {len(batch)} rows failed, retrying in {delay:.1f}s: {error}")
+
+    def close(self):
+        """Stop the flusher thread and write what is still pending"""
+        with self._cond:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout=5)
+        self.flush()
+        if self._pending:
+            self.failed += len(self._pending)
+            logger.error(f"Write-behind closed with {len(self._pending)} unwritten rows")
+            self._pending = []
+        atexit.unregister(self.close)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval_seconds,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "backpressure_flushes": self.backpressure_flushes,
+            "direct_writes": self.direct_writes,
+            "retries": self.retries,
+            "consecutive_failures": self._consecutive_failures,
+            "failed": self.failed
+        }
@@ -4,14 +4,20 @@ API Routes for Autonomous Agent
 Endpoints for managing and interacting with the autonomous agent.
 """
 
+import json
 import logging
+import re
+import time
+from datetime import datetime, timezone
 from typing import Optional
-from fastapi import APIRouter, HTTPException, Request, Header, Depends, status
+from fastapi import APIRouter, HTTPException, Request, Header, Depends, Query, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
 from agent.agent_loop import get_agent, AutonomousAgent
+from agent.async_memory import MemoryOverloaded
 from agent.safety import SafetyController
 
 logger = logging.getLogger("apex_orchestrator.agent_routes")
@@ -38,6 +44,44 @@ class ModificationApproval(BaseModel):
     auto_test: bool = Field(True, description="Run tests before applying")
 
 
+def _parse_time(value: Optional[str], name: str) -> Optional[int]:
+    """Parse an ISO 8601 time (naive = UTC) or epoch milliseconds into epoch ms"""
+    if value is None:
+        return None
+    if value.isdigit():
+        return int(value)
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(400, f"Invalid {name}: expected ISO 8601 or epoch milliseconds")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def _overloaded(e: MemoryOverloaded) -> HTTPException:
+    """503 for a saturated memory executor, like admission control's load shedding"""
+    return HTTPException(
+        status.HTTP_503_SERVICE_UNAVAILABLE,
+        str(e),
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
+# Analytics windows ("90m", "24h", "7d") and bucket sizes
+_DURATION_UNITS_MS = {"m": 60 * 1000, "h": 3600 * 1000, "d": 86400 * 1000}
+_GRANULARITY_MS = {"minute": 60 * 1000, "hour": 3600 * 1000, "day": 86400 * 1000}
+_MAX_ANALYTICS_BUCKETS = 5000
+
+
+def _parse_window(value: str) -> int:
+    """Parse a window like '24h' into milliseconds"""
+    match = re.fullmatch(r"(\d+)([mhd])", value.strip())
+    if not match or int(match.group(1)) == 0:
+        raise HTTPException(400, "Invalid window: use e.g. 90m, 24h or 7d")
+    return int(match.group(1)) * _DURATION_UNITS_MS[match.group(2)]
+
+
 # Routes
 @router.get("/status")
 @limiter.limit("30/minute")
@@ -45,7 +89,9 @@ async def get_agent_status(request: Request):
     """Get autonomous agent status"""
     try:
         agent = get_agent()
-        return agent.get_agent_status()
+        return await agent.memory_async.run(agent.get_agent_status)
+    except MemoryOverloaded as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.error(f"Failed to get agent status: {e}")
         raise HTTPException(500, "Failed to retrieve agent status")
@@ -57,12 +103,38 @@ async def get_learning_report(request: Request):
     """Get learning and analysis report"""
     try:
         agent = get_agent()
-        return agent.get_learning_report()
+        return await agent.get_learning_report_async()
+    except MemoryOverloaded as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.error(f"Failed to get learning report: {e}")
         raise HTTPException(500, "Failed to generate learning report")
 
 
+@router.get("/analytics")
+@limiter.limit("20/minute")
+async def get_execution_analytics(request: Request, window: str = "24h", granularity: str = "hour"):
+    """Aggregate execution analytics for a time window"""
+    window_ms = _parse_window(window)
+    if granularity not in _GRANULARITY_MS:
+        raise HTTPException(400, f"Invalid granularity: choose one of {', '.join(_GRANULARITY_MS)}")
+    bucket_ms = _GRANULARITY_MS[granularity]
+    if window_ms // bucket_ms > _MAX_ANALYTICS_BUCKETS:
+        raise HTTPException(400, "Window too long for this granularity")
+
+    try:
+        agent = get_agent()
+        since_ts = int(time.time() * 1000) - window_ms
+        analytics = await agent.memory_async.get_execution_analytics(since_ts, bucket_ms=bucket_ms)
+        analytics.update({"window": window, "granularity": granularity})
+        return analytics
+    except MemoryOverloaded as e:
+        raise _overloaded(e)
+    except Exception as e:
+        logger.error(f"Failed to compute analytics: {e}")
+        raise HTTPException(500, str(e))
+
+
 @router.post("/enable")
 @limiter.limit("5/minute")
 async def enable_agent(request: Request, body: AgentEnableRequest):
@@ -195,7 +267,7 @@ async def start_agent_loop(request: Request, interval_seconds: int = 3600):
         
         return {
             "status": "started",
-            "message": f"Agent loop started (interval: {interval_seconds}s)",
+            "message": f"Agent loop started (max interval: {interval_seconds}s)",
             "loop_count": agent.loop_count
         }
     except Exception as e:
@@ -264,28 +336,179 @@ async def get_memory_stats(request: Request):
     """Get memory system statistics"""
     try:
         agent = get_agent()
-        return agent.memory.get_statistics()
+        return await agent.memory_async.get_statistics()
+    except MemoryOverloaded as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.error(f"Failed to get memory stats: {e}")
         raise HTTPException(500, str(e))
 
 
+@router.post("/memory/reconcile")
+@limiter.limit("5/minute")
+async def reconcile_memory_stats(request: Request):
+    """Re-derive memory statistics counters from the underlying tables"""
+    try:
+        agent = get_agent()
+        drift = await agent.memory_async.reconcile_statistics()
+        return {
+            "reconciled": True,
+            "drift": {name: {"stored": stored, "actual": actual} for name, (stored, actual) in drift.items()}
+        }
+    except MemoryOverloaded as e:
+        raise _overloaded(e)
+    except Exception as e:
+        logger.error(f"Failed to reconcile memory stats: {e}")
+        raise HTTPException(500, str(e))
+
+
 @router.get("/memory/executions")
 @limiter.limit("20/minute")
 async def get_execution_history(request: Request, limit: int = 100):
     """Get execution history"""
     try:
         agent = get_agent()
-        history = agent.memory.get_execution_history(limit=limit)
+        history = await agent.memory_async.get_execution_history(limit=limit)
         return {
             "count": len(history),
             "executions": history
         }
+    except MemoryOverloaded as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.error(f"Failed to get execution history: {e}")
         raise HTTPException(500, str(e))
 
 
+@router.get("/memory/history")
+@limiter.limit("60/minute")
+async def get_execution_history_page(
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    operation_type: Optional[str] = None,
+    success: Optional[bool] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """Page through execution history, newest first, using an opaque cursor"""
+    filters = {
+        "operation_type": operation_type,
+        "success": success,
+        "since_ts": _parse_time(since, "since"),
+        "until_ts": _parse_time(until, "until")
+    }
+    try:
+        agent = get_agent()
+        rows, next_cursor = await agent.memory_async.query_executions(limit=limit, cursor=cursor, **filters)
+        return {
+            "count": len(rows),
+            "executions": rows,
+            "next_cursor": next_cursor
+        }
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except MemoryOverloaded as e:
+        raise _overloaded(e)
+    except Exception as e:
+        logger.error(f"Failed to get execution history page: {e}")
+        raise HTTPException(500, str(e))
+
+
+@router.get("/memory/history/export")
+@limiter.limit("5/minute")
+async def export_execution_history(
+    request: Request,
+    operation_type: Optional[str] = None,
+    success: Optional[bool] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """Stream matching execution history as NDJSON (one execution per line)"""
+    filters = {
+        "operation_type": operation_type,
+        "success": success,
+        "since_ts": _parse_time(since, "since"),
+        "until_ts": _parse_time(until, "until")
+    }
+    agent = get_agent()
+
+    # Sync generator: Starlette pulls it from a worker thread, one page at a time
+    def lines():
+        for row in agent.memory.iter_executions(batch_size=1000, **filters):
+            yield json.dumps(row) + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=executions.ndjson"}
+    )
+
+
+@router.get("/memory/metrics/{metric_name}")
+@limiter.limit("20/minute")
+async def get_metric_series(request: Request, metric_name: str, hours: float = 24,
+                            resolution: Optional[str] = None):
+    """Get a metric time series from raw points or minute/hour rollups"""
+    try:
+        agent = get_agent()
+        return await agent.memory_async.get_metric_series(metric_name, hours=hours, resolution=resolution)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except MemoryOverloaded as e:
+        raise _overloaded(e)
+    except Exception as e:
+        logger.error(f"Failed to get metric series: {e}")
+        raise HTTPException(500, str(e))
+
+
+@router.get("/memory/error-clusters")
+@limiter.limit("20/minute")
+async def get_error_clusters(request: Request, limit: int = 20, hours: Optional[float] = None):
+    """Get the most frequent error message clusters, all-time or for the last `hours`"""
+    try:
+        agent = get_agent()
+        since_ts = int((time.time() - hours * 3600) * 1000) if hours else None
+        clusters = await agent.memory_async.get_error_clusters(limit=min(limit, 200), since_ts=since_ts)
+        return {"clusters": clusters, "count": len(clusters)}
+    except MemoryOverloaded as e:
+        raise _overloaded(e)
+    except Exception as e:
+        logger.error(f"Failed to get error clusters: {e}")
+        raise HTTPException(500, str(e))
+
+
+@router.get("/profile")
+@limiter.limit("20/minute")
+async def get_cycle_profile(request: Request, history_limit: int = 20):
+    """Get per-phase cycle timing history and the latest sampled profile"""
+    try:
+        agent = get_agent()
+        return agent.profiler.get_report(history_limit=min(history_limit, 200))
+    except Exception as e:
+        logger.error(f"Failed to get cycle profile: {e}")
+        raise HTTPException(500, str(e))
+
+
+@router.post("/profile/capture")
+@limiter.limit("3/minute")
+async def capture_cycle_profile(request: Request):
+    """Sample stacks during the next agent cycle (started early if the loop is running)"""
+    try:
+        agent = get_agent()
+        agent.profiler.request_capture()
+        if agent.running:
+            agent.cycle_trigger.request_cycle("profile")
+        return {
+            "status": "armed",
+            "message": "The next agent cycle will be profiled" + ("" if agent.running else
+                                                                  " (agent loop is not running)")
+        }
+    except Exception as e:
+        logger.error(f"Failed to arm cycle profiler: {e}")
+        raise HTTPException(500, str(e))
+
+
 @router.get("/safety/status")
 @limiter.limit("30/minute")
 async def get_safety_status(request: Request):
@@ -298,18 +521,114 @@ async def get_safety_status(request: Request):
         raise HTTPException(500, str(e))
 
 
+@router.get("/safety/incidents")
+@limiter.limit("60/minute")
+async def get_safety_incidents(
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    incident_type: Optional[str] = None,
+    severity: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """Page through safety incidents, newest first, using an opaque cursor"""
+    filters = {
+        "incident_type": incident_type,
+        "severity": severity,
+        "since_ts": _parse_time(since, "since"),
+        "until_ts": _parse_time(until, "until")
+    }
+    try:
+        agent = get_agent()
+        rows, next_cursor = await agent.memory_async.query_incidents(limit=limit, cursor=cursor, **filters)
+        return {
+            "count": len(rows),
+            "incidents": rows,
+            "next_cursor": next_cursor
+        }
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except MemoryOverloaded as e:
+        raise _overloaded(e)
+    except Exception as e:
+        logger.error(f"Failed to get safety incidents: {e}")
+        raise HTTPException(500, str(e))
+
+
+@router.get("/safety/incidents/rates")
+@limiter.limit("20/minute")
+async def get_safety_incident_rates(request: Request, window: str = "24h", granularity: str = "hour",
+                                    incident_type: Optional[str] = None):
+    """Incident counts per type over a time window"""
+    window_ms = _parse_window(window)
+    if granularity not in _GRANULARITY_MS:
+        raise HTTPException(400, f"Invalid granularity: choose one of {', '.join(_GRANULARITY_MS)}")
+    bucket_ms = _GRANULARITY_MS[granularity]
+    if window_ms // bucket_ms > _MAX_ANALYTICS_BUCKETS:
+        raise HTTPException(400, "Window too long for this granularity")
+
+    try:
+        agent = get_agent()
+        since_ts = int(time.time() * 1000) - window_ms
+        rates = await agent.memory_async.get_incident_rates(since_ts, bucket_ms=bucket_ms,
+                                                           incident_type=incident_type)
+        rates.update({"window": window, "granularity": granularity})
+        return rates
+    except MemoryOverloaded as e:
+        raise _overloaded(e)
+    except Exception as e:
+        logger.error(f"Failed to get incident rates: {e}")
+        raise HTTPException(500, str(e))
+
+
+@router.get("/safety/breakers")
+@limiter.limit("30/minute")
+async def get_circuit_breakers(request: Request):
+    """Get circuit breaker state per operation type"""
+    try:
+        agent = get_agent()
+        return {
+            "open": agent.safety.breakers.open_breakers(),
+            "breakers": agent.safety.breakers.get_stats()
+        }
+    except Exception as e:
+        logger.error(f"Failed to get circuit breakers: {e}")
+        raise HTTPException(500, str(e))
+
+
+@router.post("/safety/breakers/{name}/reset")
+@limiter.limit("10/minute")
+async def reset_circuit_breaker(request: Request, name: str):
+    """Close a circuit breaker and clear its failure window"""
+    try:
+        agent = get_agent()
+        breakers = agent.safety.breakers
+        if name not in breakers.get_stats():
+            raise HTTPException(404, f"Unknown circuit breaker: {name}")
+        breakers.get(name).reset()
+        return {"status": "reset", "breaker": breakers.get(name).get_stats()}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to reset circuit breaker: {e}")
+        raise HTTPException(500, str(e))
+
+
 @router.get("/opportunities")
 @limiter.limit("10/minute")
 async def get_optimization_opportunities(request: Request):
     """Get current optimization opportunities"""
     try:
         agent = get_agent()
-        opportunities = agent.learner.identify_optimization_opportunities()
+        opportunities = await agent.memory_async.run(agent.learner.identify_optimization_opportunities)
         
         return {
             "count": len(opportunities),
             "opportunities": opportunities
         }
+    except MemoryOverloaded as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.error(f"Failed to get opportunities: {e}")
         raise HTTPException(500, str(e))
@@ -321,12 +640,14 @@ async def get_improvement_suggestions(request: Request):
     """Get improvement suggestions"""
     try:
         agent = get_agent()
-        suggestions = agent.learner.suggest_improvements()
+        suggestions = await agent.memory_async.run(agent.learner.suggest_improvements)
         
         return {
             "count": len(suggestions),
             "suggestions": suggestions
         }
+    except MemoryOverloaded as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.error(f"Failed to get suggestions: {e}")
         raise HTTPException(500, str(e))
@@ -0,0 +1,243 @@
+"""
+Tool Bulkheads
+
+Per-tool concurrency limits, bounded wait queues and timeouts so that a flood
+of slow tools (docker, shell) cannot starve cheap ones (file_write).
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger("apex_orchestrator.bulkhead")
+
+
+class Bulkhead:
+    """Concurrency compartment for a single tool.
+
+    Blocking handlers run on a thread pool owned by the bulkhead, so one tool
+    exhausting its threads never delays another tool's work. A thread cannot be
+    stopped, so a blocking call that times out (or whose caller goes away)
+    keeps its slot until the handler actually returns.
+    """
+
+    def __init__(self, name: str, max_concurrent: int = 4, max_queue: int = 16,
+                 timeout_seconds: float = 60.0, priority: int = 5):
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        if max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.timeout_seconds = timeout_seconds
+        self.priority = priority  # lower value = more important
+
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # Counters
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.orphaned = 0  # abandoned blocking calls still running on a thread
+        self.queue_wait_total_ms = 0.0
+        self.queue_wait_max_ms = 0.0
+        self.acquired = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        logger.warning(f"Bulkhead '{self.name}' rejected call: {reason}")
+        raise HTTPException(
+            503,
+            f"Tool '{self.name}' is saturated, retry later",
+            headers={"Retry-After": str(max(1, int(self.timeout_seconds // 4)))}
+        )
+
+    async def _acquire(self):
+        """Take a slot, waiting in the bounded queue if none are free"""
+        if self.in_flight < self.max_concurrent and not self._waiters:
+            self.in_flight += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self._reject(f"queue full ({self.max_queue})")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.timeout_seconds)
+        except asyncio.TimeoutError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            self._reject(f"no slot within {self.timeout_seconds}s")
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.done() and not waiter.cancelled():
+                # Slot was handed over just before cancellation, pass it on
+                self._release()
+            raise
+
+    def _release(self):
+        """Hand the slot to the next live waiter or free it"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _release_when_done(self, future: Future, loop: asyncio.AbstractEventLoop):
+        """Keep the slot of an abandoned blocking call until its thread finishes"""
+        self.orphaned += 1
+
+        def release():
+            self.orphaned -= 1
+            self._release()
+
+        def on_done(_):
+            try:
+                loop.call_soon_threadsafe(release)
+            except RuntimeError:
+                release()  # loop already closed, nobody is waiting on it
+
+        future.add_done_callback(on_done)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrent,
+                thread_name_prefix=f"tool-{self.name}"
+            )
+        return self._executor
+
+    async def call(self, handler: Callable[..., Any], *args, blocking: bool = False) -> Any:
+        """Run handler(*args) inside this bulkhead"""
+        wait_start = time.perf_counter()
+        await self._acquire()
+        wait_ms = (time.perf_counter() - wait_start) * 1000
+        self.acquired += 1
+        self.queue_wait_total_ms += wait_ms
+        self.queue_wait_max_ms = max(self.queue_wait_max_ms, wait_ms)
+
+        future: Optional[Future] = None
+        try:
+            if blocking:
+                loop = asyncio.get_running_loop()
+                future = self._get_executor().submit(handler, *args)
+                work: Awaitable = asyncio.wrap_future(future)
+            else:
+                work = handler(*args)
+            result = await asyncio.wait_for(work, self.timeout_seconds)
+            self.completed += 1
+            return result
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.error(f"Tool '{self.name}' timed out after {self.timeout_seconds}s")
+            raise HTTPException(408, f"Tool '{self.name}' timed out after {self.timeout_seconds} seconds")
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            if future is not None and not future.done():
+                self._release_when_done(future, loop)
+            else:
+                self._release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get bulkhead statistics"""
+        return {
+            "priority": self.priority,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "timeout_seconds": self.timeout_seconds,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "saturation": round(self.in_flight / self.max_concurrent, 3),
+            "queue_saturation": round(self.queued / self.max_queue, 3) if self.max_queue else 0.0,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "orphaned": self.orphaned,
+            "queue_wait_avg_ms": round(self.queue_wait_total_ms / self.acquired, 3) if self.acquired else 0.0,
+            "queue_wait_max_ms": round(self.queue_wait_max_ms, 3)
+        }
+
+    def shutdown(self):
+        """Release the bulkhead's worker threads"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class ToolRegistry:
+    """Registry of tools, each dispatched through its own bulkhead"""
+
+    def __init__(self):
+        self._tools: Dict[str, Dict[str, Any]] = {}
+        # Optional load-shedding hook: (tool name, priority) -> admit?
+        self._admission_check: Optional[Callable[[str, int], bool]] = None
+
+    def set_admission_check(self, check: Optional[Callable[[str, int], bool]]):
+        """Install a hook consulted before each execution to shed low-priority tools"""
+        self._admission_check = check
+
+    def queue_depth(self) -> int:
+        """Total callers waiting across all bulkheads"""
+        return sum(tool["bulkhead"].queued for tool in self._tools.values())
+
+    def register(self, name: str, handler: Callable[[Dict[str, Any]], Any], *,
+                 blocking: bool, max_concurrent: int = 4, max_queue: int = 16,
+                 timeout_seconds: float = 60.0, priority: int = 5):
+        """Register a tool handler taking the step args dict"""
+        self._tools[name] = {
+            "handler": handler,
+            "blocking": blocking,
+            "bulkhead": Bulkhead(name, max_concurrent, max_queue, timeout_seconds, priority)
+        }
+        logger.info(
+            f"Registered tool '{name}' (concurrency={max_concurrent}, queue={max_queue}, "
+            f"timeout={timeout_seconds}s, priority={priority})"
+        )
+
+    def names(self) -> List[str]:
+        return list(self._tools.keys())
+
+    def get_bulkhead(self, name: str) -> Bulkhead:
+        if name not in self._tools:
+            raise HTTPException(400, f"Unknown tool: {name}")
+        return self._tools[name]["bulkhead"]
+
+    async def execute(self, name: str, args: Dict[str, Any]) -> Any:
+        """Execute a tool through its bulkhead"""
+        if name not in self._tools:
+            raise HTTPException(400, f"Unknown tool: {name}")
+        tool = self._tools[name]
+        bulkhead = tool["bulkhead"]
+        if self._admission_check is not None and not self._admission_check(name, bulkhead.priority):
+            bulkhead.rejected += 1
+            raise HTTPException(503, f"Tool '{name}' shed under load, retry later",
+                                headers={"Retry-After": "5"})
+        return await bulkhead.call(tool["handler"], args, blocking=tool["blocking"])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get per-tool bulkhead statistics"""
+        return {name: tool["bulkhead"].get_stats() for name, tool in self._tools.items()}
+
+    def shutdown(self):
+        for tool in self._tools.values():
+            tool["bulkhead"].shutdown()
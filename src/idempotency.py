@@ -0,0 +1,142 @@
+"""
+Idempotency Store
+
+Deduplicates client retries of run endpoints keyed by the Idempotency-Key header.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger("apex_orchestrator.idempotency")
+
+
+class _Entry:
+    """A single idempotent run, either in progress or completed"""
+
+    __slots__ = ("fingerprint", "future", "created_at", "completed_at")
+
+    def __init__(self, fingerprint: str, future: asyncio.Future):
+        self.fingerprint = fingerprint
+        self.future = future
+        self.created_at = time.monotonic()
+        self.completed_at: Optional[float] = None
+
+
+class IdempotencyStore:
+    """Bounded, TTL-evicting store of run results keyed by idempotency key.
+
+    Completed runs are replayed from the store. A retry that arrives while the
+    original run is still executing waits on the original instead of starting
+    a second execution. Failed runs are not cached so the client can retry;
+    if the original run is cancelled (client disconnect), a waiting retry
+    executes the request instead.
+    """
+
+    def __init__(self, ttl_seconds: int = 3600, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.takeovers = 0
+
+    @staticmethod
+    def fingerprint(body: bytes) -> str:
+        """Hash the request body so a reused key with a different payload is detected"""
+        return hashlib.sha256(body).hexdigest()
+
+    def _evict(self):
+        """Drop expired completed entries and trim to max_entries (oldest first)"""
+        now = time.monotonic()
+        expired = [
+            key for key, entry in self._entries.items()
+            if entry.completed_at is not None and now - entry.completed_at > self.ttl_seconds
+        ]
+        for key in expired:
+            del self._entries[key]
+
+        # In-progress entries are never evicted, waiters depend on them
+        if len(self._entries) > self.max_entries:
+            for key in list(self._entries.keys()):
+                if len(self._entries) <= self.max_entries:
+                    break
+                if self._entries[key].completed_at is not None:
+                    del self._entries[key]
+
+    async def run(self, scope: str, key: str, body: bytes,
+                  func: Callable[[], Awaitable[Dict[str, Any]]]) -> tuple[Dict[str, Any], bool]:
+        """Run func once per (scope, key) and return (result, replayed)"""
+        self._evict()
+        store_key = f"{scope}:{key}"
+        fingerprint = self.fingerprint(body)
+
+        entry = self._entries.get(store_key)
+        taking_over = False
+        while entry is not None:
+            if entry.fingerprint != fingerprint:
+                raise HTTPException(422, "Idempotency-Key reused with a different request body")
+
+            self._entries.move_to_end(store_key)
+            if entry.future.done():
+                self.hits += 1
+            else:
+                self.waits += 1
+                logger.info(f"Idempotent retry waiting on in-flight run: {store_key}")
+            try:
+                # shield() so a disconnecting retry does not cancel the original run
+                result = await asyncio.shield(entry.future)
+                return result, True
+            except asyncio.CancelledError:
+                if not entry.future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            # The original caller went away before finishing; the first waiter
+            # to get here runs the request itself and the others wait on it
+            taking_over = True
+            entry = self._entries.get(store_key)
+
+        if taking_over:
+            self.takeovers += 1
+            logger.info(f"Idempotent run was cancelled, retry takes over: {store_key}")
+        else:
+            self.misses += 1
+        entry = _Entry(fingerprint, asyncio.get_running_loop().create_future())
+        self._entries[store_key] = entry
+
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            self._entries.pop(store_key, None)
+            entry.future.cancel()
+            raise
+        except Exception as e:
+            self._entries.pop(store_key, None)
+            entry.future.set_exception(e)
+            # Mark retrieved so an exception without waiters is not reported as unhandled
+            entry.future.exception()
+            raise
+
+        entry.future.set_result(result)
+        entry.completed_at = time.monotonic()
+        self._evict()
+        return result, False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get store statistics"""
+        in_flight = sum(1 for entry in self._entries.values() if not entry.future.done())
+        return {
+            "entries": len(self._entries),
+            "in_flight": in_flight,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "waits": self.waits,
+            "takeovers": self.takeovers
+        }
@@ -0,0 +1,185 @@
+"""
+Event-Loop Blocking Detector
+
+Opt-in instrumentation that finds synchronous calls stalling the event loop.
+A heartbeat task ticks on the loop while a watchdog thread checks it; when the
+heartbeat is late by more than the threshold, the watchdog captures the loop
+thread's stack. Captures are aggregated by the project call site responsible.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("apex_orchestrator.loop_profiler")
+
+SRC_DIR = str(Path(__file__).resolve().parent)
+
+
+class BlockingDetector:
+    """Detects event-loop stalls and aggregates their stacks by call site"""
+
+    def __init__(self, threshold_ms: float = 100.0, stack_depth: int = 20,
+                 max_sites: int = 200, project_dir: str = SRC_DIR):
+        self.threshold_ms = threshold_ms
+        self.stack_depth = stack_depth
+        self.max_sites = max_sites
+        self.project_dir = project_dir
+        self._interval = max(0.005, threshold_ms / 1000 / 4)
+
+        self._lock = threading.Lock()
+        self._sites: Dict[str, Dict[str, Any]] = {}
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        # Stall in progress: (site key, start time)
+        self._current: Optional[tuple] = None
+        self.stalls = 0
+        self.blocked_ms_total = 0.0
+        self.started_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._watchdog is not None and self._watchdog.is_alive()
+
+    def start(self):
+        """Start instrumenting the running event loop"""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop_event.clear()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-blocking-watchdog", daemon=True)
+        self._watchdog.start()
+        self.started_at = time.time()
+        logger.info(f"Event-loop blocking detector started (threshold: {self.threshold_ms}ms)")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def _heartbeat(self):
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self._interval)
+
+    def _watch(self):
+        while not self._stop_event.wait(self._interval):
+            beat = self._last_beat
+            blocked_ms = (time.monotonic() - beat) * 1000
+            # Expected gap between beats is one interval
+            blocked_ms -= self._interval * 1000
+
+            if blocked_ms >= self.threshold_ms:
+                if self._current is None or self._current[1] != beat:
+                    self._finish_stall()
+                    self._current = (self._capture(), beat, blocked_ms)
+                else:
+                    self._current = (self._current[0], beat, blocked_ms)
+            elif self._current is not None:
+                self._finish_stall()
+
+    def _finish_stall(self):
+        if self._current is None:
+            return
+        key, _, blocked_ms = self._current
+        self._current = None
+        with self._lock:
+            site = self._sites.get(key)
+            if site is not None:
+                site["total_blocked_ms"] += blocked_ms
+                site["max_blocked_ms"] = max(site["max_blocked_ms"], blocked_ms)
+            self.blocked_ms_total += blocked_ms
+        logger.warning(f"Event loop blocked for ~{blocked_ms:.0f}ms at {key}")
+
+    def _capture(self) -> str:
+        """Capture the loop thread's stack and record it against its call site"""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return "<unknown>"
+        stack = traceback.extract_stack(frame, limit=self.stack_depth)
+        del frame
+
+        innermost = stack[-1] if stack else None
+        site_frame = innermost
+        for entry in reversed(stack):
+            if entry.filename.startswith(self.project_dir) and not entry.filename.endswith("loop_profiler.py"):
+                site_frame = entry
+                break
+
+        key = self._format(site_frame) if site_frame else "<unknown>"
+        blocked_in = self._format(innermost) if innermost else "<unknown>"
+
+        with self._lock:
+            self.stalls += 1
+            site = self._sites.get(key)
+            if site is None:
+                if len(self._sites) >= self.max_sites:
+                    # Drop the least significant site to stay bounded
+                    weakest = min(self._sites, key=lambda k: self._sites[k]["total_blocked_ms"])
+                    del self._sites[weakest]
+                site = {
+                    "count": 0,
+                    "total_blocked_ms": 0.0,
+                    "max_blocked_ms": 0.0,
+                    "blocked_in": Counter(),
+                    "last_seen": None,
+                    "last_stack": []
+                }
+                self._sites[key] = site
+            site["count"] += 1
+            site["blocked_in"][blocked_in] += 1
+            site["last_seen"] = time.time()
+            site["last_stack"] = [self._format(entry) for entry in stack]
+        return key
+
+    @staticmethod
+    def _format(entry: traceback.FrameSummary) -> str:
+        return f"{entry.filename}:{entry.lineno} in {entry.name}"
+
+    def get_report(self, limit: int = 20) -> Dict[str, Any]:
+        """Get stall captures aggregated by call site, worst first"""
+        with self._lock:
+            sites = sorted(self._sites.items(), key=lambda kv: kv[1]["total_blocked_ms"], reverse=True)
+            hot_sites: List[Dict[str, Any]] = [
+                {
+                    "call_site": key,
+                    "count": site["count"],
+                    "total_blocked_ms": round(site["total_blocked_ms"], 1),
+                    "max_blocked_ms": round(site["max_blocked_ms"], 1),
+                    "blocked_in": site["blocked_in"].most_common(3),
+                    "last_seen": site["last_seen"],
+                    "last_stack": site["last_stack"]
+                }
+                for key, site in sites[:limit]
+            ]
+            return {
+                "running": self.running,
+                "threshold_ms": self.threshold_ms,
+                "started_at": self.started_at,
+                "stalls": self.stalls,
+                "blocked_ms_total": round(self.blocked_ms_total, 1),
+                "sites_tracked": len(self._sites),
+                "hot_sites": hot_sites
+            }
+
+    def reset(self):
+        with self._lock:
+            self._sites.clear()
+            self.stalls = 0
+            self.blocked_ms_total = 0.0
@@ -1,8 +1,8 @@
-import os, time, hmac, hashlib, json, subprocess, shlex, re, pathlib, asyncio, logging, sys, signal
+import os, time, hmac, hashlib, json, subprocess, shlex, re, pathlib, asyncio, logging, sys, signal, uuid, math
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from logging.handlers import RotatingFileHandler
-from fastapi import FastAPI, HTTPException, Request, Header, status
+from fastapi import FastAPI, HTTPException, Request, Response, Header, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse, FileResponse
@@ -15,6 +15,12 @@ from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 import httpx, yaml
 
+from idempotency import IdempotencyStore
+from bulkhead import ToolRegistry
+from admission import AdmissionController, LoopLagMonitor
+from loop_profiler import BlockingDetector
+from notifications import TelegramNotifier
+
 load_dotenv()
 
 # --- Rate Limiter Configuration ---
@@ -124,7 +130,8 @@ async def http_exception_handler(request: Request, exc: HTTPException):
         content={
             "ok": False,
             "error": exc.detail
-        }
+        },
+        headers=getattr(exc, "headers", None)
     )
 
 @APP.exception_handler(Exception)
@@ -226,6 +233,20 @@ class Config:
         # Environment
         self.ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
         
+        # Idempotency (Idempotency-Key header on run endpoints)
+        self.IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600"))
+        self.IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "1000"))
+        
+        # Admission control / load shedding
+        self.ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+        self.ADMISSION_MAX_LOOP_LAG_MS = float(os.getenv("ADMISSION_MAX_LOOP_LAG_MS", "200"))
+        self.ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "200"))
+        self.ADMISSION_MAX_QUEUE_DEPTH = int(os.getenv("ADMISSION_MAX_QUEUE_DEPTH", "64"))
+        
+        # Event-loop blocking detector (opt-in instrumentation)
+        self.LOOP_PROFILER_ENABLED = os.getenv("LOOP_PROFILER_ENABLED", "false").lower() == "true"
+        self.LOOP_PROFILER_THRESHOLD_MS = float(os.getenv("LOOP_PROFILER_THRESHOLD_MS", "100"))
+        
         # Policy
         policy_path = pathlib.Path(__file__).parent.parent / "config" / "policy.yaml"
         with open(policy_path, "r", encoding="utf-8") as f:
@@ -282,6 +303,15 @@ except Exception as e:
     logger.critical(f"Failed to load configuration: {e}")
     sys.exit(1)
 
+# Background Telegram delivery; request paths only enqueue
+notifier = TelegramNotifier(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
+
+# Result store for client retries carrying an Idempotency-Key
+idempotency_store = IdempotencyStore(
+    ttl_seconds=config.IDEMPOTENCY_TTL_SECONDS,
+    max_entries=config.IDEMPOTENCY_MAX_ENTRIES
+)
+
 # Initialize AGI system
 agi_core = None
 if AGI_AVAILABLE:
@@ -304,6 +334,12 @@ async def startup_event():
     logger.info(f"Version: {APP.version}")
     logger.info(f"Environment: {config.ENVIRONMENT}")
     
+    # Start measuring event-loop lag for admission control
+    loop_lag_monitor.start()
+    
+    if config.LOOP_PROFILER_ENABLED:
+        blocking_detector.start()
+    
     # Include agent routes if available
     if AGENT_AVAILABLE:
         try:
@@ -312,6 +348,16 @@ async def startup_event():
             logger.info("Agent endpoints: /agent/*")
         except Exception as e:
             logger.error(f"Failed to register agent routes: {e}")
+
+        # Anomalies are detected on the memory DB thread; hand them to the loop
+        try:
+            from agent.agent_loop import get_agent
+            loop = asyncio.get_running_loop()
+            get_agent().anomaly_detector.add_listener(
+                lambda anomaly: loop.call_soon_threadsafe(notifier.enqueue, f"⚠️ {anomaly['message']}")
+            )
+        except Exception as e:
+            logger.error(f"Failed to subscribe to agent anomalies: {e}")
     else:
         logger.warning("Autonomous Agent not available")
     
@@ -342,6 +388,7 @@ async def shutdown_event():
             if agent.running:
                 agent.stop()
                 logger.info("Autonomous agent stopped")
+            agent.close()
         except Exception as e:
             logger.error(f"Error stopping agent: {e}")
     
@@ -354,6 +401,11 @@ async def shutdown_event():
             logger.error(f"Error shutting down AGI system: {e}")
     
     await notify("🛑 Apex Orchestrator stopped")
+    await notifier.stop()
+    
+    tool_registry.shutdown()
+    loop_lag_monitor.stop()
+    blocking_detector.stop()
 
 # --- Models with Validation ---
 class ToolCall(BaseModel):
@@ -407,13 +459,8 @@ def verify(x_sig: Optional[str], x_ts: Optional[str], body: bytes):
         raise HTTPException(401, "Bad signature")
 
 async def notify(msg: str):
-    if TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-        try:
-            async with httpx.AsyncClient(timeout=15) as c:
-                await c.post(url, data={"chat_id": TELEGRAM_CHAT_ID, "text": msg})
-        except Exception:
-            pass
+    """Queue a Telegram notification; delivery happens in the background"""
+    notifier.enqueue(msg)
 
 def _policy_path_ok(path: str) -> bool:
     p = pathlib.Path(path).resolve()
@@ -483,7 +530,7 @@ def run_python(code: str) -> Dict[str, Any]:
     
     try:
         # Write to temp file in WORK_DIR
-        pyfile = _safe_join(WORK_DIR, f"tmp_{int(time.time())}_{os.getpid()}.py")
+        pyfile = _safe_join(WORK_DIR, f"tmp_{int(time.time())}_{os.getpid()}_{uuid.uuid4().hex[:8]}.py")
         pyfile.write_text(code, encoding="utf-8")
         
         proc = subprocess.run(
@@ -664,21 +711,108 @@ async def make_plan(text: str) -> Plan:
     else:
         raise HTTPException(500, "Unknown ORCH_MODEL_PROVIDER")
 
+# --- Tool Registry ---
+# Each tool runs in its own bulkhead; blocking tools get a dedicated thread pool
+# so they never stall the event loop or each other. Limits come from policy.yaml.
+TOOL_HANDLERS = {
+    "file_write": (lambda a: file_write(a.get("path","artifact.txt"), a.get("content",""), bool(a.get("overwrite", True))), True),
+    "python": (lambda a: run_python(a.get("code","")), True),
+    "shell": (lambda a: run_shell(a.get("cmd",""), cwd=a.get("cwd")), True),
+    "docker": (lambda a: run_shell(a.get("cmd",""), cwd=a.get("cwd")), True),
+    "http_request": (lambda a: http_request(a.get("method","GET"), a.get("url",""), a.get("headers") or {}, a.get("body")), False),
+    "make_hook": (lambda a: make_hook(a.get("payload", {})), False),
+}
+
+def build_tool_registry(policy: Dict[str, Any]) -> ToolRegistry:
+    """Create the tool registry with per-tool limits from policy"""
+    registry = ToolRegistry()
+    tool_policy = policy.get("tools", {}) or {}
+    for name, (handler, blocking) in TOOL_HANDLERS.items():
+        limits = tool_policy.get(name, {}) or {}
+        registry.register(
+            name, handler, blocking=blocking,
+            max_concurrent=int(limits.get("max_concurrent", 4)),
+            max_queue=int(limits.get("max_queue", 16)),
+            timeout_seconds=float(limits.get("timeout_seconds", 60)),
+            priority=int(limits.get("priority", 5))
+        )
+    return registry
+
+tool_registry = build_tool_registry(POLICY)
+
+# Per-tool circuit breakers, shared with the agent's safety controller
+try:
+    from agent.circuit_breaker import get_breakers
+    tool_breakers = get_breakers()
+except ImportError as e:
+    tool_breakers = None
+    logger.warning(f"Circuit breakers not available: {e}")
+
+# --- Admission Control ---
+loop_lag_monitor = LoopLagMonitor()
+admission_controller = AdmissionController(
+    loop_lag_monitor,
+    queue_depth_fn=tool_registry.queue_depth,
+    max_loop_lag_ms=config.ADMISSION_MAX_LOOP_LAG_MS,
+    max_in_flight=config.ADMISSION_MAX_IN_FLIGHT,
+    max_queue_depth=config.ADMISSION_MAX_QUEUE_DEPTH,
+    enabled=config.ADMISSION_ENABLED
+)
+tool_registry.set_admission_check(admission_controller.admit_tool)
+
+# Captures stacks of callbacks that block the loop (started only when enabled)
+blocking_detector = BlockingDetector(threshold_ms=config.LOOP_PROFILER_THRESHOLD_MS)
+
+# Registered last so it runs first: shed before any other work is done
+@APP.middleware("http")
+async def admission_control(request: Request, call_next):
+    """Reject low-priority requests early with 503 when overloaded"""
+    admitted, retry_after = admission_controller.admit(request.url.path)
+    if not admitted:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"ok": False, "error": "Server overloaded, retry later"},
+            headers={"Retry-After": str(int(retry_after))}
+        )
+    
+    admission_controller.in_flight += 1
+    try:
+        return await call_next(request)
+    finally:
+        admission_controller.in_flight -= 1
+
 # --- Runner ---
+def _is_tool_failure(status_code: int) -> bool:
+    """Timeouts and server errors count against a tool's breaker; policy rejections
+    (4xx) and load shedding (503) say nothing about the tool's health"""
+    return status_code == 408 or (status_code >= 500 and status_code != 503)
+
 async def run_step(step: ToolCall, run_id: str) -> Dict[str, Any]:
     out = {"tool": step.tool, "description": step.description, "args": step.args}
-    if step.tool == "file_write":
-        res = file_write(step.args.get("path","artifact.txt"), step.args.get("content",""), bool(step.args.get("overwrite", True)))
-    elif step.tool == "python":
-        res = run_python(step.args.get("code",""))
-    elif step.tool == "shell" or step.tool == "docker":
-        res = run_shell(step.args.get("cmd",""), cwd=step.args.get("cwd"))
-    elif step.tool == "http_request":
-        res = await http_request(step.args.get("method","GET"), step.args.get("url",""), step.args.get("headers") or {}, step.args.get("body"))
-    elif step.tool == "make_hook":
-        res = await make_hook(step.args.get("payload", {}))
-    else:
-        raise HTTPException(400, f"Unknown tool: {step.tool}")
+    breaker = None
+    if tool_breakers is not None and step.tool in tool_registry.names():
+        breaker = tool_breakers.get(step.tool)
+        if not breaker.allow():
+            raise HTTPException(
+                503,
+                f"Tool '{step.tool}' is failing repeatedly, circuit open",
+                headers={"Retry-After": str(max(1, math.ceil(breaker.retry_after())))}
+            )
+    try:
+        res = await tool_registry.execute(step.tool, step.args)
+    except HTTPException as e:
+        if breaker is not None:
+            if _is_tool_failure(e.status_code):
+                breaker.record(False)
+            else:
+                breaker.release()
+        raise
+    except Exception:
+        if breaker is not None:
+            breaker.record(False)
+        raise
+    if breaker is not None:
+        breaker.record(not (isinstance(res, dict) and res.get("returncode", 0) != 0))
     # log
     logf = LOG_DIR / f"{run_id}.log"
     with open(logf, "a", encoding="utf-8") as f:
@@ -766,47 +900,87 @@ async def metrics(request: Request):
         "work_dir": {
             "path": str(WORK_DIR),
             "exists": WORK_DIR.exists()
-        }
+        },
+        "idempotency": idempotency_store.get_stats(),
+        "tools": tool_registry.get_stats(),
+        "circuit_breakers": tool_breakers.get_stats() if tool_breakers is not None else None,
+        "admission": admission_controller.get_stats(),
+        "notifications": notifier.get_stats()
     }
 
 # Track startup time for uptime metric
 startup_time = time.time()
 
+async def _run_idempotent(scope: str, idempotency_key: Optional[str], body: bytes,
+                          response: Response, execute) -> Dict[str, Any]:
+    """Run execute() once per Idempotency-Key, replaying the stored result on retries"""
+    if not idempotency_key:
+        return await execute()
+    if len(idempotency_key) > 255:
+        raise HTTPException(400, "Idempotency-Key too long")
+    
+    result, replayed = await idempotency_store.run(scope, idempotency_key, body, execute)
+    if replayed:
+        logger.info(f"Replayed idempotent {scope} result for key {idempotency_key[:32]}")
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
 @APP.post("/nlm/run")
 @limiter.limit("10/minute")
-async def nlm_run(request: Request, x_ts: Optional[str]=Header(None), x_sig: Optional[str]=Header(None)):
+async def nlm_run(request: Request, response: Response, x_ts: Optional[str]=Header(None), x_sig: Optional[str]=Header(None),
+                  idempotency_key: Optional[str]=Header(None)):
     body = await request.body()
     verify(x_sig, x_ts, body)
     payload = NLRunRequest(**json.loads(body))
-    run_id = f"nl_{int(time.time())}"
-    await notify(f"🧠 Planning: {payload.text[:80]}…")
-    plan = await make_plan(payload.text)
-    await notify(f"🛠️ Executing plan '{plan.intent}' ({len(plan.steps)} steps)")
-    results = []
-    for step in plan.steps:
-        results.append(await run_step(step, run_id))
-    await notify(f"✅ Done: {plan.intent}")
-    return {"ok": True, "run_id": run_id, "plan": plan.model_dump(), "results": results}
+    
+    async def execute() -> Dict[str, Any]:
+        run_id = f"nl_{int(time.time())}"
+        await notify(f"🧠 Planning: {payload.text[:80]}…")
+        plan = await make_plan(payload.text)
+        await notify(f"🛠️ Executing plan '{plan.intent}' ({len(plan.steps)} steps)")
+        results = []
+        for step in plan.steps:
+            results.append(await run_step(step, run_id))
+        await notify(f"✅ Done: {plan.intent}")
+        return {"ok": True, "run_id": run_id, "plan": plan.model_dump(), "results": results}
+    
+    return await _run_idempotent("nlm_run", idempotency_key, body, response, execute)
+
+# Direct ops map one-to-one onto registered tools
+DIRECT_OPS = frozenset({"file_write", "shell", "python", "make_hook"})
 
 @APP.post("/apex/run")
 @limiter.limit("20/minute")
-async def apex_run(request: Request, x_ts: Optional[str]=Header(None), x_sig: Optional[str]=Header(None)):
+async def apex_run(request: Request, response: Response, x_ts: Optional[str]=Header(None), x_sig: Optional[str]=Header(None),
+                   idempotency_key: Optional[str]=Header(None)):
     body = await request.body()
     verify(x_sig, x_ts, body)
     d = DirectOp(**json.loads(body))
-    run_id = f"op_{int(time.time())}"
-    # simple router: map op to a toolcall
-    table = {
-      "file_write": lambda p: ToolCall(tool="file_write", args=p),
-      "shell": lambda p: ToolCall(tool="shell", args=p),
-      "python": lambda p: ToolCall(tool="python", args=p),
-      "make_hook": lambda p: ToolCall(tool="make_hook", args=p),
-    }
-    if d.op not in table:
+    if d.op not in DIRECT_OPS:
         raise HTTPException(400, f"Unknown op: {d.op}")
-    step = table[d.op](d.params)
-    res = await run_step(step, run_id)
-    return {"ok": True, "run_id": run_id, "result": res}
+    step = ToolCall(tool=d.op, args=d.params)
+    
+    async def execute() -> Dict[str, Any]:
+        run_id = f"op_{int(time.time())}"
+        res = await run_step(step, run_id)
+        return {"ok": True, "run_id": run_id, "result": res}
+    
+    return await _run_idempotent("apex_run", idempotency_key, body, response, execute)
+
+@APP.get("/debug/blocking")
+@limiter.limit("10/minute")
+async def debug_blocking(request: Request, limit: int = 20, reset: bool = False,
+                         x_ts: Optional[str]=Header(None), x_sig: Optional[str]=Header(None)):
+    """Event-loop stalls aggregated by call site (requires LOOP_PROFILER_ENABLED)"""
+    verify(x_sig, x_ts, b"")
+    if not config.LOOP_PROFILER_ENABLED:
+        raise HTTPException(503, "Loop profiler not enabled")
+    
+    report = blocking_detector.get_report(limit=limit)
+    report["loop_lag"] = loop_lag_monitor.get_stats()
+    if reset:
+        blocking_detector.reset()
+    return {"ok": True, "report": report}
 
 @APP.post("/auth/echo-sign")
 @limiter.limit("30/minute")
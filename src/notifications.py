@@ -0,0 +1,253 @@
+"""
+Telegram Notifications
+
+Background delivery queue for Telegram messages. Callers enqueue and return
+immediately; a worker coalesces bursts into one message, respects Telegram's
+rate limits and retries failed deliveries with backoff.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger("apex_orchestrator.notifications")
+
+
+class RetryAfter(Exception):
+    """Telegram asked us to back off for a number of seconds"""
+
+    def __init__(self, seconds: float):
+        super().__init__(f"retry after {seconds}s")
+        self.seconds = seconds
+
+
+class MessageRejected(Exception):
+    """Telegram rejected the message with a client error; retrying will not help"""
+
+
+class TelegramNotifier:
+    """Fire-and-forget Telegram notifier with batching and rate limiting"""
+
+    MAX_MESSAGE_LENGTH = 4096
+
+    def __init__(self, bot_token: str, chat_id: str,
+                 max_queue: int = 1000,
+                 coalesce_seconds: float = 1.0,
+                 min_interval_seconds: float = 1.0,
+                 max_per_minute: int = 20,
+                 max_retries: int = 5,
+                 backoff_seconds: float = 1.0,
+                 timeout_seconds: float = 15.0,
+                 send_func: Optional[Callable[[str], Awaitable[None]]] = None):
+        self.bot_token = bot_token
+        self.chat_id = chat_id
+        self.max_queue = max_queue
+        self.coalesce_seconds = coalesce_seconds
+        self.min_interval_seconds = min_interval_seconds
+        self.max_per_minute = max_per_minute
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout_seconds = timeout_seconds
+        self._send_func = send_func
+
+        self._pending: deque = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._sent_times: deque = deque()
+
+        # Counters
+        self.enqueued = 0
+        self.dropped = 0
+        self.sent_messages = 0
+        self.delivered_notifications = 0
+        self.failed_messages = 0
+        self.failed_notifications = 0
+        self.retries = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._send_func) or bool(self.bot_token and self.chat_id)
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    def enqueue(self, msg: str) -> bool:
+        """Queue a notification without waiting for delivery"""
+        if not self.enabled:
+            return False
+
+        if len(self._pending) >= self.max_queue:
+            self._pending.popleft()
+            self.dropped += 1
+        self._pending.append(msg)
+        self.enqueued += 1
+        self._ensure_worker()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def _ensure_worker(self):
+        """Start the delivery worker on the current loop if it is not running"""
+        if self.running:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # no loop yet, the next enqueue from async code starts it
+        self._wakeup = asyncio.Event()
+        self._worker = loop.create_task(self._run())
+
+    async def _run(self):
+        try:
+            while True:
+                if not self._pending:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                # Let a burst accumulate, then deliver it as one message
+                await asyncio.sleep(self.coalesce_seconds)
+                await self._deliver_pending()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if self._client is not None:
+                await self._client.aclose()
+                self._client = None
+
+    async def _deliver_pending(self):
+        batch: List[str] = []
+        while self._pending:
+            batch.append(self._pending.popleft())
+        if not batch:
+            return
+
+        groups = self._group(batch)
+        for i, group in enumerate(groups):
+            try:
+                await self._wait_for_rate_limit()
+                sent = await self._send_with_retry("\n".join(group))
+            except asyncio.CancelledError:
+                # Put undelivered notifications back so stop() can flush them
+                self._pending.extendleft(reversed([msg for g in groups[i:] for msg in g]))
+                raise
+            if sent:
+                self.sent_messages += 1
+                self.delivered_notifications += len(group)
+            else:
+                self.failed_messages += 1
+                self.failed_notifications += len(group)
+
+    def _group(self, batch: List[str]) -> List[List[str]]:
+        """Split a batch into groups that each fit in one Telegram message"""
+        groups: List[List[str]] = []
+        current: List[str] = []
+        length = 0
+        for msg in batch:
+            msg = msg[:self.MAX_MESSAGE_LENGTH]
+            candidate = length + len(msg) + (1 if current else 0)
+            if current and candidate > self.MAX_MESSAGE_LENGTH:
+                groups.append(current)
+                current, length = [msg], len(msg)
+            else:
+                current.append(msg)
+                length = candidate
+        if current:
+            groups.append(current)
+        return groups
+
+    async def _wait_for_rate_limit(self):
+        """Keep at least min_interval between sends and max_per_minute per minute"""
+        now = time.monotonic()
+        while self._sent_times and now - self._sent_times[0] > 60:
+            self._sent_times.popleft()
+
+        delay = 0.0
+        if self._sent_times:
+            delay = self.min_interval_seconds - (now - self._sent_times[-1])
+        if len(self._sent_times) >= self.max_per_minute:
+            delay = max(delay, 60 - (now - self._sent_times[0]))
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._sent_times.append(time.monotonic())
+
+    async def _send_with_retry(self, text: str) -> bool:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._send(text)
+                return True
+            except RetryAfter as e:
+                delay = e.seconds
+            except MessageRejected as e:
+                logger.error(f"Telegram rejected message: {e}")
+                return False
+            except Exception as e:
+                delay = self.backoff_seconds * (2 ** attempt)
+                logger.warning(f"Telegram delivery failed (attempt {attempt + 1}): {e}")
+            if attempt < self.max_retries:
+                self.retries += 1
+                await asyncio.sleep(delay)
+        logger.error(f"Dropping Telegram message after {self.max_retries + 1} attempts")
+        return False
+
+    async def _send(self, text: str):
+        if self._send_func is not None:
+            await self._send_func(text)
+            return
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout_seconds)
+        url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
+        r = await self._client.post(url, data={"chat_id": self.chat_id, "text": text})
+        if r.status_code == 429:
+            try:
+                retry_after = float(r.json().get("parameters", {}).get("retry_after", 1))
+            except Exception:
+                retry_after = 1.0
+            raise RetryAfter(retry_after)
+        if r.status_code >= 500:
+            raise httpx.HTTPStatusError(f"Telegram error {r.status_code}", request=r.request, response=r)
+        if r.status_code >= 400:
+            # Client errors will not succeed on retry
+            raise MessageRejected(f"{r.status_code} {r.text[:200]}")
+
+    async def flush(self, timeout: float = 5.0):
+        """Deliver everything queued now (used at shutdown and in tests)"""
+        if not self._pending:
+            return
+        try:
+            await asyncio.wait_for(self._deliver_pending(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Notification flush timed out with {len(self._pending)} pending")
+
+    async def stop(self, timeout: float = 5.0):
+        """Flush pending notifications and stop the worker"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        await self.flush(timeout)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "pending": len(self._pending),
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "sent_messages": self.sent_messages,
+            "delivered_notifications": self.delivered_notifications,
+            "failed_messages": self.failed_messages,
+            "failed_notifications": self.failed_notifications,
+            "retries": self.retries
+        }
@@ -0,0 +1,115 @@
+"""
+Tests for admission control and load shedding
+"""
+
+import pytest
+import asyncio
+import time
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+import sys
+import pathlib
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from admission import AdmissionController, LoopLagMonitor, PRIORITY_CRITICAL, PRIORITY_LOW, PRIORITY_NORMAL
+
+
+class TestAdmissionController:
+    """Admission controller test suite"""
+
+    def test_classify_paths(self):
+        """Test endpoint priority classification"""
+        controller = AdmissionController(LoopLagMonitor())
+        assert controller.classify("/health") == PRIORITY_CRITICAL
+        assert controller.classify("/metrics") == PRIORITY_CRITICAL
+        assert controller.classify("/agent/kill-switch/activate") == PRIORITY_CRITICAL
+        assert controller.classify("/agi/process") == PRIORITY_LOW
+        assert controller.classify("/apex/run") == PRIORITY_NORMAL
+
+    def test_soft_overload_sheds_low_priority_only(self):
+        """Test that lag past the threshold sheds low-priority endpoints"""
+        monitor = LoopLagMonitor()
+        controller = AdmissionController(monitor, max_loop_lag_ms=100)
+        monitor.record(150)
+
+        assert controller.admit("/agi/process")[0] is False
+        assert controller.admit("/apex/run")[0] is True
+        assert controller.admit("/health")[0] is True
+
+    def test_hard_overload_keeps_critical_endpoints(self):
+        """Test that hard overload sheds normal endpoints but not kill switch"""
+        monitor = LoopLagMonitor()
+        controller = AdmissionController(monitor, max_in_flight=10)
+        controller.in_flight = 25
+
+        admitted, retry_after = controller.admit("/apex/run")
+        assert admitted is False
+        assert retry_after >= 1
+        assert controller.admit("/agent/kill-switch/activate")[0] is True
+
+        stats = controller.get_stats()
+        assert stats["shed_total"][PRIORITY_NORMAL] == 1
+        assert stats["shed_ratio"] == 1.0
+
+    def test_queue_depth_signal(self):
+        """Test that tool queue depth drives shedding"""
+        controller = AdmissionController(LoopLagMonitor(), queue_depth_fn=lambda: 70, max_queue_depth=64)
+        assert controller.admit("/agi/process")[0] is False
+        assert controller.admit_tool("docker", 4) is False
+        assert controller.admit_tool("file_write", 1) is True
+
+    def test_disabled_admits_everything(self):
+        """Test that admission control can be switched off"""
+        monitor = LoopLagMonitor()
+        controller = AdmissionController(monitor, max_loop_lag_ms=1, enabled=False)
+        monitor.record(1000)
+        assert controller.admit("/agi/process")[0] is True
+
+    def test_lag_monitor_measures_blocking(self):
+        """Test that the monitor observes a blocked event loop"""
+        monitor = LoopLagMonitor(interval_seconds=0.01)
+
+        async def scenario():
+            monitor.start()
+            await asyncio.sleep(0.02)
+            time.sleep(0.1)  # block the loop
+            await asyncio.sleep(0.03)
+            monitor.stop()
+
+        asyncio.run(scenario())
+        assert monitor.lag_max_ms >= 50
+
+
+class TestAdmissionMiddleware:
+    """Load shedding through the HTTP middleware"""
+
+    def test_overloaded_server_returns_503_but_serves_health(self):
+        """Test 503 with Retry-After for low priority and 200 for /health"""
+        import main
+
+        client = TestClient(main.APP)
+        with patch.object(main.admission_controller, "overload_level", return_value=3.0):
+            shed = client.get("/agi/status")
+            assert shed.status_code == 503
+            assert "Retry-After" in shed.headers
+
+            health = client.get("/health")
+            assert health.status_code == 200
+
+    def test_metrics_are_served_under_soft_overload(self):
+        """Test that the shed rate can still be scraped while shedding"""
+        import main
+
+        client = TestClient(main.APP)
+        with patch.object(main.admission_controller, "overload_level", return_value=1.5):
+            assert client.get("/agi/status").status_code == 503
+            metrics = client.get("/metrics")
+            assert metrics.status_code == 200
+            assert metrics.json()["admission"]["shed_total"]["low"] >= 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
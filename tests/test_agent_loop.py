@@ -0,0 +1,145 @@
+"""
+Tests for the AutonomousAgent orchestration loop
+"""
+
+import pytest
+import asyncio
+import os
+import sys
+import pathlib
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from agent.agent_loop import AutonomousAgent
+
+
+@pytest.fixture
+def agent(tmp_path):
+    agent = AutonomousAgent(str(tmp_path / "agent_memory.db"))
+    yield agent
+    agent.close()
+
+
+class TestLearningReportCache:
+    """Learning report snapshot test suite"""
+
+    def test_report_is_reused_until_new_executions(self, agent, monkeypatch):
+        """Test that the report is rebuilt only when the latest execution id changes"""
+        agent.memory.record_execution("shell", "ls", {}, True, 10)
+        builds = []
+        build = agent.learner.build_learning_report
+        monkeypatch.setattr(agent.learner, "build_learning_report",
+                            lambda latest: builds.append(latest) or build(latest))
+
+        first = agent.get_learning_report()
+        second = agent.get_learning_report()
+        assert builds == [1]
+        assert not first["cached"] and second["cached"]
+        assert second["execution_analysis"] == first["execution_analysis"]
+
+        agent.memory.record_execution("shell", "ls", {}, False, 10, error_message="boom")
+        assert not agent.get_learning_report()["cached"]
+        assert builds == [1, 2]
+
+    def test_report_expires_with_age(self, agent):
+        agent.learning_report_max_age_seconds = 0
+        agent.get_learning_report()
+        assert not agent.get_learning_report()["cached"]
+
+    def test_pattern_count_is_current_on_cache_hits(self, agent):
+        agent.memory.record_execution("shell", "ls", {}, True, 10)
+        assert agent.get_learning_report()["patterns_learned"] == 0
+
+        agent.learner.learn_new_executions()
+        report = agent.get_learning_report()
+        assert report["cached"] and report["patterns_learned"] == 1
+
+
+class TestEventDrivenLoop:
+    """Cycle triggering in the agent loop"""
+
+    def test_idle_interval_cycles_are_skipped(self, agent):
+        """Test that interval wake-ups without new executions skip the cycle"""
+        agent.safety.enabled = True
+        agent.cycle_trigger.min_spacing_seconds = 0
+        agent.cycle_trigger.debounce_seconds = 0
+        cycles = []
+
+        async def fake_cycle(reason):
+            cycles.append(reason)
+
+        agent._run_cycle = fake_cycle
+
+        async def scenario():
+            loop_task = asyncio.create_task(agent.start(interval_seconds=0.02))
+            await asyncio.sleep(0.1)
+            assert agent.idle_cycles_skipped >= 2
+
+            # New executions make the next interval wake-up run a cycle
+            await agent.memory_async.record_execution("shell", "ls", {}, True, 10)
+            await asyncio.sleep(0.05)
+            agent.stop()
+            await asyncio.wait_for(loop_task, 1)
+
+        asyncio.run(scenario())
+        assert cycles[0] == "start"
+        assert "max_interval" in cycles[1:]
+
+    def test_execution_threshold_starts_cycle(self, agent):
+        agent.safety.enabled = True
+        agent.cycle_trigger.execution_threshold = 2
+        agent.cycle_trigger.min_spacing_seconds = 0
+        agent.cycle_trigger.debounce_seconds = 0
+        cycles = []
+
+        async def fake_cycle(reason):
+            cycles.append(reason)
+
+        agent._run_cycle = fake_cycle
+
+        async def scenario():
+            loop_task = asyncio.create_task(agent.start(interval_seconds=3600))
+            await asyncio.sleep(0.01)
+            for _ in range(2):
+                await agent.memory_async.record_execution("shell", "ls", {}, True, 10)
+            await asyncio.sleep(0.05)
+            agent.stop()
+            await asyncio.wait_for(loop_task, 1)
+
+        asyncio.run(scenario())
+        assert cycles == ["start", "executions"]
+
+
+class TestProcessCycleMode:
+    """Worker-process cycle mode test suite"""
+
+    def test_worker_learns_and_reports(self, tmp_path):
+        """Test that learning and the report run in a separate process"""
+        agent = AutonomousAgent(str(tmp_path / "agent_memory.db"), cycle_mode="process")
+        try:
+            for i in range(5):
+                agent.memory.record_execution("shell", "ls", {}, i % 2 == 0, 10, error_message="exit code 1")
+
+            report = asyncio.run(agent.get_learning_report_async(learn=True))
+            assert report["latest_execution_id"] == 5
+            assert report["patterns_learned"] == 2
+            assert not agent.learner.has_unlearned_executions()
+
+            stats = agent.get_agent_status()["cycle_worker"]
+            assert stats["runs"] == 1 and stats["pid"] != os.getpid()
+
+            # Unchanged executions: served from the cache without the worker
+            assert asyncio.run(agent.get_learning_report_async())["cached"]
+            assert agent.cycle_worker.runs == 1
+        finally:
+            agent.close()
+
+    def test_invalid_mode_rejected(self, tmp_path):
+        with pytest.raises(ValueError):
+            AutonomousAgent(str(tmp_path / "agent_memory.db"), cycle_mode="fork")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
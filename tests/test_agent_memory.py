@@ -0,0 +1,460 @@
+"""
+Tests for the autonomous agent MemorySystem
+"""
+
+import pytest
+import sqlite3
+import threading
+import time
+import sys
+import pathlib
+from contextlib import contextmanager
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from agent.memory import MemorySystem, MIGRATIONS
+
+
+@pytest.fixture
+def memory(tmp_path):
+    """Fresh memory system backed by a temporary database"""
+    mem = MemorySystem(str(tmp_path / "agent_memory.db"))
+    yield mem
+    mem.close()
+
+
+class TestConnectionLayer:
+    """Connection management test suite"""
+
+    def test_wal_mode_enabled(self, memory):
+        """Test that the database uses WAL journaling"""
+        mode = memory.db.read().execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode == "wal"
+
+    def test_connections_are_reused(self, memory):
+        """Test that a thread keeps its reader and the writer is shared"""
+        assert memory.db.read() is memory.db.read()
+        with memory.db.write() as first:
+            with memory.db.write() as nested:
+                assert first is nested
+
+    def test_failed_write_rolls_back(self, memory):
+        """Test that an exception inside write() discards the transaction"""
+        with pytest.raises(RuntimeError):
+            with memory.db.write() as conn:
+                conn.execute("INSERT INTO agent_state (key, value) VALUES ('k', 'v')")
+                raise RuntimeError("abort")
+        assert memory.get_agent_state("k") is None
+
+    def test_readers_are_thread_local(self, memory):
+        """Test concurrent reads from several threads"""
+        memory.set_agent_state("shared", "value")
+        results, readers = [], []
+
+        def worker():
+            readers.append(memory.db.read())
+            results.append(memory.get_agent_state("shared"))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert results == ["value"] * 4
+        assert len({id(conn) for conn in readers}) == 4
+
+    def test_closed_memory_rejects_writes(self, tmp_path):
+        """Test that close() releases connections"""
+        mem = MemorySystem(str(tmp_path / "closed.db"))
+        mem.close()
+        with pytest.raises(sqlite3.ProgrammingError):
+            mem.set_agent_state("k", "v")
+
+
+class TestMemoryOperations:
+    """MemorySystem behaviour test suite"""
+
+    def test_record_and_read_executions(self, memory):
+        """Test recording executions and reading statistics back"""
+        memory.record_execution("shell", "list files", {}, True, 120)
+        memory.record_execution("shell", "list files", {}, False, 80, error_message="timeout")
+
+        history = memory.get_execution_history(limit=10)
+        assert len(history) == 2
+
+        stats = memory.get_statistics()
+        assert stats["total_executions"] == 2
+        assert stats["overall_success_rate"] == 50.0
+        assert memory.get_success_rate(hours=1) == 0.5
+
+    def test_agent_state_roundtrip(self, memory):
+        """Test agent state get/set"""
+        memory.set_agent_state("agent_enabled", "true")
+        assert memory.get_agent_state("agent_enabled") == "true"
+
+    def test_metrics(self, memory):
+        """Test metric recording and retrieval"""
+        memory.record_metric("agent_cycle_duration_seconds", 1.5)
+        metrics = memory.get_metrics("agent_cycle_duration_seconds", hours=1)
+        assert [m["metric_value"] for m in metrics] == [1.5]
+
+
+class TestSchemaMigrations:
+    """Schema versioning and time-index test suite"""
+
+    def test_legacy_database_is_migrated(self, tmp_path):
+        """Test that a pre-migration database gets backfilled epoch timestamps"""
+        path = tmp_path / "legacy.db"
+        conn = sqlite3.connect(path)
+        conn.execute("""
+            CREATE TABLE executions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL,
+                operation_type TEXT NOT NULL, intent TEXT, plan TEXT, success BOOLEAN,
+                execution_time_ms INTEGER, error_message TEXT, context TEXT, result_hash TEXT
+            )
+        """)
+        conn.execute("INSERT INTO executions (timestamp, operation_type, success) "
+                     "VALUES ('2024-01-01T00:00:01.500000', 'shell', 1)")
+        conn.commit()
+        conn.close()
+
+        mem = MemorySystem(str(path))
+        conn = mem.db.read()
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+        assert conn.execute("SELECT ts FROM executions").fetchone()[0] == 1704067201500
+        mem.close()
+
+        # Reopening does not re-run migrations
+        MemorySystem(str(path)).close()
+
+    def test_time_window_queries_use_indexes(self, memory):
+        """Test that time-window filters are index range scans"""
+        conn = memory.db.read()
+        plans = [
+            "SELECT COUNT(*) FROM executions WHERE ts > 0 AND operation_type = 'shell'",
+            "SELECT * FROM metrics WHERE metric_name = 'm' AND ts > 0 ORDER BY ts DESC",
+        ]
+        for query in plans:
+            detail = " ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + query))
+            assert detail.startswith("SEARCH") and "INDEX" in detail
+
+    def test_time_window_excludes_old_rows(self, memory):
+        """Test that get_success_rate only counts rows inside the window"""
+        memory.record_execution("shell", "recent", {}, True, 1)
+        with memory.db.write() as conn:
+            conn.execute("INSERT INTO executions (timestamp, ts, operation_type, success) "
+                         "VALUES ('2020-01-01T00:00:00', 1577836800000, 'shell', 0)")
+        assert memory.get_success_rate("shell", hours=24) == 1.0
+        assert memory.get_execution_history(limit=1)[0]["intent"] == "recent"
+
+
+class TestStatisticsCounters:
+    """Materialized statistics counters test suite"""
+
+    def test_counters_track_inserts_and_deletes(self, memory):
+        """Test that counters follow every table they summarize"""
+        memory.record_execution("shell", "a", {}, True, 1)
+        memory.record_execution("shell", "b", {}, False, 1)
+        memory.save_code_template("tmpl", "print(1)")
+        memory.save_code_template("tmpl", "print(2)")
+        memory.record_modification("fix", "x.py", "d", "", "", {}, applied=True)
+        with memory.db.write() as conn:
+            conn.execute("DELETE FROM executions WHERE intent = 'b'")
+
+        stats = memory.get_statistics()
+        assert stats["total_executions"] == 1
+        assert stats["overall_success_rate"] == 100.0
+        assert stats["code_templates"] == 1
+        assert stats["total_modifications"] == 1
+        assert stats["applied_modifications"] == 1
+
+    def test_template_upsert_keeps_usage(self, memory):
+        """Test that re-saving a template updates it in place"""
+        memory.save_code_template("tmpl", "print(1)")
+        with memory.db.write() as conn:
+            conn.execute("UPDATE code_templates SET use_count = 3 WHERE name = 'tmpl'")
+        memory.save_code_template("tmpl", "print(2)")
+
+        template = memory.get_code_template("tmpl")
+        assert template["code"] == "print(2)"
+        assert template["use_count"] == 3
+
+    def test_reconcile_repairs_drift(self, memory):
+        """Test that reconcile_statistics re-derives counters"""
+        memory.record_execution("shell", "a", {}, True, 1)
+        with memory.db.write() as conn:
+            conn.execute("UPDATE memory_counters SET value = 42 WHERE name = 'total_executions'")
+
+        assert memory.reconcile_statistics() == {"total_executions": (42, 1)}
+        assert memory.get_statistics()["total_executions"] == 1
+        assert memory.reconcile_statistics() == {}
+
+
+class TestPatterns:
+    """Pattern upsert test suite"""
+
+    def test_save_pattern_accumulates(self, memory):
+        """Test that repeated observations update one row"""
+        data = {"operation_type": "shell", "intent": "ls"}
+        memory.save_pattern("successful_execution", data, True, 100)
+        memory.save_pattern("successful_execution", dict(reversed(list(data.items()))), False, 300)
+
+        [pattern] = memory.get_best_patterns("successful_execution")
+        assert (pattern["success_count"], pattern["failure_count"]) == (1, 1)
+        assert pattern["avg_execution_time_ms"] == 200
+        assert pattern["confidence_score"] == 0.5
+        assert memory.get_statistics()["learned_patterns"] == 1
+
+    def test_bulk_save_patterns(self, memory):
+        """Test that a bulk upsert aggregates repeats in one transaction"""
+        observations = [
+            {"pattern_type": "t", "pattern_data": {"i": i % 100}, "success": i % 4 != 0,
+             "execution_time_ms": 10}
+            for i in range(1000)
+        ]
+        assert memory.save_patterns(observations) == 100
+        memory.save_patterns(observations)
+
+        rows = memory.db.read().execute(
+            "SELECT COUNT(*), SUM(success_count + failure_count) FROM patterns"
+        ).fetchone()
+        assert rows == (100, 2000)
+
+    def test_legacy_duplicates_are_merged(self, tmp_path):
+        """Test that migrating a database with duplicate patterns folds them together"""
+        path = tmp_path / "legacy.db"
+        conn = sqlite3.connect(path)
+        conn.execute("""
+            CREATE TABLE patterns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, pattern_type TEXT NOT NULL,
+                pattern_data TEXT NOT NULL, success_count INTEGER DEFAULT 0,
+                failure_count INTEGER DEFAULT 0, avg_execution_time_ms REAL,
+                last_used TEXT, created_at TEXT, confidence_score REAL DEFAULT 0.5
+            )
+        """)
+        conn.executemany(
+            "INSERT INTO patterns (pattern_type, pattern_data, success_count, failure_count, "
+            "avg_execution_time_ms) VALUES ('t', ?, ?, ?, ?)",
+            [('{"a": 1, "b": 2}', 3, 0, 10.0), ('{"b": 2, "a": 1}', 0, 1, 50.0)]
+        )
+        conn.commit()
+        conn.close()
+
+        mem = MemorySystem(str(path))
+        [pattern] = mem.get_best_patterns("t")
+        assert (pattern["success_count"], pattern["failure_count"]) == (3, 1)
+        assert pattern["avg_execution_time_ms"] == 20.0
+        assert pattern["confidence_score"] == 0.75
+        mem.close()
+
+
+class TestHistoryPagination:
+    """Keyset pagination and export test suite"""
+
+    @pytest.fixture
+    def history(self, memory):
+        with memory.db.write() as conn:
+            conn.executemany(
+                "INSERT INTO executions (timestamp, ts, operation_type, intent, success) "
+                "VALUES ('', ?, ?, ?, ?)",
+                # Pairs of rows share a timestamp to exercise the id tie-breaker
+                [(1000 + i // 2, "shell" if i % 3 else "python", f"op {i}", i % 2 == 0)
+                 for i in range(25)]
+            )
+        return memory
+
+    def test_pages_cover_all_rows_once(self, history):
+        """Test that following cursors visits every row exactly once, newest first"""
+        seen, cursor = [], None
+        while True:
+            rows, cursor = history.query_executions(limit=7, cursor=cursor)
+            seen.extend(rows)
+            if cursor is None:
+                break
+
+        assert len(seen) == 25
+        assert [(r["ts"], r["id"]) for r in seen] == sorted(
+            ((r["ts"], r["id"]) for r in seen), reverse=True)
+
+    def test_filters(self, history):
+        """Test operation type, success and time range filters"""
+        rows, _ = history.query_executions(limit=100, operation_type="python", success=True)
+        assert rows and all(r["operation_type"] == "python" and r["success"] for r in rows)
+
+        rows, _ = history.query_executions(limit=100, since_ts=1005, until_ts=1007)
+        assert sorted(r["ts"] for r in rows) == [1005, 1005, 1006, 1006]
+
+    def test_invalid_cursor(self, history):
+        with pytest.raises(ValueError):
+            history.query_executions(cursor="not-a-cursor")
+
+    def test_iter_executions_streams_in_batches(self, history):
+        """Test that the export iterator yields every matching row"""
+        rows = list(history.iter_executions(batch_size=4, operation_type="shell"))
+        assert len(rows) == sum(1 for i in range(25) if i % 3)
+
+
+class TestExecutionAnalytics:
+    """SQL aggregation test suite"""
+
+    def test_window_aggregates(self, memory):
+        """Test summary, percentiles, error classes and buckets"""
+        rows = [(1000 + i * 1000, "shell", True, i + 1, None) for i in range(100)]
+        rows += [(5000, "python", False, 50, "Connection refused"),
+                 (6000, "python", False, 70, "Operation TIMEOUT after 30s"),
+                 (7000, "python", False, 90, "boom")]
+        with memory.db.write() as conn:
+            conn.executemany(
+                "INSERT INTO executions (timestamp, ts, operation_type, success, execution_time_ms, "
+                "error_message) VALUES ('', ?, ?, ?, ?, ?)", rows
+            )
+
+        analytics = memory.get_execution_analytics(0, 200000, bucket_ms=50000)
+        assert analytics["total_executions"] == 103
+        assert analytics["failures"] == 3
+
+        shell = next(op for op in analytics["by_operation"] if op["operation_type"] == "shell")
+        assert (shell["p50_ms"], shell["p90_ms"], shell["p99_ms"]) == (50, 90, 99)
+        assert {f["error_type"]: f["count"] for f in analytics["failures_by_error_type"]} == {
+            "Connection Error": 1, "Timeout": 1, "Unknown Error": 1}
+        assert [b["count"] for b in analytics["timeseries"]] == [52, 50, 1]
+
+    def test_window_bounds(self, memory):
+        """Test that rows outside [since, until) are ignored"""
+        memory.record_execution("shell", "now", {}, True, 1)
+        assert memory.get_execution_analytics(0, 1)["total_executions"] == 0
+
+
+class TestWriteBehind:
+    """Write-behind batching test suite"""
+
+    @pytest.fixture
+    def buffered(self, tmp_path):
+        mem = MemorySystem(str(tmp_path / "buffered.db"), write_behind=True,
+                           flush_batch_size=100, flush_interval_seconds=60, max_pending_writes=200)
+        yield mem
+        mem.close()
+
+    def _raw_count(self, mem, table):
+        return mem.db.read().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_writes_are_buffered_until_flush(self, buffered):
+        """Test that records stay in memory until flush()"""
+        for i in range(10):
+            buffered.record_execution("shell", "op", {}, True, i)
+            buffered.record_metric("latency", float(i))
+
+        assert self._raw_count(buffered, "executions") == 0
+        assert buffered.flush() == 20
+        assert self._raw_count(buffered, "executions") == 10
+        assert self._raw_count(buffered, "metrics") == 10
+
+    def test_reads_do_not_flush(self, buffered):
+        """Test that hot reads leave buffered rows for the flusher"""
+        buffered.record_execution("shell", "op", {}, True, 5)
+        assert buffered.get_statistics()["total_executions"] == 0
+        assert buffered.write_buffer.pending == 1
+        buffered.flush()
+        assert buffered.get_statistics()["total_executions"] == 1
+
+    def test_batch_size_triggers_background_flush(self, buffered):
+        """Test that a full batch is written by the flusher thread"""
+        for i in range(100):
+            buffered.record_metric("latency", float(i))
+
+        deadline = time.monotonic() + 2
+        while self._raw_count(buffered, "metrics") < 100 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert self._raw_count(buffered, "metrics") == 100
+        assert buffered.write_buffer.get_stats()["flushes"] >= 1
+
+    def test_full_buffer_applies_backpressure(self, buffered):
+        """Test that the buffer never exceeds max_pending"""
+        for i in range(450):
+            buffered.record_metric("latency", float(i))
+            assert buffered.write_buffer.pending <= 200
+        buffered.flush()
+        assert self._raw_count(buffered, "metrics") == 450
+
+    def test_failed_flush_is_retried(self, buffered, monkeypatch):
+        """Test that a batch is kept and retried when the database is busy"""
+        buffered.record_execution("shell", "op", {}, True, 1)
+        real_write = buffered.db.write
+
+        @contextmanager
+        def busy_write():
+            raise sqlite3.OperationalError("database is locked")
+            yield
+
+        monkeypatch.setattr(buffered.db, "write", busy_write)
+        assert buffered.flush() == 0
+        stats = buffered.write_buffer.get_stats()
+        # Failing before the batch was taken does not count against it
+        assert stats["pending"] == 1 and stats["retries"] == 0 and stats["consecutive_failures"] == 0
+
+        @contextmanager
+        def failing_commit():
+            with real_write() as conn:
+                yield conn
+                raise sqlite3.OperationalError("database or disk is full")
+
+        monkeypatch.setattr(buffered.db, "write", failing_commit)
+        assert buffered.flush() == 0
+        stats = buffered.write_buffer.get_stats()
+        assert stats["pending"] == 1 and stats["retries"] == 1 and stats["failed"] == 0
+
+        monkeypatch.setattr(buffered.db, "write", real_write)
+        assert buffered.flush() == 1
+        assert self._raw_count(buffered, "executions") == 1
+
+    def test_bad_row_is_dropped_alone(self, buffered):
+        """Test that one rejected row does not lose the rest of the batch"""
+        buffered.record_metric("latency", 1.0)
+        buffered.record_metric("latency", object())
+        buffered.record_metric("latency", 2.0)
+
+        assert buffered.flush() == 2
+        assert self._raw_count(buffered, "metrics") == 2
+        assert buffered.write_buffer.get_stats()["failed"] == 1
+
+    def test_cluster_count_commits_with_execution(self, buffered):
+        """Test that a failure's cluster count is written, or dropped, with its execution"""
+        buffered.record_execution("shell", "op", {}, False, 1, error_message="Exit code 1")
+        buffered.record_execution("shell", "op", {}, False, object(), error_message="Exit code 2")
+
+        assert buffered.flush() == 1
+        assert self._raw_count(buffered, "executions") == 1
+        assert buffered.db.read().execute("SELECT count FROM error_clusters").fetchone()[0] == 1
+
+    def test_writes_inside_transaction_join_it(self, buffered):
+        """Test that inserts in a transaction bypass the buffer and share its fate"""
+        with pytest.raises(RuntimeError):
+            with buffered.transaction():
+                for i in range(250):
+                    buffered.record_metric("latency", float(i))
+                assert buffered.write_buffer.pending == 0
+                raise RuntimeError("abort")
+        assert self._raw_count(buffered, "metrics") == 0
+
+        with buffered.transaction():
+            buffered.record_metric("latency", 1.0)
+        assert self._raw_count(buffered, "metrics") == 1
+        assert buffered.write_buffer.get_stats()["direct_writes"] == 251
+
+    def test_close_flushes_pending(self, tmp_path):
+        """Test flush-on-shutdown"""
+        path = str(tmp_path / "shutdown.db")
+        mem = MemorySystem(path, write_behind=True, flush_interval_seconds=60)
+        mem.record_execution("shell", "op", {}, True, 1)
+        mem.close()
+
+        reopened = MemorySystem(path)
+        assert reopened.get_statistics()["total_executions"] == 1
+        reopened.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,114 @@
+"""
+Tests for vectorized latency analytics
+"""
+
+import pytest
+import random
+import time
+import sys
+import pathlib
+
+import numpy as np
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from agent.memory import MemorySystem
+from agent.analytics import LatencyAnalyzer, ewma, linear_trend, hourly_seasonality, HOUR_MS
+from agent.learner import PatternLearner
+
+
+@pytest.fixture
+def memory(tmp_path):
+    mem = MemorySystem(str(tmp_path / "agent_memory.db"))
+    yield mem
+    mem.close()
+
+
+def insert_latencies(memory, rows):
+    """Insert (ts, operation_type, execution_time_ms) rows"""
+    with memory.db.write() as conn:
+        conn.executemany(
+            "INSERT INTO executions (timestamp, ts, operation_type, success, execution_time_ms) "
+            "VALUES ('', ?, ?, 1, ?)", rows
+        )
+
+
+class TestStatistics:
+    """Statistical helper test suite"""
+
+    def test_ewma_matches_recurrence(self):
+        """Test the vectorized EWMA against the recursive definition"""
+        for n in (1, 50, 1000):
+            values = np.random.default_rng(n).normal(100, 10, n)
+            expected = values[0]
+            for value in values[1:]:
+                expected = 0.1 * value + 0.9 * expected
+            assert ewma(values, 0.1) == pytest.approx(expected)
+
+    def test_linear_trend_detects_slope(self):
+        """Test slope, confidence interval and verdict"""
+        ts = np.arange(0, 10 * HOUR_MS, 60000, dtype=np.int64)
+        noise = np.random.default_rng(1).normal(0, 5, len(ts))
+        rising = linear_trend(ts, 100 + 20 * ts / HOUR_MS + noise)
+        assert rising["trend"] == "degrading"
+        low, high = rising["slope_ci95_ms_per_hour"]
+        assert low < 20 < high
+
+        flat = linear_trend(ts, 100 + noise)
+        assert flat["trend"] == "stable"
+        assert linear_trend(ts[:3], noise[:3])["trend"] == "insufficient_data"
+
+    def test_hourly_seasonality(self):
+        """Test that the slowest hour of day is found"""
+        ts = np.arange(0, 48 * HOUR_MS, 60000, dtype=np.int64)
+        values = np.where((ts // HOUR_MS) % 24 == 13, 500.0, 100.0)
+        season = hourly_seasonality(ts, values)
+        assert season["peak_hour"] == 13
+        assert season["count_by_hour"][0] == 120
+
+
+class TestLatencyAnalyzer:
+    """Latency report test suite"""
+
+    def test_percentiles_per_operation(self, memory):
+        """Test per-operation percentiles against NumPy on the raw data"""
+        now = int(time.time() * 1000)
+        rows = [(now - 1000 * i, "shell" if i % 2 else "http", float(i)) for i in range(1, 2001)]
+        insert_latencies(memory, rows)
+
+        report = LatencyAnalyzer(memory).analyze(hours=1, until_ts=now + 1)
+        shell = [r[2] for r in rows if r[1] == "shell"]
+        assert report["samples"] == 2000
+        assert report["by_operation"]["shell"]["p99_ms"] == pytest.approx(np.percentile(shell, 99), abs=0.01)
+        assert set(report["by_operation"]) == {"http", "shell"}
+
+    def test_empty_window(self, memory):
+        assert LatencyAnalyzer(memory).analyze(hours=1)["samples"] == 0
+
+    def test_large_window_is_fast(self, memory):
+        """Test that 100k rows are analyzed well within a second"""
+        now = int(time.time() * 1000)
+        insert_latencies(memory, [
+            (now - HOUR_MS * 20 + i * 700, random.choice(("shell", "python", "http")), random.random() * 100)
+            for i in range(100000)
+        ])
+        report = LatencyAnalyzer(memory).analyze(hours=24, until_ts=now)
+        assert report["samples"] == 100000
+        assert report["elapsed_ms"] < 1000
+
+    def test_slow_tail_becomes_opportunity(self, memory):
+        """Test that a slow p95 is reported even when the mean looks fine"""
+        now = int(time.time() * 1000)
+        insert_latencies(memory, [
+            (now - 1000 * i, "docker", 40000.0 if i % 10 == 0 else 100.0) for i in range(1, 201)
+        ])
+        opportunities = PatternLearner(memory).identify_optimization_opportunities()
+        [slow] = [o for o in opportunities if o["type"] == "performance"]
+        assert slow["operation"] == "docker"
+        assert slow["priority"] == "high"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
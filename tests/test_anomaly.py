@@ -0,0 +1,117 @@
+"""
+Tests for streaming latency and error-rate anomaly detection
+"""
+
+import pytest
+import random
+import sys
+import pathlib
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from agent.memory import MemorySystem
+from agent.anomaly import AnomalyDetector, STATE_KEY
+from agent.rollups import LogHistogram
+
+
+@pytest.fixture
+def memory(tmp_path):
+    mem = MemorySystem(str(tmp_path / "agent_memory.db"))
+    yield mem
+    mem.close()
+
+
+@pytest.fixture
+def detector(memory):
+    detector = AnomalyDetector(memory, min_samples=50, cooldown_seconds=300)
+    detector.alerts = []
+    detector.add_listener(detector.alerts.append)
+    return detector
+
+
+def feed(detector, operation_type, n, latency, success=True, jitter=0.1):
+    rng = random.Random(42)
+    for _ in range(n):
+        detector.observe(operation_type, success, latency * (1 + rng.uniform(-jitter, jitter)))
+
+
+class TestAnomalyDetector:
+    """Anomaly detector test suite"""
+
+    def test_steady_traffic_raises_nothing(self, detector):
+        feed(detector, "shell", 2000, 100)
+        assert detector.alerts == []
+        assert detector.get_baselines()["shell"]["mean_ms"] == pytest.approx(100, rel=0.05)
+
+    def test_latency_regression_detected(self, detector):
+        """Test that a sustained latency jump is reported once per cooldown"""
+        feed(detector, "shell", 500, 100)
+        feed(detector, "shell", 30, 400)
+
+        assert [a["kind"] for a in detector.alerts] == ["latency"]
+        assert detector.alerts[0]["operation_type"] == "shell"
+        assert detector.get_stats()["suppressed"] > 0
+
+    def test_single_outlier_ignored(self, detector):
+        feed(detector, "shell", 500, 100)
+        detector.observe("shell", True, 2000)
+        feed(detector, "shell", 20, 100)
+        assert detector.alerts == []
+
+    def test_error_rate_spike_detected(self, detector):
+        feed(detector, "api", 500, 50)
+        feed(detector, "api", 10, 50, success=False)
+        assert [a["kind"] for a in detector.alerts] == ["error_rate"]
+
+    def test_operations_have_separate_baselines(self, detector):
+        feed(detector, "fast", 500, 10)
+        feed(detector, "slow", 500, 1000)
+        assert detector.alerts == []
+
+    def test_operation_limit(self, memory):
+        detector = AnomalyDetector(memory, max_operations=2)
+        for name in ("a", "b", "c"):
+            detector.observe(name, True, 10)
+        assert set(detector.get_baselines()) == {"a", "b"}
+        assert detector.get_stats()["dropped_operations"] == 1
+
+    def test_state_survives_restart(self, memory, detector):
+        """Test that baselines are persisted to agent_state and restored"""
+        feed(detector, "shell", 200, 100)
+        detector.save_state()
+        assert memory.get_agent_state(STATE_KEY)
+
+        restored = AnomalyDetector(memory)
+        assert restored.get_baselines() == detector.get_baselines()
+
+    def test_records_feed_detector(self, memory, detector):
+        """Test that recorded executions reach the detector via the listener"""
+        memory.add_execution_listener(detector.observe)
+        memory.record_execution("shell", "ls", {}, True, 12)
+        assert detector.get_baselines()["shell"]["samples"] == 1
+
+    def test_listener_errors_do_not_break_recording(self, memory):
+        def broken(*_args):
+            raise RuntimeError("boom")
+
+        memory.add_execution_listener(broken)
+        memory.record_execution("shell", "ls", {}, True, 12)
+        assert memory.get_statistics()["total_executions"] == 1
+
+
+class TestBoundedHistogram:
+    """Bounded sketch test suite"""
+
+    def test_max_bins_caps_memory(self):
+        hist = LogHistogram(max_bins=32)
+        for i in range(1, 10000):
+            hist.add(float(i))
+        assert len(hist.counts) <= 32
+        assert hist.total == 9999
+        assert hist.quantile(0.99) == pytest.approx(9900, rel=0.02)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,111 @@
+"""
+Tests for the async MemorySystem facade
+"""
+
+import pytest
+import asyncio
+import threading
+import time
+import sys
+import pathlib
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from agent.memory import MemorySystem
+from agent.async_memory import AsyncMemorySystem, MemoryOverloaded
+
+
+@pytest.fixture
+def memory_async(tmp_path):
+    memory = MemorySystem(str(tmp_path / "agent_memory.db"))
+    facade = AsyncMemorySystem(memory, max_queue=4)
+    yield facade
+    facade.close()
+    memory.close()
+
+
+class TestAsyncMemorySystem:
+    """Async memory facade test suite"""
+
+    def test_methods_are_awaitable(self, memory_async):
+        """Test that MemorySystem methods are exposed as coroutines"""
+        async def scenario():
+            await memory_async.record_execution("shell", "ls", {}, True, 10)
+            return await memory_async.get_statistics()
+
+        assert asyncio.run(scenario())["total_executions"] == 1
+
+    def test_calls_do_not_block_the_loop(self, memory_async):
+        """Test that the event loop keeps running during a slow DB call"""
+        ticks = []
+
+        async def heartbeat():
+            for _ in range(5):
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        async def scenario():
+            beat = asyncio.create_task(heartbeat())
+            await memory_async.run(time.sleep, 0.2)
+            await beat
+
+        asyncio.run(scenario())
+        assert len(ticks) == 5
+
+    def test_calls_run_in_order_on_one_thread(self, memory_async):
+        """Test that queued calls share the dedicated DB thread"""
+        seen = []
+
+        def record(i):
+            seen.append((i, threading.current_thread().name))
+
+        async def scenario():
+            await asyncio.gather(*(memory_async.run(record, i) for i in range(4)))
+
+        asyncio.run(scenario())
+        assert [i for i, _ in seen] == [0, 1, 2, 3]
+        assert len({name for _, name in seen}) == 1
+        assert seen[0][1].startswith("memory-db")
+
+    def test_queue_is_bounded(self, memory_async):
+        """Test that calls beyond max_queue are rejected"""
+        async def scenario():
+            results = await asyncio.gather(
+                *(memory_async.run(time.sleep, 0.05) for _ in range(6)),
+                return_exceptions=True
+            )
+            return [r for r in results if isinstance(r, MemoryOverloaded)]
+
+        rejected = asyncio.run(scenario())
+        assert len(rejected) == 2
+        assert rejected[0].retry_after >= 1
+        assert memory_async.get_stats()["rejected"] == 2
+
+    def test_overload_maps_to_503(self, memory_async, monkeypatch):
+        """Test that routes shed a saturated memory executor with 503 and Retry-After"""
+        from fastapi import HTTPException
+        import agent_routes
+
+        class Agent:
+            pass
+
+        agent = Agent()
+        agent.memory_async = memory_async
+        monkeypatch.setattr(agent_routes, "get_agent", lambda: agent)
+        monkeypatch.setattr(memory_async, "queued", memory_async.max_queue)
+
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(agent_routes.get_memory_stats.__wrapped__(request=None))
+        assert exc.value.status_code == 503
+        assert exc.value.headers["Retry-After"] == "1"
+
+    def test_closed_facade_rejects_calls(self, memory_async):
+        memory_async.close()
+        with pytest.raises(RuntimeError):
+            asyncio.run(memory_async.get_statistics())
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,120 @@
+"""
+Tests for per-tool bulkheads
+"""
+
+import pytest
+import asyncio
+import time
+from fastapi import HTTPException
+import sys
+import pathlib
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from bulkhead import Bulkhead, ToolRegistry
+
+
+class TestBulkhead:
+    """Bulkhead test suite"""
+
+    def test_concurrency_limit_enforced(self):
+        """Test that no more than max_concurrent calls run at once"""
+        bulkhead = Bulkhead("shell", max_concurrent=2, max_queue=10, timeout_seconds=5)
+        peak = []
+
+        async def handler(_):
+            peak.append(bulkhead.in_flight)
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        async def scenario():
+            return await asyncio.gather(*[bulkhead.call(handler, {}) for _ in range(6)])
+
+        assert asyncio.run(scenario()) == ["ok"] * 6
+        assert max(peak) == 2
+        stats = bulkhead.get_stats()
+        assert stats["completed"] == 6
+        assert stats["in_flight"] == 0
+
+    def test_full_queue_rejects_with_retry_after(self):
+        """Test that callers beyond the queue bound are shed with 503"""
+        bulkhead = Bulkhead("docker", max_concurrent=1, max_queue=1, timeout_seconds=5)
+
+        async def handler(_):
+            await asyncio.sleep(0.05)
+
+        async def scenario():
+            return await asyncio.gather(
+                *[bulkhead.call(handler, {}) for _ in range(3)], return_exceptions=True
+            )
+
+        results = asyncio.run(scenario())
+        rejected = [r for r in results if isinstance(r, HTTPException)]
+        assert len(rejected) == 1
+        assert rejected[0].status_code == 503
+        assert "Retry-After" in rejected[0].headers
+        assert bulkhead.get_stats()["rejected"] == 1
+
+    def test_timeout_raises_408(self):
+        """Test that slow tools time out but hold their slot until the thread finishes"""
+        bulkhead = Bulkhead("python", max_concurrent=1, max_queue=1, timeout_seconds=0.1)
+        calls = []
+
+        def handler(_):
+            calls.append(time.perf_counter())
+            time.sleep(0.15)
+
+        async def scenario():
+            with pytest.raises(HTTPException) as exc_info:
+                await bulkhead.call(handler, {}, blocking=True)
+            assert exc_info.value.status_code == 408
+            stats = bulkhead.get_stats()
+            assert stats["in_flight"] == 1 and stats["orphaned"] == 1
+
+            # The next call waits for the abandoned thread instead of piling up behind it
+            with pytest.raises(HTTPException):
+                await bulkhead.call(handler, {}, blocking=True)
+            assert calls[1] - calls[0] >= 0.14
+            await asyncio.sleep(0.3)
+
+        asyncio.run(scenario())
+        assert bulkhead.in_flight == 0 and bulkhead.orphaned == 0
+        bulkhead.shutdown()
+
+    def test_busy_tool_does_not_starve_other_tools(self):
+        """Test that a saturated heavy tool leaves cheap tools responsive"""
+        registry = ToolRegistry()
+        registry.register("docker", lambda a: time.sleep(0.3), blocking=True,
+                          max_concurrent=2, max_queue=10, timeout_seconds=5)
+        registry.register("file_write", lambda a: "written", blocking=True,
+                          max_concurrent=2, max_queue=10, timeout_seconds=5, priority=1)
+
+        async def scenario():
+            heavy = [asyncio.ensure_future(registry.execute("docker", {})) for _ in range(6)]
+            await asyncio.sleep(0.01)
+            start = time.perf_counter()
+            result = await registry.execute("file_write", {})
+            elapsed = time.perf_counter() - start
+            await asyncio.gather(*heavy)
+            return result, elapsed
+
+        result, elapsed = asyncio.run(scenario())
+        assert result == "written"
+        assert elapsed < 0.2
+        stats = registry.get_stats()
+        assert stats["docker"]["queue_wait_max_ms"] > 0
+        assert stats["file_write"]["priority"] == 1
+        registry.shutdown()
+
+    def test_unknown_tool(self):
+        """Test that unregistered tools are rejected"""
+        registry = ToolRegistry()
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(registry.execute("missing", {}))
+        assert exc_info.value.status_code == 400
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,199 @@
+"""
+Tests for circuit breakers on autonomous operations and tool execution
+"""
+
+import pytest
+import asyncio
+import sys
+import pathlib
+from unittest.mock import patch
+
+from fastapi import HTTPException
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from agent.agent_loop import AutonomousAgent
+from agent.circuit_breaker import (
+    AGENT_CYCLE_BREAKER, CLOSED, HALF_OPEN, OPEN,
+    CircuitBreaker, CircuitBreakerRegistry, SlidingWindowCounter
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_breaker(clock, **kwargs):
+    params = dict(window_seconds=10, failure_threshold=0.5, min_calls=4, cooldown_seconds=5, clock=clock)
+    params.update(kwargs)
+    return CircuitBreaker("shell", **params)
+
+
+class TestSlidingWindow:
+    """Time-bucketed counter test suite"""
+
+    def test_buckets_expire(self):
+        window = SlidingWindowCounter(10, bucket_count=10)
+        window.add(False, 100.0)
+        window.add(True, 105.0)
+        assert window.totals(105.0) == (1, 1)
+        assert window.totals(110.5) == (1, 0)
+        assert window.totals(200.0) == (0, 0)
+
+
+class TestCircuitBreaker:
+    """Circuit breaker state machine test suite"""
+
+    def test_trips_on_failure_ratio(self):
+        clock = FakeClock()
+        breaker = make_breaker(clock)
+        for success in (True, False, False):
+            breaker.record(success)
+        assert breaker.state == CLOSED  # below min_calls
+
+        breaker.record(True)
+        assert breaker.state == OPEN  # 2 of 4 calls failed
+        assert "2/4 calls failed" in breaker.last_reason
+
+    def test_open_half_open_closed(self):
+        """Test the full cycle: trip, reject, probe, close"""
+        clock = FakeClock()
+        breaker = make_breaker(clock)
+        for _ in range(4):
+            breaker.record(False)
+        assert breaker.state == OPEN
+        assert not breaker.allow()
+        assert breaker.retry_after() == 5
+
+        clock.now += 5
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow()
+        assert not breaker.allow()  # one probe at a time
+        breaker.record(True)
+        assert breaker.state == CLOSED
+        assert breaker.get_stats()["calls"] == 0
+        assert breaker.rejected == 2
+
+    def test_failed_probe_reopens(self):
+        clock = FakeClock()
+        breaker = make_breaker(clock)
+        breaker.trip("test")
+        clock.now += 5
+        assert breaker.allow()
+        breaker.record(False)
+        assert breaker.state == OPEN and breaker.trips == 2
+
+    def test_released_probe_frees_slot(self):
+        clock = FakeClock()
+        breaker = make_breaker(clock)
+        breaker.trip("test")
+        clock.now += 5
+        assert breaker.allow()
+        breaker.release()
+        assert breaker.allow()
+
+    def test_old_failures_leave_window(self):
+        clock = FakeClock()
+        breaker = make_breaker(clock)
+        for _ in range(3):
+            breaker.record(False)
+        clock.now += 11
+        breaker.record(False)
+        assert breaker.state == CLOSED
+
+    def test_registry_overrides_and_listeners(self):
+        registry = CircuitBreakerRegistry(min_calls=100, clock=FakeClock())
+        registry.configure("python", min_calls=1)
+        changes = []
+        registry.add_listener(lambda name, old, new: changes.append((name, old, new)))
+
+        registry.get("python").record(False)
+        registry.get("shell").record(False)
+        assert registry.open_breakers() == ["python"]
+        assert changes == [("python", CLOSED, OPEN)]
+        with pytest.raises(ValueError):
+            registry.configure("python", threshold=1)
+
+
+class TestSafetyIntegration:
+    """Breakers in the safety controller and agent loop"""
+
+    @pytest.fixture
+    def agent(self, tmp_path, monkeypatch):
+        registry = CircuitBreakerRegistry(min_calls=2)
+        monkeypatch.setattr("agent.safety.get_breakers", lambda: registry)
+        monkeypatch.setenv("AGENT_INCIDENT_LOG_FILE", "")
+        agent = AutonomousAgent(str(tmp_path / "agent_memory.db"))
+        agent.safety.enabled = True
+        yield agent
+        agent.close()
+
+    def test_recorded_failures_block_operation(self, agent):
+        for _ in range(2):
+            agent.memory.record_execution("shell", "false", {}, False, 10, error_message="exit 1")
+
+        ok, reason = agent.safety.validate_operation("shell", {"cmd": "ls"})
+        assert not ok and "Circuit open" in reason
+        assert agent.safety.validate_operation("python", {})[0]
+        assert agent.safety.check_safety_limits()["open_breakers"] == ["shell"]
+
+    def test_critical_incident_pauses_cycles(self, agent):
+        agent.safety.record_safety_incident("test", "boom", "critical")
+        assert agent.safety.breakers.get(AGENT_CYCLE_BREAKER).is_open
+
+        asyncio.run(agent._run_cycle())
+        assert agent.profiler.get_report()["cycles_recorded"] == 0
+
+
+class TestRunStepBreaker:
+    """Breaker gating of tool execution in run_step"""
+
+    def test_failing_tool_is_shed(self, tmp_path):
+        import main
+
+        registry = CircuitBreakerRegistry(min_calls=2, cooldown_seconds=60)
+        calls = []
+
+        async def failing_execute(name, args):
+            calls.append(name)
+            raise HTTPException(500, "tool crashed")
+
+        step = main.ToolCall(tool="shell", args={"cmd": "ls"}, description="list")
+        with patch.object(main, "tool_breakers", registry), \
+                patch.object(main.tool_registry, "execute", failing_execute):
+            for _ in range(2):
+                with pytest.raises(HTTPException) as exc:
+                    asyncio.run(main.run_step(step, "test"))
+                assert exc.value.status_code == 500
+
+            with pytest.raises(HTTPException) as exc:
+                asyncio.run(main.run_step(step, "test"))
+            assert exc.value.status_code == 503
+            assert exc.value.headers["Retry-After"] == "60"
+        assert len(calls) == 2
+
+    def test_policy_rejections_do_not_count(self):
+        import main
+
+        registry = CircuitBreakerRegistry(min_calls=1)
+
+        async def rejecting_execute(name, args):
+            raise HTTPException(403, "not allowed by policy")
+
+        step = main.ToolCall(tool="shell", args={"cmd": "rm -rf /"}, description="")
+        with patch.object(main, "tool_breakers", registry), \
+                patch.object(main.tool_registry, "execute", rejecting_execute):
+            for _ in range(3):
+                with pytest.raises(HTTPException):
+                    asyncio.run(main.run_step(step, "test"))
+        assert registry.get("shell").state == CLOSED
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
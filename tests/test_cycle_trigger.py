@@ -0,0 +1,85 @@
+"""
+Tests for event-driven agent cycle triggering
+"""
+
+import pytest
+import asyncio
+import threading
+import time
+import sys
+import pathlib
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from agent.cycle_trigger import CycleTrigger
+
+
+def make_trigger(**kwargs):
+    params = dict(execution_threshold=3, max_interval_seconds=5,
+                  min_spacing_seconds=0, debounce_seconds=0)
+    params.update(kwargs)
+    trigger = CycleTrigger(**params)
+    trigger.reset()
+    return trigger
+
+
+class TestCycleTrigger:
+    """Cycle trigger test suite"""
+
+    def test_execution_threshold_triggers(self):
+        trigger = make_trigger()
+
+        async def scenario():
+            waiter = asyncio.create_task(trigger.wait())
+            await asyncio.sleep(0.01)
+            for _ in range(2):
+                trigger.notify_execution()
+            await asyncio.sleep(0.01)
+            assert not waiter.done()
+            trigger.notify_execution()
+            return await asyncio.wait_for(waiter, 1)
+
+        assert asyncio.run(scenario()) == "executions"
+        assert trigger.get_stats()["pending_executions"] == 0
+
+    def test_anomaly_triggers_from_another_thread(self):
+        trigger = make_trigger()
+
+        async def scenario():
+            waiter = asyncio.create_task(trigger.wait())
+            await asyncio.sleep(0.01)
+            threading.Thread(target=trigger.notify_anomaly, args=({"kind": "latency"},)).start()
+            return await asyncio.wait_for(waiter, 1)
+
+        assert asyncio.run(scenario()) == "anomaly"
+
+    def test_max_interval(self):
+        trigger = make_trigger(max_interval_seconds=0.05)
+        started = time.monotonic()
+        assert asyncio.run(trigger.wait()) == "max_interval"
+        assert time.monotonic() - started >= 0.05
+
+    def test_min_spacing_and_debounce(self):
+        """Test that an early trigger waits for the spacing and debounce"""
+        trigger = make_trigger(min_spacing_seconds=0.1, debounce_seconds=0.02)
+        started = time.monotonic()
+        trigger.notify_anomaly()
+        assert asyncio.run(trigger.wait()) == "anomaly"
+        assert time.monotonic() - started >= 0.1
+
+    def test_stop_releases_waiter(self):
+        trigger = make_trigger()
+
+        async def scenario():
+            waiter = asyncio.create_task(trigger.wait())
+            await asyncio.sleep(0.01)
+            trigger.stop()
+            return await asyncio.wait_for(waiter, 1)
+
+        assert asyncio.run(scenario()) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
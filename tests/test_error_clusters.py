@@ -0,0 +1,193 @@
+"""
+Tests for error message clustering
+"""
+
+import pytest
+import sqlite3
+import time
+import sys
+import pathlib
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from agent.memory import MemorySystem
+from agent.learner import PatternLearner
+from agent.error_clusters import ErrorClusterer, UPSERT_ERROR_CLUSTER_SQL, normalize_error
+
+
+@pytest.fixture
+def memory(tmp_path):
+    mem = MemorySystem(str(tmp_path / "agent_memory.db"))
+    yield mem
+    mem.close()
+
+
+class TestNormalization:
+    """Message normalization test suite"""
+
+    def test_variable_parts_are_masked(self):
+        assert normalize_error("Permission denied: /var/log/app-12.log") == \
+            ["Permission", "denied:", "<PATH>"]
+        assert normalize_error("GET https://api.example.com/v1/x?id=3 failed after 30.5s") == \
+            ["GET", "<URL>", "failed", "after", "<NUM>"]
+        assert normalize_error("KeyError: 'user_name' in job 5f0c6a1e-0b7e-4a8c-9d0e-1b2c3d4e5f60") == \
+            ["KeyError:", "<STR>", "in", "job", "<ID>"]
+        assert normalize_error("connect to 10.0.0.12:5432 refused") == \
+            ["connect", "to", "<IP>", "refused"]
+
+    def test_empty_message(self):
+        assert normalize_error(None) == []
+
+
+class TestErrorClusterer:
+    """Drain-style clustering test suite"""
+
+    def test_similar_messages_share_a_cluster(self):
+        clusterer = ErrorClusterer()
+        a = clusterer.add("Command 'ls /tmp' exited with code 2")
+        b = clusterer.add("Command 'cat x' exited with code 127")
+        c = clusterer.add("Task alpha was cancelled by user")
+        d = clusterer.add("Task beta was cancelled by user")
+
+        assert a.id == b.id and c.id == d.id and a.id != c.id
+        assert a.count == 2
+        assert c.template == "Task <*> was cancelled by user"
+        assert c.exemplar == "Task alpha was cancelled by user"
+
+    def test_unrelated_messages_stay_apart(self):
+        clusterer = ErrorClusterer()
+        a = clusterer.add("Disk quota exceeded on volume data")
+        b = clusterer.add("Disk controller reset during write op")
+        assert a.id != b.id
+
+    def test_match_does_not_count(self):
+        clusterer = ErrorClusterer()
+        cluster = clusterer.add("Timeout after 30 seconds")
+        assert clusterer.match("Timeout after 45 seconds") is cluster
+        assert cluster.count == 1
+        assert clusterer.match("something else entirely") is None
+
+    def test_create_false_only_counts_existing_clusters(self):
+        clusterer = ErrorClusterer()
+        assert clusterer.add("Timeout after 30 seconds", create=False) is None
+        assert clusterer.clusters == {}
+        cluster = clusterer.add("Timeout after 30 seconds", assign_id=lambda c: 42)
+        assert cluster.id == 42
+        assert clusterer.add("Timeout after 45 seconds", create=False) is cluster
+        assert cluster.count == 2
+
+    def test_leaf_size_is_bounded(self):
+        """Test that a full leaf folds new messages into existing clusters"""
+        clusterer = ErrorClusterer(max_leaf_clusters=3)
+        for word in ("alpha", "beta", "gamma", "delta", "epsilon"):
+            clusterer.add(f"Error {word}{word} {word} {word}")
+        assert len(clusterer.clusters) == 3
+        assert sum(c.count for c in clusterer.clusters.values()) == 5
+
+    def test_cluster_count_is_bounded(self):
+        """Test that messages of a new shape go to a catch-all once max_clusters is reached"""
+        clusterer = ErrorClusterer(max_clusters=3)
+        for i, word in enumerate(("alpha", "beta", "gamma", "delta", "epsilon")):
+            clusterer.add(f"{word} failed" + " again" * i)
+        assert len(clusterer.clusters) == 3
+        catch_all = clusterer.add("zeta")
+        assert catch_all.template == "<*>"
+        assert catch_all.count == 4
+        assert len(clusterer.clusters) == 3
+
+    def test_many_messages_few_clusters(self):
+        clusterer = ErrorClusterer()
+        for i in range(20000):
+            clusterer.add(f"Failed to open /data/run_{i}/out.json: errno {i % 7}")
+            clusterer.add(f"Worker {i} lost heartbeat after {i % 60} s")
+        assert len(clusterer.clusters) == 2
+
+
+class TestMemoryIntegration:
+    """Clusters recorded through the memory system"""
+
+    def test_failures_are_clustered_and_persisted(self, tmp_path):
+        path = str(tmp_path / "agent_memory.db")
+        memory = MemorySystem(path)
+        for i in range(5):
+            memory.record_execution("shell", "run", {}, False, 10, error_message=f"Exit code {i} from job {i}")
+        memory.record_execution("shell", "run", {}, True, 10)
+        memory.close()
+
+        memory = MemorySystem(path)
+        [cluster] = memory.get_error_clusters()
+        assert cluster["count"] == 5
+        assert cluster["template"] == "Exit code <NUM> from job <NUM>"
+        # Restored clusters keep their ids
+        assert memory.error_clusters.add("Exit code 9 from job 9").id == cluster["cluster_id"]
+        memory.close()
+
+    def test_cluster_ids_are_assigned_by_sqlite(self, memory):
+        """Test that a cluster stored by another writer keeps its id"""
+        with memory.db.write() as conn:
+            conn.execute("INSERT INTO error_clusters (id, template, count) VALUES (1, 'Disk full', 1)")
+        memory.record_execution("shell", "run", {}, False, 10, error_message="Host h1 unreachable")
+
+        rows = memory.db.read().execute("SELECT id, template, count FROM error_clusters ORDER BY id").fetchall()
+        assert [tuple(r) for r in rows] == [(1, "Disk full", 1), (2, "Host <NUM> unreachable", 1)]
+        execution_cluster = memory.db.read().execute("SELECT error_cluster_id FROM executions").fetchone()[0]
+        assert execution_cluster == 2
+
+    def test_upsert_fills_missing_timestamps(self, memory):
+        """Test that a row stored without timestamps takes them from later upserts"""
+        with memory.db.write() as conn:
+            conn.execute(UPSERT_ERROR_CLUSTER_SQL, (1, "boom", 1, "boom", None, None))
+            conn.execute(UPSERT_ERROR_CLUSTER_SQL, (1, "boom", 1, "boom", 2000, 2000))
+            conn.execute(UPSERT_ERROR_CLUSTER_SQL, (1, "boom", 1, "boom", None, None))
+        row = memory.db.read().execute(
+            "SELECT count, first_seen_ts, last_seen_ts FROM error_clusters WHERE id = 1"
+        ).fetchone()
+        assert tuple(row) == (3, 2000, 2000)
+
+    def test_migration_clusters_existing_failures(self, tmp_path):
+        """Test that v5 assigns clusters to failures recorded before it"""
+        path = str(tmp_path / "agent_memory.db")
+        MemorySystem(path).close()
+        with sqlite3.connect(path) as conn:
+            conn.execute("DROP TABLE error_clusters")
+            conn.execute("ALTER TABLE executions DROP COLUMN error_cluster_id")
+            conn.executemany(
+                "INSERT INTO executions (timestamp, ts, operation_type, intent, success, error_message) "
+                "VALUES ('', ?, 'shell', 'x', 0, ?)",
+                [(i, f"Host h{i} unreachable") for i in range(10)]
+            )
+            conn.execute("PRAGMA user_version = 4")
+
+        memory = MemorySystem(path)
+        [cluster] = memory.get_error_clusters()
+        assert cluster["count"] == 10
+        unassigned = memory.db.read().execute(
+            "SELECT COUNT(*) FROM executions WHERE error_cluster_id IS NULL").fetchone()[0]
+        assert unassigned == 0
+        memory.close()
+
+    def test_learner_reports_clusters(self, memory):
+        for i in range(8):
+            memory.record_execution("api", "call", {}, False, 10, error_message=f"upstream returned {500 + i % 3}")
+        for i in range(2):
+            memory.record_execution("api", "call", {}, False, 10, error_message="Permission denied: /etc/x")
+
+        time.sleep(0.002)  # the analysis window excludes the current millisecond
+        failures = PatternLearner(memory).analyze_execution_patterns(hours=1)["common_failures"]
+        assert [(f["template"], f["count"]) for f in failures] == [
+            ("upstream returned <NUM>", 8), ("Permission denied: <PATH>", 2)]
+        assert failures[1]["error_type"] == "Permission Denied"
+        assert failures[0]["percentage"] == 80.0
+
+    def test_failures_of_a_cluster_share_a_pattern(self, memory):
+        learner = PatternLearner(memory)
+        for i in range(3):
+            memory.record_execution("api", "call", {}, False, 10, error_message=f"upstream returned {500 + i}")
+        assert learner.learn_new_executions() == 3
+        assert memory.get_statistics()["learned_patterns"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
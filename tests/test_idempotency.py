@@ -0,0 +1,177 @@
+"""
+Tests for Idempotency-Key handling on run endpoints
+"""
+
+import pytest
+import asyncio
+import time
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from unittest.mock import patch, AsyncMock
+import sys
+import pathlib
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from idempotency import IdempotencyStore
+from main import APP, sign
+
+
+class TestIdempotencyStore:
+    """Idempotency store test suite"""
+
+    def test_completed_run_is_replayed(self):
+        """Test that a completed run returns the stored result"""
+        store = IdempotencyStore()
+        calls = []
+
+        async def execute():
+            calls.append(1)
+            return {"ok": True, "n": len(calls)}
+
+        async def scenario():
+            first = await store.run("apex_run", "key-1", b"{}", execute)
+            second = await store.run("apex_run", "key-1", b"{}", execute)
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        assert first == ({"ok": True, "n": 1}, False)
+        assert second == ({"ok": True, "n": 1}, True)
+        assert len(calls) == 1
+
+    def test_in_flight_retry_waits_on_original(self):
+        """Test that concurrent retries share one execution"""
+        store = IdempotencyStore()
+        calls = []
+
+        async def execute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"ok": True}
+
+        async def scenario():
+            return await asyncio.gather(*[
+                store.run("nlm_run", "key-1", b"{}", execute) for _ in range(5)
+            ])
+
+        results = asyncio.run(scenario())
+        assert len(calls) == 1
+        assert [replayed for _, replayed in results].count(False) == 1
+        assert store.get_stats()["waits"] == 4
+
+    def test_cancelled_original_hands_over_to_waiter(self):
+        """Test that a retry takes over when the original caller disconnects"""
+        store = IdempotencyStore()
+        calls = []
+
+        async def execute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"ok": True, "n": len(calls)}
+
+        async def scenario():
+            first = asyncio.create_task(store.run("apex_run", "key-1", b"{}", execute))
+            await asyncio.sleep(0.01)
+            second = asyncio.create_task(store.run("apex_run", "key-1", b"{}", execute))
+            third = asyncio.create_task(store.run("apex_run", "key-1", b"{}", execute))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            results = await asyncio.gather(second, third)
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return results
+
+        second, third = asyncio.run(scenario())
+        assert second == ({"ok": True, "n": 2}, False)
+        assert third == ({"ok": True, "n": 2}, True)
+        assert len(calls) == 2
+        assert store.get_stats()["takeovers"] == 1
+
+    def test_key_reuse_with_different_body_rejected(self):
+        """Test that a key cannot be reused for a different request"""
+        store = IdempotencyStore()
+
+        async def execute():
+            return {"ok": True}
+
+        async def scenario():
+            await store.run("apex_run", "key-1", b'{"a": 1}', execute)
+            await store.run("apex_run", "key-1", b'{"a": 2}', execute)
+
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(scenario())
+        assert exc_info.value.status_code == 422
+
+    def test_failed_run_is_not_cached(self):
+        """Test that failures allow the client to retry"""
+        store = IdempotencyStore()
+        calls = []
+
+        async def execute():
+            calls.append(1)
+            if len(calls) == 1:
+                raise HTTPException(500, "boom")
+            return {"ok": True}
+
+        async def scenario():
+            with pytest.raises(HTTPException):
+                await store.run("apex_run", "key-1", b"{}", execute)
+            return await store.run("apex_run", "key-1", b"{}", execute)
+
+        assert asyncio.run(scenario()) == ({"ok": True}, False)
+        assert len(calls) == 2
+
+    def test_store_is_bounded_and_expires(self):
+        """Test max_entries trimming and TTL eviction"""
+        store = IdempotencyStore(ttl_seconds=0, max_entries=2)
+
+        async def execute():
+            return {"ok": True}
+
+        async def scenario():
+            for i in range(5):
+                await store.run("apex_run", f"key-{i}", b"{}", execute)
+
+        asyncio.run(scenario())
+        assert store.get_stats()["entries"] <= 2
+
+        time.sleep(0.01)
+        store._evict()
+        assert store.get_stats()["entries"] == 0
+
+
+class TestIdempotentEndpoints:
+    """Idempotency-Key behaviour on /apex/run"""
+
+    def setup_method(self):
+        self.client = TestClient(APP)
+        self.test_key = "test_shared_key_minimum_32_chars_long"
+
+    def generate_auth_headers(self, body: str):
+        timestamp = str(int(time.time()))
+        return {"X-TS": timestamp, "X-SIG": sign(body.encode(), timestamp)}
+
+    @patch('main.SHARED_KEY', 'test_shared_key_minimum_32_chars_long')
+    @patch('main.run_step', new_callable=AsyncMock)
+    def test_retry_does_not_rerun_step(self, mock_run_step):
+        """Test that a retried direct operation replays the first result"""
+        mock_run_step.return_value = {"returncode": 0}
+
+        body = '{"op": "shell", "params": {"cmd": "dir"}}'
+        headers = self.generate_auth_headers(body)
+        headers["Idempotency-Key"] = f"retry-{time.time()}"
+
+        first = self.client.post("/apex/run", content=body, headers=headers)
+        second = self.client.post("/apex/run", content=body, headers=headers)
+
+        assert first.status_code == 200
+        assert second.status_code == 200
+        assert second.json() == first.json()
+        assert second.headers.get("Idempotent-Replayed") == "true"
+        assert mock_run_step.await_count == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
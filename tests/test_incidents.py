@@ -0,0 +1,162 @@
+"""
+Tests for the safety incident store
+"""
+
+import pytest
+import sqlite3
+import sys
+import pathlib
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from agent.circuit_breaker import CircuitBreakerRegistry
+from agent.memory import MemorySystem
+from agent.safety import SafetyController
+
+HOUR_MS = 3600 * 1000
+BASE_TS = 1_700_000_000_000 - 1_700_000_000_000 % HOUR_MS
+
+
+@pytest.fixture
+def memory(tmp_path):
+    memory = MemorySystem(str(tmp_path / "agent_memory.db"))
+    yield memory
+    memory.close()
+
+
+class TestIncidentStore:
+    """Incident table and rate counter test suite"""
+
+    def test_query_filters_and_pagination(self, memory):
+        for i in range(5):
+            memory.record_incident("cycle_error", f"error {i}", "medium", ts=BASE_TS + i * 1000)
+        memory.record_incident("emergency_shutdown", "stop", "CRITICAL", ts=BASE_TS + 10000)
+
+        rows, cursor = memory.query_incidents(limit=3, incident_type="cycle_error")
+        assert [row["description"] for row in rows] == ["error 4", "error 3", "error 2"]
+        rows, cursor = memory.query_incidents(limit=3, incident_type="cycle_error", cursor=cursor)
+        assert [row["description"] for row in rows] == ["error 1", "error 0"]
+        assert cursor is None
+
+        critical, _ = memory.query_incidents(severity="critical")
+        assert len(critical) == 1 and critical[0]["severity"] == "critical"
+        assert critical[0]["timestamp"].startswith("2023-11-14")
+
+        recent, _ = memory.query_incidents(since_ts=BASE_TS + 3000)
+        assert len(recent) == 3
+
+    def test_rates_come_from_counters(self, memory):
+        """Test hourly series and totals, and that they stay correct without the base rows"""
+        for offset_ms, itype, severity in [
+            (0, "cycle_error", "medium"),
+            (60 * 1000, "cycle_error", "medium"),
+            (HOUR_MS + 5, "cycle_error", "high"),
+            (HOUR_MS + 10, "latency_anomaly", "medium"),
+        ]:
+            memory.record_incident(itype, "x", severity, ts=BASE_TS + offset_ms)
+
+        with memory.db.write() as conn:
+            conn.execute("DELETE FROM safety_incidents")
+        rates = memory.get_incident_rates(BASE_TS, until_ts=BASE_TS + 2 * HOUR_MS, bucket_ms=HOUR_MS)
+        assert rates["series"]["cycle_error"] == [
+            {"ts": BASE_TS, "count": 2},
+            {"ts": BASE_TS + HOUR_MS, "count": 1}
+        ]
+        assert rates["totals"] == {
+            "cycle_error": {"medium": 2, "high": 1},
+            "latency_anomaly": {"medium": 1}
+        }
+        assert rates["total"] == 4
+
+        only = memory.get_incident_rates(BASE_TS, until_ts=BASE_TS + 2 * HOUR_MS,
+                                         incident_type="latency_anomaly")
+        assert list(only["series"]) == ["latency_anomaly"]
+
+    def test_queries_use_indexes(self, memory):
+        plan = " ".join(row[3] for row in memory.db.read().execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM safety_incidents "
+            "WHERE incident_type = ? AND ts >= ? ORDER BY ts DESC", ("x", 0)
+        ))
+        assert "idx_incidents_type_ts" in plan
+
+
+class TestIncidentLogImport:
+    """Migration of the text incident log"""
+
+    def test_existing_log_is_imported(self, tmp_path):
+        """Test that v6 imports the text log found next to the database"""
+        db_path = tmp_path / "agent_memory.db"
+        # Roll a fresh database back to before the incident store
+        memory = MemorySystem(str(db_path))
+        memory.close()
+        conn = sqlite3.connect(db_path)
+        conn.execute("DROP TRIGGER trg_safety_incidents_counts")
+        conn.execute("DROP TABLE safety_incidents")
+        conn.execute("DROP TABLE incident_counts")
+        conn.execute("PRAGMA user_version = 5")
+        conn.commit()
+        conn.close()
+
+        (tmp_path / "safety_incidents.log").write_text(
+            "2025-10-17T12:00:00 [CRITICAL] emergency_shutdown: Manual intervention required\n"
+            "not an incident line\n"
+            "2025-10-17T11:30:00Z [MEDIUM] low_success_rate: Success rate dropped to 45%\n",
+            encoding="utf-8"
+        )
+        memory = MemorySystem(str(db_path))
+        try:
+            rows, _ = memory.query_incidents()
+            assert [(row["incident_type"], row["severity"]) for row in rows] == [
+                ("emergency_shutdown", "critical"), ("low_success_rate", "medium")
+            ]
+            assert rows[0]["timestamp"] == "2025-10-17T12:00:00"
+            assert memory.get_incident_rates(0)["total"] == 2
+        finally:
+            memory.close()
+
+
+class TestSafetyIncidents:
+    """Recording incidents through the safety controller"""
+
+    def test_incident_is_stored_and_optionally_logged(self, memory, tmp_path):
+        log_file = tmp_path / "incidents.log"
+        safety = SafetyController(memory, kill_switch_poll_seconds=0, breakers=CircuitBreakerRegistry(),
+                                  incident_log_file=str(log_file))
+        safety.record_safety_incident("cycle_error", "boom", "medium")
+
+        rows, _ = memory.query_incidents()
+        assert rows[0]["incident_type"] == "cycle_error"
+        assert "[MEDIUM] cycle_error: boom" in log_file.read_text(encoding="utf-8")
+        assert safety.get_safety_status()["incidents_24h"] == {"cycle_error": {"medium": 1}}
+        safety.close()
+
+    def test_status_counts_come_from_the_snapshot(self, memory, monkeypatch):
+        """Test that incidents_24h is seeded from the store and then kept in memory"""
+        memory.record_incident("latency_anomaly", "slow", "medium")
+        memory.record_incident("old", "long ago", "low", ts=BASE_TS)
+        safety = SafetyController(memory, kill_switch_poll_seconds=0, breakers=CircuitBreakerRegistry(),
+                                  incident_log_file="")
+
+        # The status must not query the database
+        monkeypatch.setattr(memory, "get_incident_rates", None)
+        monkeypatch.setattr(memory, "get_incident_counts", None)
+        safety.record_safety_incident("latency_anomaly", "slower", "HIGH")
+        assert safety.get_safety_status()["incidents_24h"] == {
+            "latency_anomaly": {"medium": 1, "high": 1}
+        }
+        safety.close()
+
+    def test_text_log_can_be_disabled(self, memory, tmp_path, monkeypatch):
+        monkeypatch.setenv("AGENT_INCIDENT_LOG_FILE", "")
+        monkeypatch.chdir(tmp_path)
+        safety = SafetyController(memory, kill_switch_poll_seconds=0, breakers=CircuitBreakerRegistry())
+        safety.record_safety_incident("cycle_error", "boom", "medium")
+        assert safety.incident_log_file is None
+        assert not (tmp_path / "logs").exists()
+        safety.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,121 @@
+"""
+Tests for the autonomous agent PatternLearner
+"""
+
+import pytest
+import time
+import sys
+import pathlib
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from agent.memory import MemorySystem
+from agent.learner import PatternLearner
+
+
+@pytest.fixture
+def memory(tmp_path):
+    mem = MemorySystem(str(tmp_path / "agent_memory.db"))
+    yield mem
+    mem.close()
+
+
+def insert_executions(memory, rows):
+    """Insert (ts, operation_type, success, execution_time_ms, error_message) rows"""
+    with memory.db.write() as conn:
+        conn.executemany(
+            "INSERT INTO executions (timestamp, ts, operation_type, intent, success, "
+            "execution_time_ms, error_message) VALUES ('', ?, ?, 'intent', ?, ?, ?)", rows
+        )
+
+
+class TestExecutionAnalysis:
+    """Execution pattern analysis test suite"""
+
+    def test_analysis_covers_whole_window(self, memory):
+        """Test that analysis is not capped at the last 1,000 rows"""
+        now = int(time.time() * 1000)
+        insert_executions(memory, [
+            (now - 60000 + i, "shell" if i % 4 else "http", i % 10 != 0, 100, "connection reset")
+            for i in range(3000)
+        ])
+        # Outside the 24h window
+        insert_executions(memory, [(now - 2 * 86400 * 1000, "shell", False, 100, None)])
+
+        analysis = PatternLearner(memory).analyze_execution_patterns(hours=24)
+        assert analysis["total_executions"] == 3000
+        assert analysis["success_rate"] == pytest.approx(0.9)
+        assert analysis["operation_types"]["distribution"] == {"shell": 2250, "http": 750}
+        assert analysis["common_failures"] == [
+            {"error_type": "Connection Error", "count": 300, "percentage": 100.0}]
+
+    def test_performance_trend(self, memory):
+        """Test that a slower second half is reported as degrading"""
+        now = int(time.time() * 1000)
+        insert_executions(memory, [
+            (now - 60000 + i, "shell", True, 100 if i < 10 else 200, None) for i in range(20)
+        ])
+
+        trend = PatternLearner(memory).analyze_execution_patterns(hours=1)["performance_trends"]
+        assert trend["early_period_avg_ms"] == 100
+        assert trend["recent_period_avg_ms"] == 200
+        assert trend["trend"] == "degrading"
+
+    def test_no_executions(self, memory):
+        assert "message" in PatternLearner(memory).analyze_execution_patterns()
+
+    def test_extract_error_type(self, memory):
+        learner = PatternLearner(memory)
+        assert learner._extract_error_type("Permission denied: /etc") == "Permission Denied"
+        assert learner._extract_error_type("") == "Unknown Error"
+
+
+class TestIncrementalLearning:
+    """Watermark-based learning test suite"""
+
+    def test_each_execution_is_learned_once(self, memory):
+        """Test that repeated runs only process new executions"""
+        learner = PatternLearner(memory)
+        for i in range(7):
+            memory.record_execution("shell", f"task {i % 2}", {}, i % 3 != 0, 10)
+
+        assert learner.learn_new_executions(batch_size=3) == 7
+        assert learner.learn_new_executions(batch_size=3) == 0
+
+        memory.record_execution("shell", "task 0", {}, True, 10)
+        assert learner.learn_new_executions(batch_size=3) == 1
+
+        total = memory.db.read().execute(
+            "SELECT SUM(success_count + failure_count) FROM patterns").fetchone()[0]
+        assert total == 8
+
+    def test_backlog_is_bounded_per_call(self, memory):
+        """Test that catch-up after downtime is spread over several calls"""
+        learner = PatternLearner(memory)
+        for i in range(10):
+            memory.record_execution("shell", "task", {}, True, 10)
+
+        assert learner.learn_new_executions(batch_size=2, max_batches=3) == 6
+        assert learner.learn_new_executions(batch_size=2, max_batches=3) == 4
+
+    def test_failed_batch_does_not_advance_watermark(self, memory, monkeypatch):
+        """Test that patterns and watermark commit together"""
+        learner = PatternLearner(memory)
+        memory.record_execution("shell", "task", {}, True, 10)
+
+        def fail(key, value):
+            raise RuntimeError("disk full")
+
+        monkeypatch.setattr(memory, "set_agent_state", fail)
+        with pytest.raises(RuntimeError):
+            learner.learn_new_executions()
+        monkeypatch.undo()
+
+        assert memory.get_statistics()["learned_patterns"] == 0
+        assert learner.learn_new_executions() == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,67 @@
+"""
+Tests for the event-loop blocking detector
+"""
+
+import pytest
+import asyncio
+import time
+import sys
+import pathlib
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from loop_profiler import BlockingDetector
+
+
+def blocking_handler():
+    """Stands in for a synchronous call made from async code"""
+    time.sleep(0.2)
+
+
+class TestBlockingDetector:
+    """Blocking detector test suite"""
+
+    def test_stall_captured_at_call_site(self):
+        """Test that a blocking call is attributed to its caller"""
+        detector = BlockingDetector(threshold_ms=50, project_dir=str(pathlib.Path(__file__).parent))
+
+        async def scenario():
+            detector.start()
+            await asyncio.sleep(0.05)
+            blocking_handler()
+            await asyncio.sleep(0.1)
+            detector.stop()
+
+        asyncio.run(scenario())
+        report = detector.get_report()
+
+        assert report["stalls"] >= 1
+        top = report["hot_sites"][0]
+        assert "blocking_handler" in top["call_site"]
+        assert top["total_blocked_ms"] >= 50
+        assert any("sleep" in frame or "blocking_handler" in frame for frame, _ in top["blocked_in"])
+
+    def test_idle_loop_records_nothing(self):
+        """Test that a healthy loop produces no captures"""
+        detector = BlockingDetector(threshold_ms=100)
+
+        async def scenario():
+            detector.start()
+            await asyncio.sleep(0.2)
+            detector.stop()
+
+        asyncio.run(scenario())
+        assert detector.get_report()["stalls"] == 0
+
+    def test_reset(self):
+        """Test that reset clears aggregated captures"""
+        detector = BlockingDetector(threshold_ms=50)
+        detector.stalls = 3
+        detector.reset()
+        assert detector.get_report()["stalls"] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
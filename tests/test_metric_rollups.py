@@ -0,0 +1,186 @@
+"""
+Tests for metric rollups and retention in the agent memory
+"""
+
+import pytest
+import random
+import time
+import sys
+import pathlib
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from agent.memory import MemorySystem
+from agent.rollups import LogHistogram, LEGACY_WATERMARK_KEY, MINUTE_MS, HOUR_MS
+
+# Fixed, hour-aligned reference time
+NOW_MS = 1_700_000_000_000 // HOUR_MS * HOUR_MS + 30 * MINUTE_MS
+
+
+@pytest.fixture
+def memory(tmp_path):
+    mem = MemorySystem(str(tmp_path / "agent_memory.db"), raw_metrics_retention_hours=1,
+                       minute_rollup_retention_days=1, hour_rollup_retention_days=30)
+    yield mem
+    mem.close()
+
+
+def insert_metrics(memory, name, points):
+    """Insert (ts, value) pairs directly with explicit timestamps"""
+    with memory.db.write() as conn:
+        conn.executemany(
+            "INSERT INTO metrics (timestamp, ts, metric_name, metric_value) VALUES ('', ?, ?, ?)",
+            [(ts, name, value) for ts, value in points]
+        )
+
+
+class TestLogHistogram:
+    """Quantile sketch test suite"""
+
+    def test_quantiles_within_relative_accuracy(self):
+        """Test that quantiles are within 1% of the exact values"""
+        values = [random.lognormvariate(0, 1) for _ in range(5000)]
+        hist = LogHistogram(relative_accuracy=0.01)
+        for value in values:
+            hist.add(value)
+
+        ordered = sorted(values)
+        for q in (0.5, 0.9, 0.99):
+            exact = ordered[int(q * (len(ordered) - 1))]
+            assert abs(hist.quantile(q) - exact) / exact <= 0.011
+
+    def test_merge_and_serialization(self):
+        """Test that merged histograms round-trip through JSON"""
+        a, b = LogHistogram(), LogHistogram()
+        for v in (1.0, 2.0):
+            a.add(v)
+        for v in (0.0, -3.0):
+            b.add(v)
+        a.merge(LogHistogram.from_json(b.to_json()))
+        assert sum(a.counts.values()) == 4
+        assert a.quantile(0) == pytest.approx(-3.0, rel=0.01)
+
+
+class TestCompaction:
+    """Rollup compaction test suite"""
+
+    def test_compact_builds_minute_and_hour_buckets(self, memory):
+        """Test that raw points are aggregated into both resolutions"""
+        insert_metrics(memory, "latency", [
+            (NOW_MS - 10 * MINUTE_MS, 1.0),
+            (NOW_MS - 10 * MINUTE_MS + 1000, 3.0),
+            (NOW_MS - 5 * MINUTE_MS, 5.0),
+        ])
+        assert memory.rollups.compact() == 3
+
+        rows = memory.db.read().execute(
+            "SELECT resolution, count, sum, min, max FROM metric_rollups ORDER BY resolution, bucket_ts"
+        ).fetchall()
+        assert rows == [
+            ("hour", 3, 9.0, 1.0, 5.0),
+            ("minute", 2, 4.0, 1.0, 3.0),
+            ("minute", 1, 5.0, 5.0, 5.0),
+        ]
+
+    def test_compaction_is_incremental(self, memory):
+        """Test that later runs only fold new rows and merge open buckets"""
+        insert_metrics(memory, "latency", [(NOW_MS - 20 * MINUTE_MS, 2.0)])
+        memory.rollups.compact()
+        insert_metrics(memory, "latency", [(NOW_MS - 5 * MINUTE_MS, 4.0)])
+
+        assert memory.rollups.compact() == 1
+        assert memory.rollups.compact() == 0
+        hour = memory.db.read().execute(
+            "SELECT count, sum FROM metric_rollups WHERE resolution = 'hour'"
+        ).fetchone()
+        assert hour == (2, 6.0)
+
+    def test_late_rows_are_folded_and_kept_until_compacted(self, memory):
+        """Test that rows committed after newer ones (write-behind retries) are not lost"""
+        insert_metrics(memory, "latency", [(NOW_MS - 2 * MINUTE_MS, 1.0)])
+        memory.rollups.compact()
+
+        # A row for an older minute lands after that minute was compacted
+        insert_metrics(memory, "latency", [(NOW_MS - 3 * HOUR_MS, 3.0)])
+        assert memory.rollups.prune(now_ms=NOW_MS) == 0
+
+        assert memory.rollups.compact() == 1
+        assert memory.db.read().execute(
+            "SELECT SUM(count) FROM metric_rollups WHERE resolution = 'minute'"
+        ).fetchone()[0] == 2
+        assert memory.rollups.prune(now_ms=NOW_MS) == 1
+
+    def test_legacy_ts_watermark_is_honoured(self, memory):
+        """Test that rows behind an old ts watermark are not folded twice"""
+        insert_metrics(memory, "latency", [(NOW_MS - 20 * MINUTE_MS, 1.0), (NOW_MS - MINUTE_MS, 2.0)])
+        with memory.db.write() as conn:
+            conn.execute(
+                "INSERT INTO agent_state (key, value, updated_at) VALUES (?, ?, '')",
+                (LEGACY_WATERMARK_KEY, str(NOW_MS - 10 * MINUTE_MS))
+            )
+
+        assert memory.rollups.compact() == 1
+        assert memory.rollups.get_stats()["watermark_id"] == 2
+        assert memory.db.read().execute(
+            "SELECT 1 FROM agent_state WHERE key = ?", (LEGACY_WATERMARK_KEY,)
+        ).fetchone() is None
+
+
+class TestRetention:
+    """Retention pruning test suite"""
+
+    def test_prune_removes_only_compacted_raw_rows(self, memory):
+        """Test that raw rows past retention are deleted after compaction"""
+        memory.rollups.prune_batch_size = 2
+        old = [(NOW_MS - 3 * HOUR_MS + i, float(i)) for i in range(5)]
+        insert_metrics(memory, "latency", old + [(NOW_MS - MINUTE_MS, 1.0)])
+
+        # Nothing compacted yet: nothing may be dropped
+        assert memory.rollups.prune(now_ms=NOW_MS) == 0
+
+        memory.rollups.compact()
+        assert memory.rollups.prune(now_ms=NOW_MS) == 5
+        assert memory.db.read().execute("SELECT COUNT(*) FROM metrics").fetchone()[0] == 1
+
+    def test_prune_expires_rollup_buckets(self, memory):
+        """Test that minute buckets expire before hour buckets"""
+        insert_metrics(memory, "latency", [(NOW_MS - 2 * 24 * HOUR_MS, 1.0)])
+        memory.rollups.compact()
+        memory.rollups.prune(now_ms=NOW_MS)
+
+        resolutions = [r[0] for r in memory.db.read().execute("SELECT resolution FROM metric_rollups")]
+        assert resolutions == ["hour"]
+
+
+class TestSeriesQueries:
+    """Resolution selection test suite"""
+
+    def test_choose_resolution(self, memory):
+        """Test picking the coarsest resolution with enough points"""
+        assert memory.rollups.choose_resolution(0.25, min_points=24) == "raw"
+        assert memory.rollups.choose_resolution(1, min_points=24) == "minute"
+        assert memory.rollups.choose_resolution(24 * 7, min_points=24) == "hour"
+
+    def test_get_metric_series(self, memory):
+        """Test series output from rollups"""
+        now = int(time.time() * 1000)
+        insert_metrics(memory, "latency", [(now - 2 * HOUR_MS, 2.0), (now - 2 * HOUR_MS, 4.0)])
+        # Reads never compact; the agent cycle does
+        assert memory.get_metric_series("latency", hours=24 * 2)["points"] == []
+        memory.compact_metrics()
+
+        series = memory.get_metric_series("latency", hours=24 * 2)
+        assert series["resolution"] == "hour"
+        [point] = series["points"]
+        assert point["count"] == 2 and point["avg"] == 3.0
+        assert point["p50"] == pytest.approx(2.0, rel=0.01)
+
+    def test_unknown_resolution_rejected(self, memory):
+        with pytest.raises(ValueError):
+            memory.get_metric_series("latency", resolution="day")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,127 @@
+"""
+Tests for background Telegram notifications
+"""
+
+import pytest
+import asyncio
+import time
+import sys
+import pathlib
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from notifications import TelegramNotifier, RetryAfter
+
+
+class TestTelegramNotifier:
+    """Telegram notifier test suite"""
+
+    def test_enqueue_does_not_wait_for_delivery(self):
+        """Test that enqueue returns immediately even with a slow API"""
+        sent = []
+
+        async def slow_send(text):
+            await asyncio.sleep(0.5)
+            sent.append(text)
+
+        notifier = TelegramNotifier("", "", coalesce_seconds=0, send_func=slow_send)
+
+        async def scenario():
+            start = time.perf_counter()
+            notifier.enqueue("hello")
+            elapsed = time.perf_counter() - start
+            await notifier.stop()
+            return elapsed
+
+        assert asyncio.run(scenario()) < 0.05
+        assert sent == ["hello"]
+
+    def test_burst_is_coalesced_into_one_message(self):
+        """Test that a burst of notifications becomes a single send"""
+        sent = []
+
+        async def send(text):
+            sent.append(text)
+
+        notifier = TelegramNotifier("", "", coalesce_seconds=0.05, send_func=send)
+
+        async def scenario():
+            for i in range(3):
+                notifier.enqueue(f"step {i}")
+            await asyncio.sleep(0.2)
+            await notifier.stop()
+
+        asyncio.run(scenario())
+        assert sent == ["step 0\nstep 1\nstep 2"]
+        assert notifier.get_stats()["delivered_notifications"] == 3
+
+    def test_oversized_batch_is_split(self):
+        """Test that coalesced text respects Telegram's message limit"""
+        notifier = TelegramNotifier("token", "chat")
+        groups = notifier._group(["a" * 3000, "b" * 3000, "c" * 500])
+        assert [len(group) for group in groups] == [1, 2]
+        assert all(len("\n".join(group)) <= TelegramNotifier.MAX_MESSAGE_LENGTH for group in groups)
+
+    def test_retry_with_backoff(self):
+        """Test that transient failures and 429s are retried"""
+        attempts = []
+
+        async def flaky_send(text):
+            attempts.append(text)
+            if len(attempts) == 1:
+                raise RetryAfter(0.01)
+            if len(attempts) == 2:
+                raise ConnectionError("network down")
+
+        notifier = TelegramNotifier("", "", coalesce_seconds=0, backoff_seconds=0.01,
+                                    min_interval_seconds=0, send_func=flaky_send)
+
+        async def scenario():
+            notifier.enqueue("retry me")
+            await asyncio.sleep(0.2)
+            await notifier.stop()
+
+        asyncio.run(scenario())
+        assert len(attempts) == 3
+        stats = notifier.get_stats()
+        assert stats["sent_messages"] == 1
+        assert stats["retries"] == 2
+
+    def test_failed_delivery_is_not_counted_as_delivered(self):
+        """Test that notifications given up after retries are counted as failed"""
+        async def failing_send(text):
+            raise ConnectionError("network down")
+
+        notifier = TelegramNotifier("", "", coalesce_seconds=0, backoff_seconds=0.001,
+                                    min_interval_seconds=0, max_retries=1, send_func=failing_send)
+
+        async def scenario():
+            notifier.enqueue("a")
+            notifier.enqueue("b")
+            await asyncio.sleep(0.1)
+            await notifier.stop()
+
+        asyncio.run(scenario())
+        stats = notifier.get_stats()
+        assert stats["delivered_notifications"] == 0
+        assert stats["failed_notifications"] == 2
+        assert stats["failed_messages"] == 1
+
+    def test_queue_is_bounded(self):
+        """Test that the oldest notifications are dropped when the queue is full"""
+        notifier = TelegramNotifier("token", "chat", max_queue=2)
+        for i in range(5):
+            notifier.enqueue(f"msg {i}")
+        assert list(notifier._pending) == ["msg 3", "msg 4"]
+        assert notifier.get_stats()["dropped"] == 3
+
+    def test_disabled_without_credentials(self):
+        """Test that nothing is queued when Telegram is not configured"""
+        notifier = TelegramNotifier("", "")
+        assert notifier.enqueue("ignored") is False
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,119 @@
+"""
+Tests for the agent cycle profiler
+"""
+
+import pytest
+import asyncio
+import threading
+import time
+import sys
+import pathlib
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from agent.db import VM_STEP_GRANULARITY
+from agent.agent_loop import AutonomousAgent
+from agent.profiler import CycleProfiler
+
+
+@pytest.fixture
+def agent(tmp_path):
+    agent = AutonomousAgent(str(tmp_path / "agent_memory.db"))
+    yield agent
+    agent.close()
+
+
+class TestCycleProfiler:
+    """Cycle profiler test suite"""
+
+    def test_phase_counts_database_work(self, agent):
+        profiler = agent.profiler
+        profiler.begin_cycle(1, "manual", 0)
+        with profiler.phase("writes"):
+            for _ in range(3):
+                agent.memory.record_execution("shell", "ls", {}, True, 10)
+            agent.memory.get_statistics()
+        with profiler.phase("idle"):
+            pass
+        entry = profiler.end_cycle()
+
+        writes = entry["phases"]["writes"]
+        assert writes["statements"] > 0
+        assert writes["rows_written"] >= 3
+        assert writes["vm_steps_approx"] % VM_STEP_GRANULARITY == 0
+        assert entry["phases"]["idle"]["statements"] == 0
+        assert profiler.end_cycle() is None
+        # Counting hooks are removed once no phase is being measured
+        assert agent.memory.db._counting == 0
+
+    def test_other_threads_are_not_counted(self, agent):
+        """Test that concurrent work outside the phase's task is not attributed to it"""
+        profiler = agent.profiler
+        profiler.begin_cycle(1, "manual", 0)
+        with profiler.phase("idle"):
+            worker = threading.Thread(target=agent.memory.get_statistics)
+            worker.start()
+            worker.join()
+        entry = profiler.end_cycle()
+        assert entry["phases"]["idle"]["statements"] == 0
+
+    def test_phase_summary_slope(self, agent):
+        """Test that phase time is fitted against the number of stored executions"""
+        profiler = agent.profiler
+        for i in range(6):
+            profiler.begin_cycle(i, "manual", i * 1000)
+            profiler.end_cycle()
+            profiler.history[-1]["phases"]["analysis"] = {
+                "wall_ms": 10.0 + 2 * i, "cpu_ms": 1.0, "statements": 4
+            }
+
+        summary = profiler.get_phase_summary()["analysis"]
+        assert summary["cycles"] == 6
+        assert summary["ms_per_1k_executions"] == pytest.approx(2.0)
+        assert summary["last_wall_ms"] == 20.0
+
+    def test_capture_samples_stacks(self):
+        profiler = CycleProfiler(db=None, sample_interval_seconds=0.001)
+        profiler.request_capture()
+        profiler.begin_cycle(1, "profile")
+        assert not profiler.capture_pending
+
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            sum(range(1000))
+        profiler.end_cycle()
+
+        profile = profiler.get_report()["latest_profile"]
+        assert profile["cycle"] == 1 and profile["samples"] > 0
+        assert any("test_capture_samples_stacks" in row["function"] for row in profile["top_cumulative"])
+
+
+class TestCycleProfiling:
+    """Profiling of real agent cycles"""
+
+    def test_cycle_records_phases(self, agent):
+        agent.safety.enabled = True
+        agent.memory.record_execution("shell", "ls", {}, True, 10)
+        agent.profiler.request_capture()
+
+        asyncio.run(agent._run_cycle())
+
+        report = agent.profiler.get_report()
+        assert report["cycles_recorded"] == 1
+        cycle = report["history"][0]
+        assert cycle["total_executions"] == 1
+        assert {"learning", "analysis"} <= set(cycle["phases"])
+        # Memory calls awaited on the DB thread are counted for the phase
+        assert cycle["phases"]["learning"]["statements"] > 0
+        assert report["latest_profile"]["cycle"] == cycle["cycle"]
+        assert agent.memory.get_metrics("agent_phase_learning_seconds")
+
+    def test_disabled_agent_records_nothing(self, agent):
+        asyncio.run(agent._run_cycle())
+        assert agent.profiler.get_report()["cycles_recorded"] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
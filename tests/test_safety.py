@@ -0,0 +1,152 @@
+"""
+Tests for the safety snapshot and kill switch watcher
+"""
+
+import pytest
+import asyncio
+import time
+import sys
+import pathlib
+
+# Add src to path
+src_dir = pathlib.Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from agent.agent_loop import AutonomousAgent
+from agent.circuit_breaker import CircuitBreakerRegistry
+from agent.kill_switch import KillSwitchWatcher
+from agent.memory import MemorySystem
+from agent.safety import SafetyController
+
+
+@pytest.fixture
+def memory(tmp_path):
+    memory = MemorySystem(str(tmp_path / "agent_memory.db"))
+    yield memory
+    memory.close()
+
+
+def make_safety(memory, tmp_path, poll_seconds=0):
+    safety = SafetyController(memory, kill_switch_file=str(tmp_path / "AGENT_KILL_SWITCH"),
+                              kill_switch_poll_seconds=poll_seconds, breakers=CircuitBreakerRegistry())
+    safety.enabled = True
+    safety.modifications_enabled = True
+    return safety
+
+
+def wait_for(condition, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestSafetySnapshot:
+    """Incrementally maintained safety state test suite"""
+
+    def test_error_rate_is_seeded_and_updated(self, memory, tmp_path, monkeypatch):
+        for success in (True, False, False, True):
+            memory.record_execution("shell", "ls", {}, success, 10)
+        safety = make_safety(memory, tmp_path)
+        assert safety.check_safety_limits()["error_rate"] == 0.5
+
+        # Checks must not query the database any more
+        monkeypatch.setattr(memory, "get_execution_history", None)
+        monkeypatch.setattr(memory, "get_statistics", None)
+        for _ in range(4):
+            memory.record_execution("shell", "ls", {}, False, 10)
+        checks = safety.check_safety_limits()
+        assert checks["error_rate"] == 0.75
+        assert not checks["error_rate_ok"]
+        safety.close()
+
+    def test_error_rate_window_slides(self, memory, tmp_path):
+        safety = make_safety(memory, tmp_path)
+        memory.record_execution("shell", "ls", {}, False, 10)
+        for _ in range(100):
+            memory.record_execution("shell", "ls", {}, True, 10)
+        assert safety.check_safety_limits()["error_rate"] == 0.0
+        safety.close()
+
+    def test_modification_rate(self, memory, tmp_path):
+        safety = make_safety(memory, tmp_path)
+        memory.record_modification("optimize", "a.py", "", "", "", {}, applied=True)
+        memory.record_modification("optimize", "b.py", "", "", "", {}, applied=False)
+        checks = safety.check_safety_limits()
+        assert checks["modification_success_rate"] == 0.5
+        assert not checks["modification_rate_ok"]
+        safety.close()
+
+
+class TestKillSwitch:
+    """Kill switch watcher test suite"""
+
+    def test_activation_is_immediate(self, memory, tmp_path):
+        """Test that the API path trips the switch without waiting for a poll"""
+        safety = make_safety(memory, tmp_path)
+        states = []
+        safety.add_kill_switch_listener(states.append)
+
+        safety.activate_kill_switch("test")
+        assert safety.kill_switch_file.exists()
+        assert not safety.is_enabled() and not safety.modifications_enabled_check()
+        assert states == [True]
+
+        safety.deactivate_kill_switch("")
+        assert states == [True, False]
+        assert not safety.get_safety_status()["kill_switch_active"]
+        safety.close()
+
+    def test_external_file_is_detected(self, memory, tmp_path):
+        safety = make_safety(memory, tmp_path, poll_seconds=0.01)
+        states = []
+        safety.add_kill_switch_listener(states.append)
+        assert safety.is_enabled()
+
+        safety.kill_switch_file.write_text("EMERGENCY STOP")
+        assert wait_for(lambda: states == [True])
+        assert not safety.is_enabled()
+
+        safety.kill_switch_file.unlink()
+        assert wait_for(lambda: states == [True, False])
+        assert safety.is_enabled()
+        safety.close()
+        assert not safety.kill_switch.get_stats()["watching"]
+
+    def test_existing_file_starts_active(self, tmp_path):
+        path = tmp_path / "AGENT_KILL_SWITCH"
+        path.write_text("stop")
+        watcher = KillSwitchWatcher(path, poll_interval_seconds=0)
+        assert watcher.active
+        assert watcher.get_stats()["modified_at"] is not None
+
+    def test_trip_stops_agent_loop(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("AGENT_KILL_SWITCH_FILE", str(tmp_path / "AGENT_KILL_SWITCH"))
+        monkeypatch.setenv("AGENT_KILL_SWITCH_POLL_SECONDS", "0.01")
+        agent = AutonomousAgent(str(tmp_path / "agent_memory.db"))
+        agent.safety.enabled = True
+        cycles = []
+
+        async def fake_cycle(reason):
+            cycles.append(reason)
+
+        agent._run_cycle = fake_cycle
+
+        async def scenario():
+            loop_task = asyncio.create_task(agent.start(interval_seconds=3600))
+            await asyncio.sleep(0.02)
+            agent.safety.kill_switch_file.write_text("EMERGENCY STOP")
+            await asyncio.wait_for(loop_task, 1)
+
+        try:
+            asyncio.run(scenario())
+            assert cycles == ["start"]
+            assert not agent.running
+        finally:
+            agent.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])